@@ -1,6 +1,7 @@
-from .data import get_data, write_data, Data, User
+from .data import get_data, stream_data, write_data, Data, User
 from .errors import (
     AmbiguousUserError,
+    ConflictError,
     ExistingUserError,
     UnknownAttributeError,
     UserNotFoundError,
@@ -2,8 +2,10 @@
 isensus executable. see: https://mpi-is.github.io/isensus/
 """
 
-import sys, inspect
+import sys
 from isensus.commands import commands
+from isensus.commands.arguments import parse, usage
+from isensus.server import forward, local
 
 
 def _list_commands():
@@ -13,13 +15,7 @@ def _list_commands():
 
     print()
     for command in commands.values():
-        args = inspect.getfullargspec(command).args
-        if not args:
-            print(command.__name__, ": (no arguments)")
-        else:
-            types = command.__annotations__
-            arg_types = [str(arg) + " (" + str(types[arg]) + ")" for arg in args]
-            print(command.__name__, ":", " ".join(arg_types))
+        print(command.__name__, ":", usage(command))
     print()
 
 
@@ -30,55 +26,42 @@ def _run(args):
         _list_commands()
         return
 
-    # user passed an unknown command. Printing documentation
-    if args[0] not in commands.keys():
-        print("\nUnknown command: {}".format(args[0]))
+    # the command the user want to execute, and the arguments
+    # as provided by the user, casted to the types expected by
+    # the command's function. If the command is unknown or the
+    # arguments incorrect, printing documentation
+    try:
+        command, input_args, input_options = parse(commands, args)
+    except ValueError as e:
+        print("\n{}".format(e))
         _list_commands()
         return
 
-    # the command the user want to execute
-    command = commands[args[0]]
-    # the arguments as provided by the user
-    user_args = args[1:]
-
-    # correct number of arguments ?
-    nb_args = len(inspect.getfullargspec(command).args)
-
-    # incorrect number of argument
-    if nb_args != len(args[1:]):
-        print("\nIncorrect number of argument")
-        _list_commands()
-        return
-
-    # are the arguments provided by the user of the
-    # suitable type ?
-    command_args = inspect.getfullargspec(command).args
-    input_args = []
-    for user_arg, command_arg in zip(user_args, command_args):
-        try:
-            # casting user argument (str) to type expected by
-            # the command's function
-            input_arg = command.__annotations__[command_args](user_arg)
-        except Exception as e:
-            # casting failed, exiting
-            print(
-                "\nfailed to cast argument {} to {}".format(
-                    user_arg, command.__annotations__[command_args]
-                )
-            )
-            print()
+    # a server is running (see the serve command): it
+    # applies the command, printing its reply
+    if args[0] not in local:
+        reply = forward(args)
+        if reply is not None:
+            output, error = reply
+            print(output, end="")
+            if error is not None:
+                print("\nerror: {}".format(error), file=sys.stderr)
+                sys.exit(1)
             return
-        input_args.append(input_arg)
 
     # applying the command
-    user = command(*input_args)
+    user = command(*input_args, **input_options)
 
     # if a user is returned by the command, this means this user
     # has been updated. So showing the updated user
-    if user:
-        commands["list"](user.userid)
+    if user and command is not commands["show"]:
+        print(user.to_string())
 
 
 def run():
 
     _run(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,117 @@
+import inspect, typing
+
+
+def arguments(command: typing.Callable) -> typing.List[str]:
+    """ Returns the names of the arguments of the command to be
+    provided by the user (i.e. the arguments without default values,
+    e.g. path is not set from the command line)
+    """
+    spec = inspect.getfullargspec(command)
+    return spec.args[: len(spec.args) - len(spec.defaults or ())]
+
+
+def options(command: typing.Callable) -> typing.List[str]:
+    """ Returns the names of the options of the command, i.e. its
+    boolean and int arguments with default values, set from the
+    command line by their name with dashes (e.g. '--all-or-nothing'
+    sets all_or_nothing to True), followed by their value for
+    int arguments (e.g. '--jobs 4')
+    """
+    spec = inspect.getfullargspec(command)
+    optional = spec.args[len(spec.args) - len(spec.defaults or ()) :]
+    return [
+        arg for arg in optional if command.__annotations__.get(arg) in (bool, int)
+    ]
+
+
+def _option(name: str) -> str:
+    return "--" + name.replace("_", "-")
+
+
+def usage(command: typing.Callable) -> str:
+    """ Returns the description of the arguments (and options)
+    of the command
+    """
+    args = arguments(command)
+    types = command.__annotations__
+    described = [str(arg) + " (" + str(types[arg]) + ")" for arg in args]
+    for option in options(command):
+        if types[option] is bool:
+            described.append("[{}]".format(_option(option)))
+        else:
+            described.append("[{} ({})]".format(_option(option), types[option]))
+    if not described:
+        return "(no arguments)"
+    return " ".join(described)
+
+
+def _cast(command: typing.Callable, name: str, value: str) -> typing.Any:
+    # casting the user argument (str) to the type expected
+    # by the command's function
+    try:
+        return command.__annotations__[name](value)
+    except Exception:
+        raise ValueError(
+            "failed to cast argument {} to {}".format(
+                value, command.__annotations__[name]
+            )
+        )
+
+
+def parse(
+    commands: typing.Mapping[str, typing.Callable], args: typing.Sequence[str]
+) -> typing.Tuple[
+    typing.Callable, typing.List[typing.Any], typing.Dict[str, typing.Any]
+]:
+    """ Returns the command called by the arguments passed by
+    the user (command name followed by its arguments and options)
+
+    Parameters
+    ----------
+    commands: dict
+        the commands, by name (see isensus.commands.commands)
+    args: list of str
+        the arguments passed by the user
+
+    Returns
+    -------
+    command: function
+        the command
+    arguments: list
+        the arguments of the command, casted to the types
+        expected by the command
+    options: dict
+        the options of the command set by the user (to True
+        for boolean options, to their value otherwise)
+
+    Raises
+    ------
+    ValueError
+        if the command is unknown, or the arguments are not
+        the ones expected by the command
+    """
+    if args[0] not in commands.keys():
+        raise ValueError("Unknown command: {}".format(args[0]))
+    command = commands[args[0]]
+    flags = {_option(option): option for option in options(command)}
+    user_args = []
+    input_options: typing.Dict[str, typing.Any] = {}
+    remaining = iter(args[1:])
+    for arg in remaining:
+        if arg not in flags:
+            user_args.append(arg)
+        elif command.__annotations__[flags[arg]] is bool:
+            input_options[flags[arg]] = True
+        else:
+            value = next(remaining, None)
+            if value is None:
+                raise ValueError("missing value of option {}".format(arg))
+            input_options[flags[arg]] = _cast(command, flags[arg], value)
+    command_args = arguments(command)
+    if len(command_args) != len(user_args):
+        raise ValueError("Incorrect number of argument")
+    input_args = [
+        _cast(command, command_arg, user_arg)
+        for user_arg, command_arg in zip(user_args, command_args)
+    ]
+    return command, input_args, input_options
@@ -0,0 +1,76 @@
+import shlex, sys, typing
+from pathlib import Path
+from isensus.data.data import Data, joined
+from isensus.defaults import default_path
+from .arguments import parse
+
+# commands which can not run within the session of a batch
+_excluded = ("batch", "migrate", "serve", "shell")
+
+
+def _lines(source: str) -> typing.List[str]:
+    # lines of the file, or of the standard input if source is '-'
+    if source == "-":
+        return sys.stdin.read().splitlines()
+    with open(source) as f:
+        return f.read().splitlines()
+
+
+def batch(
+    source: str, all_or_nothing: bool = False, path: Path = default_path
+) -> None:
+    """ Run the commands listed in a file
+
+    Reads one command per line (with the same syntax as the
+    isensus executable, e.g. 'set bmarley ldap True'; empty lines
+    and lines starting with '#' are ignored), and runs all of them
+    in a single session: the database is read once and the changes
+    of all the commands are written at once, at the end (see
+    isensus.data.data.joined). Failing commands are reported with
+    their line number, and do not prevent the other commands from
+    running.
+
+    Parameters
+    ----------
+    source: str
+        path to the file listing the commands, or '-' for
+        the standard input
+    all_or_nothing: bool (optional)
+        if True, nothing is written if any of the commands fails
+    path: Path (optional)
+        absolute path to datafile (default to ~/.isensus)
+
+    Raises
+    ------
+    ValueError
+        if all_or_nothing is True and a command failed
+    """
+
+    # importing here, as batch is itself one of the commands
+    from .commands import commands
+
+    lines = _lines(source)
+    nb_commands, failed = 0, []
+    with Data(path=path) as users:
+        with joined(path, users):
+            for number, line in enumerate(lines, 1):
+                if not line.strip() or line.lstrip().startswith("#"):
+                    continue
+                nb_commands += 1
+                try:
+                    args = shlex.split(line)
+                    if args[0] in _excluded:
+                        raise ValueError("can not be run in a batch")
+                    command, input_args, input_options = parse(commands, args)
+                    command(*input_args, **input_options, path=path)
+                except Exception as e:
+                    print("line {}: {}: {}".format(number, line.strip(), e))
+                    failed.append(number)
+        print("{} command(s), {} failed".format(nb_commands, len(failed)))
+        if failed and all_or_nothing:
+            # exiting the session with an exception: nothing is written
+            raise ValueError(
+                "failed command(s) at line(s) {}, nothing written".format(
+                    ", ".join(str(number) for number in failed)
+                )
+            )
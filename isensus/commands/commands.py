@@ -8,6 +8,15 @@ from .show import show
 from .delnote import delnote
 from .delwarning import delwarning
 from .remove import remove
+from .migrate import migrate
+from .search import search
+from .query import query
+from .batch import batch
+from .serve import serve
+from .shell import shell
+from .warnings import warnings
+from .upcoming import upcoming
+from .report import report
 
 """
 Dictionary having as values all the commands that
@@ -21,4 +30,13 @@ commands: typing.Dict[str, typing.Callable] = {
     "set": set,
     "show": show,
     "remove": remove,
+    "migrate": migrate,
+    "search": search,
+    "query": query,
+    "batch": batch,
+    "serve": serve,
+    "shell": shell,
+    "warnings": warnings,
+    "upcoming": upcoming,
+    "report": report,
 }
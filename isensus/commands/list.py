@@ -1,20 +1,22 @@
 from pathlib import Path
 from isensus.defaults import default_path
-from isensus.data.data import Data
+from isensus.data.data import stream_data
 
 
 def list(path: Path = default_path) -> None:
     """ Print the list of users included in the database
 
+    Users are printed in the order of the database (ordered
+    by userid for sqlite3 databases). Users are read and
+    printed one at a time (see stream_data).
+
     Parameters
     ----------
     path: Path (optional)
         absolute path to datafile (default to ~/.isensus)
     """
 
-    with Data(path=path) as users:
-        attrs = ("firstname", "lastname")
-        userids = sorted(users.keys())
-        for userid, user in users.item():
-            values = [getattr(user, attr) for attr in attrs]
-            print(userid, "\t", "\t".join(values))
+    attrs = ("firstname", "lastname")
+    for userid, user in stream_data(path):
+        values = [str(getattr(user, attr)) for attr in attrs]
+        print(userid, "\t", "\t".join(values))
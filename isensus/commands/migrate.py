@@ -0,0 +1,25 @@
+from pathlib import Path
+from isensus.data.sqlite import is_sqlite, migrate as migrate_to_sqlite
+from isensus.defaults import default_path
+
+
+def migrate(path: Path = default_path) -> None:
+    """ Converts the json database into a sqlite3 database
+
+    One-shot migration of the json data file into a sqlite3
+    database (at the same path). All the other commands
+    support both formats. The json data file is kept as a
+    backup, suffixed with '.json.bak'.
+
+    Parameters
+    ----------
+    path: Path (optional)
+        absolute path to datafile (default to ~/.isensus)
+    """
+
+    if is_sqlite(path):
+        print("{} is already a sqlite3 database".format(path))
+        return
+
+    backup = migrate_to_sqlite(path)
+    print("migrated {} to sqlite3 (json backup: {})".format(path, backup))
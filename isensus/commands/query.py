@@ -0,0 +1,26 @@
+from pathlib import Path
+from isensus.data.data import Data
+from isensus.defaults import default_path
+
+
+def query(expression: str, path: Path = default_path) -> None:
+    """ Print the users matching the query
+
+    The query compares attributes of the users with values,
+    combined with 'and' and 'or', for example:
+    "vaulted=False and contract_end<2026-11-01 and contract=guest"
+    (see isensus.data.query.Query).
+
+    Parameters
+    ----------
+    expression: str
+        the query
+    path: Path (optional)
+        absolute path to datafile (default to ~/.isensus)
+    """
+
+    with Data(path=path, shared=True) as users:
+        attrs = ("firstname", "lastname")
+        for userid in users.query(expression):
+            values = [str(users.field(userid, attr)) for attr in attrs]
+            print(userid, "\t", "\t".join(values))
@@ -0,0 +1,37 @@
+from pathlib import Path
+from isensus.data.data import Data
+from isensus.data.table import UserTable
+from isensus.defaults import default_path
+from isensus.warnings import build_report
+
+
+def report(jobs: int = 1, path: Path = default_path) -> None:
+    """ Print the audit of the users
+
+    For each contract and each title, prints the number of users
+    and of users having warnings, then the attributes and warnings
+    of each user having warnings (the warnings being computed
+    rather than read from ~/.isensus.warnings, see
+    isensus.warnings.build_report).
+
+    Parameters
+    ----------
+    jobs: int (optional)
+        number of processes computing the audit, each for
+        a chunk of the users
+    path: Path (optional)
+        absolute path to datafile (default to ~/.isensus)
+    """
+
+    with Data(path=path, shared=True) as users:
+        table = UserTable.from_users(users)
+    audit = build_report(table, jobs=jobs)
+    for title, counts in (("contracts", audit.contracts), ("titles", audit.titles)):
+        print(title)
+        for name, (nb_users, nb_flagged) in counts.items():
+            print("\t", name, "\t", nb_users, "user(s),", nb_flagged, "with warnings")
+    for userid, user_warnings in audit.warnings.items():
+        print(userid)
+        print(audit.descriptions[userid])
+        for warning in user_warnings:
+            print("\t", warning)
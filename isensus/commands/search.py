@@ -0,0 +1,27 @@
+from pathlib import Path
+from isensus.data.data import Data
+from isensus.defaults import default_path
+
+
+def search(text: str, path: Path = default_path) -> None:
+    """ Print the users which names are similar to the text
+
+    Fuzzy search of the users which userid, first name or
+    last name are similar to the text, tolerant to typos,
+    case, accents and transliterated umlauts ("Mueller"
+    finds "Müller"). Users are printed by decreasing
+    similarity score.
+
+    Parameters
+    ----------
+    text: str
+        search string
+    path: Path (optional)
+        absolute path to datafile (default to ~/.isensus)
+    """
+
+    with Data(path=path, shared=True) as users:
+        attrs = ("firstname", "lastname")
+        for userid, score in users.fuzzy(text):
+            values = [str(users.field(userid, attr)) for attr in attrs]
+            print(userid, "\t", "\t".join(values), "\t({:.2f})".format(score))
@@ -0,0 +1,32 @@
+import signal
+from pathlib import Path
+from isensus.defaults import default_path
+
+
+def serve(path: Path = default_path) -> None:
+    """ Run the isensus server
+
+    Reads the database once and keeps it in memory, running the
+    commands passed to the isensus executable (which forwards them
+    through the socket ~/.isensus.sock while the server runs, see
+    isensus.server) until interrupted (Ctrl-C or SIGTERM). The
+    changes of each command are written when it succeeds. If no
+    server is running, commands read and write the database
+    themselves.
+
+    Parameters
+    ----------
+    path: Path (optional)
+        absolute path to datafile (default to ~/.isensus)
+    """
+
+    # importing here, as the server runs the commands
+    from isensus.server import Server
+
+    with Server(path) as server:
+        signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+        print("serving {}".format(path))
+        try:
+            server.serve()
+        except KeyboardInterrupt:
+            pass
@@ -38,8 +38,8 @@ def set(usertip: str, attribute: str, value: str, path: Path = default_path) ->
         user = User.find_user(users, usertip)
         attr_type = User.get_type(attribute)
         if not attr_type in (Notes,Warnings):
-            setattr(user, attribute, attr_type(value))
-            return
+            setattr(user, attribute, User.decode_attribute(attribute, value))
+            return user
         # attribute is warnings or notes :
         # adding the value to the already existing
         # values
@@ -48,6 +48,6 @@ def set(usertip: str, attribute: str, value: str, path: Path = default_path) ->
             new_value = value
         else:
             new_value = current + ListAttribute.separator + value
-        setattr(user, attribute, new_value)
+        setattr(user, attribute, attr_type(new_value))
         
     return user
@@ -0,0 +1,27 @@
+from pathlib import Path
+from isensus.data.data import Data
+from isensus.defaults import default_path
+
+
+def shell(path: Path = default_path) -> None:
+    """ Run the interactive isensus shell
+
+    Reads the database once, then runs the commands typed at the
+    prompt (same syntax as the isensus executable, e.g.
+    'set bmarley ldap True') until 'exit'. The changes are written
+    only on 'commit', and discarded on 'rollback' (see
+    isensus.shell.Shell). Userids, attributes and values are
+    completed with tab.
+
+    Parameters
+    ----------
+    path: Path (optional)
+        absolute path to datafile (default to ~/.isensus)
+    """
+
+    # importing here, as the shell runs the commands
+    from isensus.shell import Shell
+
+    data = Data(path=path)
+    with data as users:
+        Shell(data, users, path).cmdloop()
@@ -1,5 +1,5 @@
 from pathlib import Path
-from isensus.data.data import Data
+from isensus.data.data import Data, read_user
 from isensus.data.user import User
 from isensus.defaults import default_path
 
@@ -10,7 +10,11 @@ def show(usertip: str, path: Path = default_path) -> User:
 
     Reads data from the json file, find the user
     corresponding to the usertip, and print the 
-    related attributes values.
+    related attributes values. Only the record of the
+    user is read from the json file, if possible (see
+    read_user). If no user corresponds to the usertip,
+    the most similar user is searched instead (see the
+    search command).
 
     Parameters
     ----------
@@ -26,8 +30,10 @@ def show(usertip: str, path: Path = default_path) -> User:
 
     """
 
-    with Data(path=path) as users:
-        user = User.find_user(users, usertip)
+    user = read_user(path, usertip)
+    if user is None:
+        with Data(path=path, shared=True) as users:
+            user = User.find_user(users, usertip, fuzzy=True)
 
     print(user.to_string())
     return user
@@ -0,0 +1,29 @@
+from pathlib import Path
+from isensus.data.data import expiring
+from isensus.data.date import Date
+from isensus.defaults import default_path
+from isensus.warnings.engine import today
+
+
+def upcoming(days: int, path: Path = default_path) -> None:
+    """ Print the users which contract or shadow extension ends
+    within the number of days
+
+    Ends are printed by date, from today to today plus the number
+    of days (included). They are searched in the timeline of the
+    database (~/.isensus.timeline, see isensus.data.timeline), so
+    that only the users printed are read.
+
+    Parameters
+    ----------
+    days: int
+        number of days
+    path: Path (optional)
+        absolute path to datafile (default to ~/.isensus)
+    """
+
+    if days < 0:
+        raise ValueError("the number of days should not be negative")
+    first = today()
+    for day, attribute, userid in expiring(path, first, first + days):
+        print(Date.from_ordinal(day), "\t", attribute, "\t", userid)
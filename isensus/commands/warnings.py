@@ -0,0 +1,48 @@
+from pathlib import Path
+from isensus.data.data import Data
+from isensus.data.table import UserTable
+from isensus.defaults import default_path
+from isensus.warnings import outstanding, rule_userids
+
+
+def warnings(
+    by_rule: bool = False, jobs: int = 1, path: Path = default_path
+) -> None:
+    """ Print the warnings of all users
+
+    Warnings are computed from the attributes of the users and the
+    current date (e.g. 'ldap is not set', or 'user is not (ldap)
+    vaulted' for alumni), see isensus.warnings. The warnings are
+    read from the file they are saved in (~/.isensus.warnings, see
+    isensus.warnings.view), updated each time users are modified,
+    so that no rule is evaluated (besides, once a day, for the users
+    which contract ends about now). Only users having warnings are
+    printed.
+
+    Parameters
+    ----------
+    by_rule: bool (optional)
+        if True, prints instead the userids of the users having
+        the warning of each rule, the rules being evaluated over
+        all users at once (see isensus.warnings.rule_userids)
+    jobs: int (optional)
+        with by_rule, number of processes evaluating the rules,
+        each over a chunk of the users
+    path: Path (optional)
+        absolute path to datafile (default to ~/.isensus)
+    """
+
+    if by_rule:
+        with Data(path=path, shared=True) as users:
+            table = UserTable.from_users(users)
+        for name, userids in rule_userids(table, jobs=jobs).items():
+            if userids:
+                print(name, "({})".format(len(userids)))
+                for userid in userids:
+                    print("\t", userid)
+        return
+
+    for userid, user_warnings in outstanding(path).items():
+        print(userid)
+        for warning in user_warnings:
+            print("\t", warning)
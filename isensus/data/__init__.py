@@ -1,2 +1,4 @@
-from .data import get_data, write_data, Data
+from .data import get_data, stream_data, write_data, Data
 from .user import User
+from .users import Users
+from .table import UserTable
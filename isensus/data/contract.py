@@ -13,3 +13,4 @@ class Contract(Enum):
     guest = 0
     normal = 1
     stipend = 2
+    alumni = 3
@@ -1,17 +1,68 @@
 """ Path the default json database file
 """
 
-import json, typing
+import contextlib, itertools, json, shutil, typing
 from pathlib import Path
+from . import schema
 from .user import User
-from ..defaults import default_path
+from .users import Users
+from .index import PrefixIndex, name_attributes
+from .journal import Journal
+from .reader import RecordReader, scan, schema_version, stream
+from .files import FileLock, atomic_write
+from .offsets import OffsetIndex
+from .sidecar import IndexSidecar
+from .timeline import Event, Timeline, attributes as timeline_attributes
+from .sqlite import SqliteUsers, is_sqlite
+from ..defaults import default_path, default_fsync
+from ..warnings.view import WarningsView
+from isensus import errors
 
 
-def get_data(path: Path) -> typing.Dict[str, User]:
+# users of the sessions joined by the sessions opened
+# on the same path (see joined)
+_joined: typing.Dict[Path, Users] = {}
+
+
+@contextlib.contextmanager
+def joined(path: Path, users: Users) -> typing.Iterator[None]:
+    """ Context manager for running several commands in a single
+    session (see the batch command)
+
+    Within this context, the Data sessions opened on the path
+    use the users of the session they join (as returned by an
+    enclosing Data context manager) rather than reading the
+    database, and do not write their changes: these get written
+    (at once) when the enclosing session exits. stream_data and
+    read_user read these users as well.
+
+    Parameters
+    ----------
+    path: Path
+      Absolute path to the database file
+    users: Users
+      The users of the session to join
+    """
+    _joined[path] = users
+    try:
+        yield
+    finally:
+        del _joined[path]
+
+
+def get_data(path: Path) -> Users:
     """ Read the json file database
 
-    Reads the json data file (~/.isensus by default) and
-    return the corresponding instances of User.
+    Reads the json data file (~/.isensus by default), replays
+    the changes recorded in its journal (see Journal) and
+    return the corresponding users. Instances of User are
+    created only when accessed (see Users). If the offset
+    index file (see IndexSidecar) is valid, users are read
+    from the data file only when accessed (the data file is
+    not read otherwise); it is written if missing or
+    outdated. Data files written by former versions of
+    isensus are upgraded to the current version of the
+    database format (see upgrade).
 
     Parameters
     ----------
@@ -20,49 +71,491 @@ def get_data(path: Path) -> typing.Dict[str, User]:
 
     Returns
     -------
-    users: dict
+    users: Users
         userids (str) as keys, instances of User as
         values.
     """
-    json_content = _read_json_file(path)
-    return User.from_json(json_content)
+    _check_file(path)
+    with open(path, "rb") as f:
+        outdated = schema_version(f.read(256)) < schema.version
+    if outdated:
+        upgrade(path, _read_file(path))
+    sidecar = IndexSidecar(path)
+    loaded = sidecar.load()
+    # records, or their position in the data file if not read yet
+    records: typing.Dict[str, typing.Any]
+    if loaded is None:
+        records, positions = _decode_json(path, _read_file(path))
+        index = PrefixIndex(
+            (userid, _names(record)) for userid, record in records.items()
+        )
+        sidecar.save(positions, index)
+    else:
+        positions, index = loaded
+        records = dict(positions)
+    reader = RecordReader(path)
+    # so that users are read from the current file, even if it is
+    # replaced by another session before being accessed
+    reader.open()
+    # applying the changes recorded in the journal
+    journal = Journal(path)
+    for userid, fields in journal.deltas():
+        positions.pop(userid, None)
+        if fields is None:
+            if records.pop(userid, None) is not None:
+                index.remove(userid)
+            continue
+        record = records.get(userid)
+        if isinstance(record, tuple):
+            record = reader.read(record)
+        records[userid] = {**(record or {}), **fields}
+        index.add(userid, _names(records[userid]))
+    return Users(
+        records=records,
+        index=index,
+        reader=reader,
+        positions=positions,
+        tombstones=journal.tombstones(),
+    )
+
+
+def _current_versions(
+    path: Path, userids: typing.Iterable[str]
+) -> typing.Dict[str, typing.Optional[int]]:
+    # versions of the users (None for users not in the database)
+    # currently stored in the json data file and its journal, reading
+    # only the records of these users (see OffsetIndex)
+    userids = set(userids)
+    versions: typing.Dict[str, typing.Optional[int]] = {}
+    offsets = OffsetIndex(path).open()
+    if offsets is None:
+        users = get_data(path)
+        try:
+            return {userid: users.version(userid) for userid in userids}
+        finally:
+            users.close()
+    with offsets:
+        for userid in userids:
+            row = offsets.lookup(userid)
+            if row is not None:
+                versions[userid] = offsets.record(row).get(schema.version_key, 0)
+            else:
+                versions[userid] = None
+    for userid, fields in Journal(path).deltas():
+        if userid not in userids:
+            continue
+        if fields is None:
+            versions[userid] = None
+        else:
+            versions[userid] = fields.get(schema.version_key, versions[userid] or 0)
+    return versions
+
+
+def _names(record: typing.Dict[str, typing.Any]) -> typing.Tuple[typing.Any, ...]:
+    # decoded name attributes of the encoded user
+    return tuple(User.decode_field(attr, record.get(attr)) for attr in name_attributes)
+
 
+def stream_data(path: Path) -> typing.Iterator[typing.Tuple[str, User]]:
+    """ Iterates over the users of the database, decoding one
+    user at a time
+
+    Read only alternative to get_data for commands iterating
+    over all users (e.g. list): the json data file is read by
+    chunks (see isensus.data.reader.stream) and the changes
+    recorded in its journal are applied on the fly, so that the
+    memory used does not grow with the size of the database. The
+    file is not upgraded if written by a former version of isensus.
+    sqlite3 databases are streamed as well (see SqliteUsers.items).
+
+    Parameters
+    ----------
+    path: Path
+      Absolute path to the database file
 
-def write_data(users: typing.Dict[str, User], path: Path) -> None:
+    Yields
+    ------
+    userid: str
+        userid of the user
+    user: User
+        the corresponding instance of User
+    """
+    if path in _joined:
+        yield from _joined[path].items()
+        return
+    if is_sqlite(path):
+        users = SqliteUsers(path)
+        try:
+            yield from users.items()
+        finally:
+            users.close()
+        return
+    _check_file(path)
+    with FileLock(path, shared=True):
+        deltas = Journal(path).deltas_per_user()
+        with open(path, "rb") as f:
+            if schema_version(f.read(256)) < schema.version:
+                decode = User._user_from_strings
+            else:
+                decode = User._user_from_json
+            f.seek(0)
+            try:
+                for userid, record in stream(f):
+                    if userid in deltas:
+                        applied = _apply(record, deltas.pop(userid))
+                        if applied is None:
+                            continue
+                        record = applied
+                    yield userid, decode(record)
+            except ValueError as e:
+                raise ValueError(
+                    "failed to parse isensus json "
+                    "data file {}: {}".format(path, e)
+                )
+        # users created since the data file has been written
+        for userid, user_deltas in deltas.items():
+            created = _apply(None, user_deltas)
+            if created is not None:
+                yield userid, decode(created)
+
+
+def _apply(
+    record: typing.Optional[typing.Dict[str, typing.Any]],
+    deltas: typing.Iterable[typing.Optional[typing.Dict[str, typing.Any]]],
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    # the record updated by the deltas of the journal
+    for fields in deltas:
+        record = None if fields is None else {**(record or {}), **fields}
+    return record
+
+
+def write_data(
+    users: typing.Mapping[str, User], path: Path, fsync: str = default_fsync
+) -> None:
     """
     Writes the users in the json data file
-    (~/.isensus).
+    (~/.isensus). As the file then contains
+    all the users, the related journal is cleared (except
+    for the versions of the deleted users, see Journal).
+    The file is replaced atomically (see atomic_write).
 
     Parameters
     ----------
     users: dict
       Dictionary of users to encode and write to the file.
-      keys: userid (str), values: instance of User.
+      keys: userid (str), values: instance of User. If an
+      instance of Users, only the modified users are re-encoded
+      (see Users.fragments).
     path: Path
       Absolute path to the json database file (will be 
       overwritten if exists)
+    fsync: str
+      fsync policy (see isensus.data.files)
+    """
+    if isinstance(users, Users):
+        content, positions = _assemble(users.fragments())
+        names: typing.Iterable[typing.Tuple[str, typing.Any]] = users.names()
+    else:
+        with schema.bulk():
+            content, positions = _assemble(
+                (userid, json.dumps(user.to_dict()).encode("utf-8"))
+                for userid, user in users.items()
+            )
+        names = (
+            (userid, tuple(getattr(user, attr) for attr in name_attributes))
+            for userid, user in users.items()
+        )
+    atomic_write(path, content, fsync)
+    if isinstance(users, Users):
+        users.written(path, positions)
+    OffsetIndex(path).save(positions, names)
+    # the versions of the deleted users are kept (see Journal)
+    tombstones = users.tombstones() if isinstance(users, Users) else None
+    Journal(path).clear(tombstones, fsync)
+
+
+def read_user(path: Path, usertip: str) -> typing.Optional[User]:
+    """ Returns the user corresponding to the usertip, reading
+    only its record from the json data file
+
+    Fast path for commands reading a single user (e.g. show): the
+    user is searched in the memory mapped offset index (see
+    OffsetIndex) and only its record is decoded, so that the time
+    taken does not depend on the size of the database. The changes
+    recorded in the journal are taken into account.
+
+    Parameters
+    ----------
+    path: Path
+      Absolute path to the json file database
+    usertip: str
+      End-user search string for users (see User.find_user)
+
+    Returns
+    -------
+    user: User
+      The corresponding user, or None if no user corresponds to
+      the usertip, or if the offset index can not be used (e.g.
+      sqlite3 database, index outdated or session joined, see
+      joined). The users should then
+      be read via the Data context manager.
+
+    Raises
+    ------
+    AmbiguousUserError
+        If more than one user is found.
     """
-    json_content = User.to_json(users)
-    with open(path, "w") as f:
-        f.write(json_content)
+    if is_sqlite(path) or path in _joined:
+        return None
+    with FileLock(path, shared=True):
+        return _read_user(path, usertip)
+
+
+def _read_user(path: Path, usertip: str) -> typing.Optional[User]:
+    # see read_user
+    offsets = OffsetIndex(path).open()
+    if offsets is None:
+        return None
+    with offsets:
+        deltas = Journal(path).deltas_per_user()
+        # matching users, mapped to their row in the index or their record
+        found: typing.Dict[str, typing.Any] = {}
+        for row in offsets.search(usertip):
+            userid = offsets.userid(row)
+            if userid not in deltas:
+                found[userid] = row
+        for userid, user_deltas in deltas.items():
+            position = offsets.lookup(userid)
+            record = _apply(
+                offsets.record(position) if position is not None else None,
+                user_deltas,
+            )
+            if record is not None and User.names_match(usertip, _names(record)):
+                found[userid] = record
+        if len(found) > 1:
+            raise errors.AmbiguousUserError(usertip, sorted(found))
+        if not found:
+            return None
+        (record,) = found.values()
+        if isinstance(record, int):
+            record = offsets.record(record)
+    return User._user_from_json(record)
+
+
+def _events(
+    userid: str, record: typing.Dict[str, typing.Any]
+) -> typing.Iterator[Event]:
+    # events of the dates of the (encoded) user which are set
+    for attr in timeline_attributes:
+        if attr in record:
+            date = User.decode_field(attr, record[attr])
+            if date is not None and date.ordinal is not None:
+                yield date.ordinal, attr, userid
 
 
-def _read_json_file(path: Path) -> typing.Dict[str, str]:
-    # Attempt to parse the file provided by the path,
-    # returning a (json serialized) dict or raising a
-    # FileNotFoundError or a ValueError
+def expiring(path: Path, first: int, last: int) -> typing.List[Event]:
+    """ Returns the contract ends and shadow extensions
+    of the users between two dates
+
+    The dates are searched in the timeline (see Timeline) of the json
+    data file, which is written first if missing or outdated, so
+    that (once written) the time taken does not depend on the size
+    of the database. The changes recorded in the journal are taken
+    into account. sqlite3 databases, data files written by former
+    versions of isensus and joined sessions (see joined) are
+    iterated over instead (see stream_data).
+
+    Parameters
+    ----------
+    path: Path
+      Absolute path to the database file
+    first: int
+      First date, as a day ordinal (included)
+    last: int
+      Last date, as a day ordinal (included)
+
+    Returns
+    -------
+    events: list
+      tuples (day ordinal, name of the date attribute, userid),
+      sorted by date
+    """
+    if path not in _joined and not is_sqlite(path):
+        _check_file(path)
+        with FileLock(path, shared=True):
+            events = _expiring(path, first, last)
+        if events is not None:
+            return events
+    events = []
+    for userid, user in stream_data(path):
+        for attr in timeline_attributes:
+            day = getattr(user, attr).ordinal
+            if day is not None and first <= day <= last:
+                events.append((day, attr, userid))
+    return sorted(events)
+
+
+def _expiring(
+    path: Path, first: int, last: int
+) -> typing.Optional[typing.List[Event]]:
+    # see expiring, None if the data file has not been upgraded
+    timeline = Timeline(path)
+    if not timeline.valid():
+        with open(path, "rb") as f:
+            if schema_version(f.read(256)) < schema.version:
+                return None
+            f.seek(0)
+            timeline.save(
+                event
+                for userid, record in stream(f)
+                for event in _events(userid, record)
+            )
+    mapped = timeline.open()
+    if mapped is None:
+        return None
+    with mapped:
+        events = mapped.between(first, last)
+    deltas = Journal(path).deltas_per_user()
+    if not deltas:
+        return events
+    # the dates modified since the data file has been written: all
+    # of them if the user has been deleted (and maybe created again)
+    changes = {
+        userid: (None in user_deltas, _apply({}, user_deltas) or {})
+        for userid, user_deltas in deltas.items()
+    }
+    events = [
+        (day, attr, userid)
+        for day, attr, userid in events
+        if userid not in changes
+        or not (changes[userid][0] or attr in changes[userid][1])
+    ]
+    for userid, (_, record) in changes.items():
+        events.extend(
+            event for event in _events(userid, record) if first <= event[0] <= last
+        )
+    return sorted(events)
+
+
+def _contract_ends(
+    path: Path, first: int, last: int
+) -> typing.Optional[typing.List[typing.Tuple[str, User]]]:
+    # the users which contract ends between both dates (included),
+    # found in the timeline and read via the offset index (see
+    # _expiring), the lock being held. None if the users can not be
+    # read this way.
+    events = _expiring(path, first, last)
+    if events is None:
+        return None
+    offsets = OffsetIndex(path).open()
+    if offsets is None:
+        return None
+    userids = sorted({userid for _, attr, userid in events if attr == "contract_end"})
+    users = []
+    with offsets:
+        deltas = Journal(path).deltas_per_user()
+        for userid in userids:
+            position = offsets.lookup(userid)
+            record = offsets.record(position) if position is not None else None
+            if userid in deltas:
+                record = _apply(record, deltas[userid])
+            if record is not None:
+                users.append((userid, User._user_from_json(record)))
+    return users
+
+
+# json encoding of strings (as used by json.dumps)
+_encode_key = json.encoder.encode_basestring_ascii  # type: ignore
+
+
+def _assemble(
+    fragments: typing.Iterable[typing.Tuple[str, typing.Any]]
+) -> typing.Tuple[bytes, typing.Dict[str, typing.Tuple[int, int]]]:
+    # content of the json database file (as generated by User.to_json)
+    # made of the json encoded users, and the positions of the users
+    # in it
+    parts = [b'{"version": %d, "users": {' % schema.version]
+    offset = len(parts[0])
+    positions = {}
+    separator = b""
+    for userid, fragment in fragments:
+        key = separator + _encode_key(userid).encode("ascii") + b": "
+        offset += len(key)
+        positions[userid] = (offset, len(fragment))
+        offset += len(fragment)
+        parts.append(key)
+        parts.append(fragment)
+        separator = b", "
+    parts.append(b"}}")
+    return b"".join(parts), positions
+
+
+def upgrade(path: Path, content: bytes) -> bytes:
+    """ Upgrades the json database file to the current version
+    of the database format (see isensus.data.schema)
+
+    The journal of the file is compacted into the upgraded file.
+    The original file is kept as a backup, at the same path
+    suffixed with '.v1.bak' (for version 1).
+
+    Parameters
+    ----------
+    path: Path
+      Absolute path to the json database file
+    content: bytes
+      Current content of the file
+
+    Returns
+    -------
+    content: bytes
+      The content of the upgraded file
+    """
+    records, _ = _decode_json(path, content)
+    records = Journal(path).replay(records)
+    users = {
+        userid: User._user_from_strings(record) for userid, record in records.items()
+    }
+    backup = Path(str(path) + ".v{}.bak".format(schema_version(content)))
+    shutil.copyfile(path, backup)
+    write_data(users, path)
+    return _read_file(path)
+
+
+def _check_file(path: Path) -> None:
+    # raises a FileNotFoundError if the file does not exist
     if not path.is_file():
         raise FileNotFoundError(
-            "failed to find isensus " "data file: {}".format(json_path)
+            "failed to find isensus " "data file: {}".format(path)
         )
+
+
+def _read_file(path: Path) -> bytes:
+    # returns the content of the file or raises
+    # a FileNotFoundError
+    _check_file(path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _decode_json(
+    path: Path, content: bytes
+) -> typing.Tuple[
+    typing.Dict[str, typing.Dict[str, typing.Any]],
+    typing.Dict[str, typing.Tuple[int, int]],
+]:
+    # Attempt to parse the content of the file provided by the
+    # path, returning the (json serialized) users and their
+    # positions in the file, or raising a ValueError
+    records, positions = {}, {}
     try:
-        with open(path) as f:
-            data = json.load(f)
+        for userid, offset, length, record in scan(content):
+            records[userid] = record
+            positions[userid] = (offset, length)
     except Exception as e:
         raise ValueError(
             "failed to parse isensus json " "data file {}: {}".format(path, e)
         )
-    return data
+    return records, positions
 
 
 class Data:
@@ -71,23 +564,184 @@ class Data:
     Context manager that will read the data json file
     (~/.isensus) when entering, returning the 
     corresponding dictionary {userid: instance of User}.
-    At exit, this dictionary is written back in the data
-    file. Hence, the returned dictionary is mutabled, and
-    users are expected to modify it.
+    At exit, the changes applied to this dictionary (see Users)
+    are appended to the journal of the data file (see Journal),
+    which gets compacted into the data file once
+    large enough. If the data file is a sqlite3 database (see
+    isensus.data.sqlite.migrate), the returned dictionary is an
+    instance of SqliteUsers, and the changes are written to the
+    database instead. Hence, the returned dictionary is mutabled,
+    and users are expected to modify it. Nothing is written
+    if the dictionary has not been modified, or if an exception
+    has been raised within the context.
+
+    Sessions which may modify the json data file are optimistic: the
+    file is locked (see FileLock) only while being read, so that
+    sessions may run in parallel. At exit, under an exclusive lock,
+    the version of each changed user (see Users.version) is compared
+    to the one currently in the database: if another session wrote
+    changes to one of these users meanwhile, a ConflictError is
+    raised and nothing is written. Otherwise the changes are
+    appended to the journal, i.e. merged with the changes of the
+    other sessions (which are not visible to this session).
+    Read only sessions (shared=True) hold a shared lock and sqlite3
+    sessions an exclusive lock during the whole session. Sessions
+    opened within the joined context manager use the users of the
+    joined session instead, and write nothing.
 
     Parameters
     ----------
     path: Path (optional)
       Absolute path to the json file database.
       Defaults to ~/.isensus
+    shared: bool (optional)
+      If True, the session is read only: a shared lock is taken,
+      and a RuntimeError is raised at exit if users have been
+      modified.
+    fsync: str (optional)
+      fsync policy used when writing the database (see
+      isensus.data.files). Defaults to the ISENSUS_FSYNC
+      environment variable, or "file".
     """
 
-    def __init__(self, path: default_path):
+    def __init__(
+        self,
+        path: Path = default_path,
+        shared: bool = False,
+        fsync: typing.Optional[str] = None,
+    ):
         self._path = path
+        self._journal = Journal(path)
+        self._shared = shared
+        self._lock = FileLock(path, shared=True)
+        self._fsync = fsync if fsync is not None else default_fsync
 
-    def __enter__(self) -> typing.Dict[str, User]:
-        self._users = get_data(self._path)
+    def __enter__(self) -> Users:
+        self._joining = self._path in _joined
+        if self._joining:
+            self._users = _joined[self._path]
+            return self._users
+        sqlite = is_sqlite(self._path)
+        # exclusive lock only for sqlite3 sessions which may modify users
+        self._lock.acquire(shared=self._shared or not sqlite)
+        try:
+            self._users = self._load(sqlite)
+        except BaseException:
+            self._lock.release()
+            raise
+        if not self._shared and not sqlite:
+            # optimistic session, see _commit
+            self._lock.release()
         return self._users
 
+    def _load(self, sqlite: bool) -> Users:
+        # reads the database, the lock being held
+        if sqlite:
+            return SqliteUsers(self._path)
+        if self._outdated():
+            # the data file will be upgraded (i.e. written)
+            self._lock.acquire(shared=False)
+        return get_data(self._path)
+
+    def _outdated(self) -> bool:
+        # True if the data file has been written by a
+        # former version of isensus (see upgrade)
+        try:
+            with open(self._path, "rb") as f:
+                return schema_version(f.read(256)) < schema.version
+        except FileNotFoundError:
+            return False
+
     def __exit__(self, type, value, traceback):
-        write_data(self._users, self._path)
+        if self._joining:
+            return
+        try:
+            if type is None:
+                self.commit()
+        finally:
+            self._users.close()
+            self._lock.release()
+
+    def commit(self) -> None:
+        """ Writes the changes applied to the users so far, without
+        ending the session (see also rollback). Called at exit.
+
+        Raises
+        ------
+        ConflictError
+            if users modified in this session have been modified by
+            another session meanwhile (nothing is then written)
+        RuntimeError
+            if users have been modified in a read only session
+        """
+        if self._joining or not self._users.modified():
+            return
+        if self._shared:
+            raise RuntimeError(
+                "users modified in a read only session of {}".format(self._path)
+            )
+        self._commit()
+
+    def rollback(self) -> Users:
+        """ Discards the changes applied to the users since the last
+        commit and reads the database again, so that the changes
+        written meanwhile by other sessions become visible.
+
+        Returns
+        -------
+        users: Users
+            the users read, to be used instead of the ones
+            returned when entering the session
+        """
+        if self._joining:
+            return self._users
+        self._users.close()
+        sqlite = isinstance(self._users, SqliteUsers)
+        locked = self._shared or sqlite
+        if not locked:
+            self._lock.acquire(shared=True)
+        try:
+            self._users = self._load(sqlite)
+        finally:
+            if not locked:
+                self._lock.release()
+        return self._users
+
+    def _commit(self) -> None:
+        view = WarningsView(self._path)
+        if isinstance(self._users, SqliteUsers):
+            updated, deleted = self._users.changes()
+            valid = view.valid()
+            self._users.commit()
+            view.update(self._users, updated, deleted, valid)
+            return
+        updated, deleted = self._users.changes()
+        expected = {
+            userid: self._users.version(userid)
+            for userid in itertools.chain(updated, deleted)
+        }
+        with FileLock(self._path):
+            current = _current_versions(self._path, expected)
+            conflicts = [
+                userid
+                for userid, version in expected.items()
+                if current[userid] != version
+            ]
+            if conflicts:
+                raise errors.ConflictError(sorted(conflicts))
+            valid = view.valid()
+            self._journal.append(
+                updated,
+                {userid: expected[userid] for userid in deleted},
+                fsync=self._fsync,
+            )
+            if self._journal.needs_compaction():
+                # the users of this session may be outdated (changes
+                # of other sessions), the data file is read again
+                users = get_data(self._path)
+                try:
+                    write_data(users, self._path, fsync=self._fsync)
+                finally:
+                    users.close()
+            view.update(self._users, updated, deleted, valid)
+        self._users.mark_clean()
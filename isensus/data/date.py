@@ -1,14 +1,19 @@
-import datetime
+import datetime, functools, typing
 
 
+@functools.total_ordering
 class Date:
 
     """ Class representing a date.
 
-    Some of the User's attribute are expected to 
+    Some of the User's attribute are expected to
     be instance of Date (e.g. shadow_extension,
     contract_start, contract_end).
-    
+    Dates are stored as day ordinals (see
+    datetime.date.toordinal), which makes them cheap
+    to compare and sort. A date which is not set is
+    lower than all dates which are set.
+
     Parameters
     ----------
     date: str
@@ -24,34 +29,77 @@ class Date:
 
     str_format: str = "%Y-%m-%d"
 
+    __slots__ = ("_ordinal",)
+
     def __init__(self, date: str):
-        if date:
-            self._date: datetime.datetime = self._from_string(date)
-        else:
-            self._date = None
+        self._ordinal: typing.Optional[int] = self._from_string(date)
+
+    @classmethod
+    def from_ordinal(cls, ordinal: typing.Optional[int]) -> "Date":
+        """ Returns the date corresponding to the day ordinal
+        (see datetime.date.toordinal), not set if None or 0.
+        """
+        instance = cls.__new__(cls)
+        instance._ordinal = ordinal or None
+        return instance
 
-    def get(self):
-        return self._date
+    @property
+    def ordinal(self) -> typing.Optional[int]:
+        """ Day ordinal of the date (see datetime.date.toordinal),
+        None if the date is not set
+        """
+        return self._ordinal
+
+    def get(self) -> typing.Optional[datetime.datetime]:
+        if self._ordinal is None:
+            return None
+        return datetime.datetime.fromordinal(self._ordinal)
 
     def __repr__(self) -> str:
-        if self._date is None:
+        if self._ordinal is None:
             return ""
         return str(self)
 
     def __str__(self) -> str:
-        if self._date:
-            return datetime.datetime.strftime(self._date, self.str_format)
+        if self._ordinal:
+            return _to_string(self._ordinal)
         else:
             return "Not set"
 
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Date):
+            return NotImplemented
+        return self._ordinal == other._ordinal
+
+    def __lt__(self, other: object) -> bool:
+        if not isinstance(other, Date):
+            return NotImplemented
+        return (self._ordinal or 0) < (other._ordinal or 0)
+
+    def __hash__(self) -> int:
+        return hash(self._ordinal)
+
     @classmethod
-    def _from_string(cls, date: str) -> datetime.datetime:
+    def _from_string(cls, date: str) -> typing.Optional[int]:
         if date is None or not date:
             return None
-        try:
-            instance: datetime.datetime = datetime.datetime.strptime(
-                date, cls.str_format
-            )
-        except ValueError:
-            raise ValueError(str("date should be of format YEAR-MONTH-DAY"))
-        return instance
+        return _parse(date)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse(date: str) -> int:
+    # day ordinal of the date (format YEAR-MONTH-DAY). Many
+    # users share the same dates (e.g. contract start), hence
+    # the cache.
+    try:
+        if len(date) == 10 and date[4] == "-" and date[7] == "-":
+            return datetime.date.fromisoformat(date).toordinal()
+        # month and day not zero padded, e.g. 2021-3-5
+        return datetime.datetime.strptime(date, Date.str_format).toordinal()
+    except (ValueError, TypeError):
+        raise ValueError(str("date should be of format YEAR-MONTH-DAY"))
+
+
+@functools.lru_cache(maxsize=4096)
+def _to_string(ordinal: int) -> str:
+    return datetime.date.fromordinal(ordinal).isoformat()
@@ -0,0 +1,198 @@
+""" Atomic writes and advisory locking of the database files
+
+Several isensus processes (e.g. two IT admins, or a cron job) may
+access the database concurrently. Sessions reading the database take
+a shared lock, sessions modifying it an exclusive lock (see FileLock),
+and files are written to a temporary file which is then renamed
+(see atomic_write), so that readers never see partially written files.
+
+Data written to files may be synced to disk according to an fsync
+policy:
+
+- "none": never synced (left to the operating system)
+- "file": files are synced before being renamed, and after
+  being appended to (e.g. the journal)
+- "full": as "file", and the directory is synced as well after
+  a file has been renamed
+"""
+
+import os, struct, tempfile, typing
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # not available on windows, on which files are not locked
+    fcntl = None  # type: ignore
+
+"""supported fsync policies"""
+fsync_policies: typing.Tuple[str, ...] = ("none", "file", "full")
+
+
+def _check_policy(fsync: str) -> None:
+    if fsync not in fsync_policies:
+        raise ValueError(
+            "fsync policy should be one of: {}".format(", ".join(fsync_policies))
+        )
+
+
+def sync(f: typing.IO, fsync: str) -> None:
+    """ Flushes the file and syncs it to disk, unless the fsync
+    policy is "none"
+    """
+    _check_policy(fsync)
+    f.flush()
+    if fsync != "none":
+        os.fsync(f.fileno())
+
+
+def _sync_directory(path: Path) -> None:
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: Path, content: bytes, fsync: str = "file") -> None:
+    """ Writes the content to the file atomically
+
+    The content is written to a temporary file in the same directory,
+    which then replaces the file: processes reading the file see
+    either its former or its new content.
+
+    Parameters
+    ----------
+    path: Path
+        Absolute path to the file
+    content: bytes
+        the new content of the file
+    fsync: str
+        fsync policy (see the module documentation)
+    """
+    _check_policy(fsync)
+    fd, tmp = tempfile.mkstemp(
+        dir=str(path.parent), prefix=path.name + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+            sync(f, fsync)
+        if path.exists():
+            os.chmod(tmp, path.stat().st_mode & 0o777)
+        os.replace(tmp, str(path))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    if fsync == "full":
+        _sync_directory(path.parent)
+
+
+def file_stat(path: Path) -> typing.Optional[typing.Tuple[int, int, int]]:
+    """ Returns the modification time (ns), size and inode of the
+    file, which change each time the file is written (None if the
+    file does not exist)
+    """
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def sidecar_header(
+    header: struct.Struct, magic: bytes, database: Path, *values: int
+) -> bytes:
+    """ Returns the header of a binary file generated from the
+    database file (e.g. OffsetIndex): the magic, the file_stat of
+    the database file, and the values (e.g. number of entries)
+
+    Raises
+    ------
+    FileNotFoundError
+        if the database file does not exist
+    """
+    stat = file_stat(database)
+    if stat is None:
+        raise FileNotFoundError(str(database))
+    return header.pack(magic, *stat, *values)
+
+
+def sidecar_valid(
+    path: Path, header: struct.Struct, magic: bytes, database: Path
+) -> bool:
+    """ Returns True if the binary file exists, and its header
+    (see sidecar_header) corresponds to the current database file
+    """
+    try:
+        with open(path, "rb") as f:
+            content = f.read(header.size)
+    except OSError:
+        return False
+    if len(content) != header.size:
+        return False
+    values = header.unpack(content)
+    return values[0] == magic and tuple(values[1:4]) == file_stat(database)
+
+
+class FileLock:
+    """ Advisory lock on the database file
+
+    Context manager locking the file living next to the database
+    (~/.isensus.lock), using fcntl.flock. Any number of processes
+    may hold a shared lock at the same time, while an exclusive lock
+    is held by a single process (and no shared lock). Entering the
+    context blocks until the lock is acquired. On platforms without
+    fcntl, nothing is locked.
+
+    Parameters
+    ----------
+    path: Path
+        Absolute path to the database file (the lock file is this
+        path suffixed with '.lock')
+    shared: bool
+        True for a shared lock, False for an exclusive lock
+    """
+
+    suffix: str = ".lock"
+
+    def __init__(self, path: Path, shared: bool = False):
+        self._path = Path(str(path) + self.suffix)
+        self._shared = shared
+        self._fd: typing.Optional[int] = None
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def shared(self) -> bool:
+        return self._shared
+
+    def acquire(self, shared: typing.Optional[bool] = None) -> None:
+        """ Acquires the lock (or converts the lock already held
+        into a shared / an exclusive lock)
+        """
+        if shared is not None:
+            self._shared = shared
+        if self._fd is None:
+            self._fd = os.open(str(self._path), os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_SH if self._shared else fcntl.LOCK_EX)
+
+    def release(self) -> None:
+        """ Releases the lock """
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.release()
@@ -0,0 +1,183 @@
+import collections, heapq, math, typing, unicodedata
+from .index import name_attributes
+
+# german umlauts are commonly written with an 'e' instead
+# of the diaeresis (e.g. "Mueller" for "Müller")
+_transliterations = str.maketrans(
+    {"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss", "Ä": "Ae", "Ö": "Oe", "Ü": "Ue"}
+)
+
+
+def normalize(text: str) -> str:
+    """ Returns a normalized version of the text, for comparison
+    of names regardless of case, accents and transliteration of
+    umlauts (e.g. "Müller", "mueller" and "MUELLER" are all
+    normalized to "mueller").
+    """
+    text = unicodedata.normalize("NFC", text).translate(_transliterations)
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+def trigrams(text: str) -> typing.Set[str]:
+    """ Returns the trigrams of the (normalized) text. Words are
+    padded with two spaces at the beginning and one at the end, so
+    that matching beginnings of words weight more.
+    """
+    grams: typing.Set[str] = set()
+    for word in normalize(text).split():
+        padded = "  " + word + " "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """ Index of the users by trigrams of their names, for fuzzy search.
+
+    Allows to find the users which names (userid, first name, last
+    name) are similar to a search string, even if mistyped or
+    differently transliterated. The similarity of a search string and
+    a name is the ratio of the trigrams (see the trigrams function)
+    they share over the trigrams they have overall (Jaccard index).
+    The score of a user is the highest similarity of its names.
+
+    Parameters
+    ----------
+    entries: iterable
+        tuples (userid, names), names being a tuple of
+        the names of the user (None for names not set)
+    """
+
+    attributes: typing.Tuple[str, ...] = name_attributes
+
+    def __init__(
+        self,
+        entries: typing.Iterable[
+            typing.Tuple[str, typing.Sequence[typing.Optional[str]]]
+        ] = (),
+    ):
+        # names of the indexed users (as passed to add)
+        self._names: typing.Dict[str, typing.Tuple[typing.Optional[str], ...]] = {}
+        # each name of each user is indexed as an entry (int)
+        self._entries: typing.Dict[int, typing.Tuple[str, int]] = {}
+        self._user_entries: typing.Dict[
+            str, typing.List[typing.Tuple[int, str]]
+        ] = {}
+        self._next_entry = 0
+        # trigram: entries having it
+        self._postings: typing.Dict[str, typing.Set[int]] = collections.defaultdict(
+            set
+        )
+        for userid, names in entries:
+            self.add(userid, names)
+
+    def __contains__(self, userid: object) -> bool:
+        return userid in self._names
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def values(self, userid: str) -> typing.Tuple[typing.Optional[str], ...]:
+        """ Returns the names the user has been indexed with
+
+        Raises
+        ------
+        KeyError
+            if the user is not indexed
+        """
+        return self._names[userid]
+
+    def add(self, userid: str, names: typing.Sequence[typing.Optional[str]]) -> None:
+        """ Adds a user to the index (replacing its names if
+        already indexed)
+
+        Parameters
+        ----------
+        userid: str
+            userid of the user
+        names: tuple
+            names of the user (None for names not set)
+        """
+        if userid in self._names:
+            self.remove(userid)
+        names = tuple(names)
+        self._names[userid] = names
+        entries = []
+        for name in names:
+            if not name:
+                continue
+            grams = trigrams(name)
+            if not grams:
+                continue
+            entry = self._next_entry
+            self._next_entry += 1
+            self._entries[entry] = (userid, len(grams))
+            for gram in grams:
+                self._postings[gram].add(entry)
+            entries.append((entry, name))
+        self._user_entries[userid] = entries
+
+    def remove(self, userid: str) -> None:
+        """ Removes a user from the index
+
+        Raises
+        ------
+        KeyError
+            if the user is not indexed
+        """
+        del self._names[userid]
+        for entry, name in self._user_entries.pop(userid):
+            del self._entries[entry]
+            for gram in trigrams(name):
+                postings = self._postings[gram]
+                postings.discard(entry)
+                if not postings:
+                    del self._postings[gram]
+
+    def search(
+        self, text: str, limit: int = 10, threshold: float = 0.3
+    ) -> typing.List[typing.Tuple[str, float]]:
+        """ Returns the users which names are the most similar to the text
+
+        Parameters
+        ----------
+        text: str
+            search string
+        limit: int
+            maximal number of users returned
+        threshold: float
+            minimal score (between 0 and 1) of the returned users
+
+        Returns
+        -------
+        users: list
+            tuples (userid, score), sorted by decreasing score
+            (and by userid for users of the same score).
+        """
+        grams = trigrams(text)
+        if not grams:
+            return []
+        # an entry sharing less than min_count trigrams with the
+        # text can not reach the threshold (entries have at least
+        # one trigram). Such entries must be in at least one of
+        # the len(grams) - min_count + 1 smallest postings, so
+        # the largest postings are used only for counting.
+        min_count = max(1, math.ceil(threshold * (len(grams) + 1) / (1 + threshold)))
+        postings = sorted(
+            (self._postings.get(gram, set()) for gram in grams), key=len
+        )
+        nb_rare = max(len(postings) - min_count + 1, 0)
+        counts: typing.Counter[int] = collections.Counter()
+        for rare in postings[:nb_rare]:
+            counts.update(rare)
+        for entry in counts:
+            counts[entry] += sum(entry in common for common in postings[nb_rare:])
+        scores: typing.Dict[str, float] = {}
+        for entry, count in counts.items():
+            userid, size = self._entries[entry]
+            score = count / (len(grams) + size - count)
+            if score >= threshold and score > scores.get(userid, 0.0):
+                scores[userid] = score
+        return heapq.nsmallest(
+            limit, scores.items(), key=lambda item: (-item[1], item[0])
+        )
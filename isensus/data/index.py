@@ -0,0 +1,143 @@
+import bisect, typing
+
+"""attributes User.find_user searches the usertip into"""
+name_attributes: typing.Tuple[str, ...] = ("userid", "firstname", "lastname")
+
+
+class PrefixIndex:
+    """ Index of the users by (lower case) names, for usertip search.
+
+    Sorted array of the lower case names of the users (userid, first
+    name and last name, see User.maybe_me), allowing to find the
+    users matching a usertip via bisection, i.e. in
+    O(log(number of users) + number of matches), rather than by
+    checking all users.
+
+    Parameters
+    ----------
+    entries: iterable
+        tuples (userid, names), names being a tuple of
+        the names of the user (None for names not set)
+    """
+
+    attributes: typing.Tuple[str, ...] = name_attributes
+
+    def __init__(
+        self,
+        entries: typing.Iterable[
+            typing.Tuple[str, typing.Sequence[typing.Optional[str]]]
+        ] = (),
+    ):
+        # names of the indexed users (as passed to add)
+        self._names: typing.Dict[str, typing.Tuple[typing.Optional[str], ...]] = {}
+        pairs: typing.List[typing.Tuple[str, str]] = []
+        for userid, names in entries:
+            names = tuple(names)
+            self._names[userid] = names
+            pairs.extend((key, userid) for key in self._keys(names))
+        pairs.sort()
+        # sorted lower case names, and the corresponding userids
+        self._keys_array: typing.List[str] = [key for key, _ in pairs]
+        self._userids: typing.List[str] = [userid for _, userid in pairs]
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        """ Returns a (json serializable) dictionary representation
+        of the index (see from_dict)
+        """
+        return {
+            "names": self._names,
+            "keys": self._keys_array,
+            "userids": self._userids,
+        }
+
+    @classmethod
+    def from_dict(cls, d: typing.Dict[str, typing.Any]) -> "PrefixIndex":
+        """ Returns the index corresponding to the dictionary
+        (as generated by to_dict), without sorting the names again.
+        """
+        instance = cls()
+        instance._names = {
+            userid: tuple(names) for userid, names in d["names"].items()
+        }
+        instance._keys_array = d["keys"]
+        instance._userids = d["userids"]
+        return instance
+
+    @staticmethod
+    def _keys(names: typing.Iterable[typing.Optional[str]]) -> typing.Set[str]:
+        return {name.lower() for name in names if name}
+
+    def __contains__(self, userid: object) -> bool:
+        return userid in self._names
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def values(self, userid: str) -> typing.Tuple[typing.Optional[str], ...]:
+        """ Returns the names the user has been indexed with
+
+        Raises
+        ------
+        KeyError
+            if the user is not indexed
+        """
+        return self._names[userid]
+
+    def add(self, userid: str, names: typing.Sequence[typing.Optional[str]]) -> None:
+        """ Adds a user to the index (replacing its names if
+        already indexed)
+
+        Parameters
+        ----------
+        userid: str
+            userid of the user
+        names: tuple
+            names of the user (None for names not set)
+        """
+        if userid in self._names:
+            self.remove(userid)
+        names = tuple(names)
+        self._names[userid] = names
+        for key in self._keys(names):
+            position = bisect.bisect_left(self._keys_array, key)
+            # keeping entries of same key ordered by userid
+            while (
+                position < len(self._keys_array)
+                and self._keys_array[position] == key
+                and self._userids[position] < userid
+            ):
+                position += 1
+            self._keys_array.insert(position, key)
+            self._userids.insert(position, userid)
+
+    def remove(self, userid: str) -> None:
+        """ Removes a user from the index
+
+        Raises
+        ------
+        KeyError
+            if the user is not indexed
+        """
+        names = self._names.pop(userid)
+        for key in self._keys(names):
+            position = bisect.bisect_left(self._keys_array, key)
+            while self._userids[position] != userid:
+                position += 1
+            del self._keys_array[position]
+            del self._userids[position]
+
+    def search(self, usertip: str) -> typing.List[str]:
+        """ Returns the (sorted) userids of the users for which the usertip
+        is the beginning of one of their names (case insensitive)
+        """
+        tip = usertip.lower()
+        found = set()
+        position = bisect.bisect_left(self._keys_array, tip)
+        keys = self._keys_array
+        while position < len(keys) and keys[position].startswith(tip):
+            found.add(self._userids[position])
+            position += 1
+        if not tip:
+            # users with no names set
+            found.update(self._names.keys())
+        return sorted(found)
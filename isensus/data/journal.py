@@ -0,0 +1,242 @@
+import json, typing
+from pathlib import Path
+from . import schema
+from .files import atomic_write, sync
+
+
+def _end_torn_line(f: typing.BinaryIO, chunk_size: int = 4096) -> None:
+    # ends the last line if an interrupted process did not, so that
+    # the next delta does not get appended to it: the line is removed
+    # if incomplete (as it is ignored, see Journal.deltas), and
+    # terminated if only its newline is missing
+    end = f.seek(0, 2)
+    position = end
+    while position > 0:
+        start = max(0, position - chunk_size)
+        f.seek(start)
+        chunk = f.read(position - start)
+        newline = chunk.rfind(b"\n")
+        if newline != -1:
+            position = start + newline + 1
+            break
+        position = start
+    if position == end:
+        return
+    f.seek(position)
+    try:
+        json.loads(f.read())
+    except ValueError:
+        f.truncate(position)
+    else:
+        f.write(b"\n")
+
+
+def _tombstones(
+    deleted: typing.Mapping[str, typing.Optional[int]]
+) -> typing.List[str]:
+    # journal lines of the deletions of the users
+    lines = []
+    for userid, version in deleted.items():
+        delta: typing.Dict[str, typing.Any] = {"userid": userid, "deleted": True}
+        if version is not None:
+            delta[schema.version_key] = version
+        lines.append(json.dumps(delta))
+    return lines
+
+
+class Journal:
+    """ Append-only journal of changes applied to the json database.
+
+    Rather than re-writing the full json database file (~/.isensus)
+    each time a user is modified, the changes are appended to a journal
+    file living next to it (~/.isensus.journal). Each line of the journal
+    is a json encoded delta, either setting some attributes of a user:
+
+    {"userid": "bmarley", "fields": {"ldap": true}}
+
+    or deleting a user:
+
+    {"userid": "bmarley", "deleted": true, "_version": 3}
+
+    The version of a deleted user (see Users.version) is kept in its
+    deletion (tombstone), so that a user created again with the same
+    userid gets a greater version. The journal is replayed over the
+    json database when loaded, and compacted into it (i.e. the json
+    database is re-written and the journal emptied, except for the
+    tombstones) once its size exceeds compaction_threshold bytes.
+
+    Parameters
+    ----------
+    path: Path
+        Absolute path to the json database file (the journal
+        file is this path suffixed with '.journal')
+    """
+
+    suffix: str = ".journal"
+    compaction_threshold: int = 1 << 20
+
+    def __init__(self, path: Path):
+        self._path = Path(str(path) + self.suffix)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def size(self) -> int:
+        """ Returns the size of the journal file (in bytes),
+        0 if the file does not exist.
+        """
+        try:
+            return self._path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def needs_compaction(self) -> bool:
+        """ Returns True if the journal grew larger than
+        compaction_threshold bytes.
+        """
+        return self.size() > self.compaction_threshold
+
+    def append(
+        self,
+        updated: typing.Dict[str, typing.Dict[str, typing.Any]],
+        deleted: typing.Mapping[str, typing.Optional[int]],
+        fsync: str = "file",
+    ) -> None:
+        """ Appends deltas to the journal
+
+        Parameters
+        ----------
+        updated: dict
+            keys: userids, values: dictionary of the updated
+            attributes (json encoded values, see User.to_dict).
+        deleted: dict
+            keys: userids of the deleted users, values: their
+            version (None for users not written yet)
+        fsync: str
+            fsync policy (see isensus.data.files)
+        """
+        lines = _tombstones(deleted)
+        lines.extend(
+            json.dumps({"userid": userid, "fields": fields})
+            for userid, fields in updated.items()
+        )
+        if not lines:
+            return
+        with open(self._path, "a+b") as f:
+            _end_torn_line(f)
+            f.write(("\n".join(lines) + "\n").encode("utf-8"))
+            sync(f, fsync)
+
+    def deltas(
+        self,
+    ) -> typing.Iterator[
+        typing.Tuple[str, typing.Optional[typing.Dict[str, typing.Any]]]
+    ]:
+        """ Iterates over the deltas of the journal
+
+        Yields
+        ------
+        userid: str
+            userid of the updated or deleted user
+        fields: dict or None
+            the updated attributes (json encoded values, see
+            User.to_dict), or None if the user has been deleted
+        """
+        if not self._path.is_file():
+            return
+        with open(self._path) as f:
+            for line in f:
+                try:
+                    delta = json.loads(line)
+                except ValueError:
+                    # an incomplete last line may have been written
+                    # by an interrupted process: ignoring it
+                    continue
+                if delta.get("deleted"):
+                    yield delta["userid"], None
+                else:
+                    yield delta["userid"], delta["fields"]
+
+    def tombstones(self) -> typing.Dict[str, int]:
+        """ Returns the versions of the deleted users: userids of
+        the users which last delta is a deletion as keys, the
+        version they had when deleted as values
+        """
+        tombstones: typing.Dict[str, int] = {}
+        if not self._path.is_file():
+            return tombstones
+        with open(self._path) as f:
+            for line in f:
+                try:
+                    delta = json.loads(line)
+                except ValueError:
+                    continue
+                version = delta.get(schema.version_key)
+                if delta.get("deleted") and version is not None:
+                    tombstones[delta["userid"]] = version
+                else:
+                    tombstones.pop(delta["userid"], None)
+        return tombstones
+
+    def deltas_per_user(
+        self,
+    ) -> typing.Dict[str, typing.List[typing.Optional[typing.Dict[str, typing.Any]]]]:
+        """ Returns the deltas of the journal (see deltas) grouped
+        by user: userids as keys, lists of the updated attributes
+        (None for deletions) as values, in the order of the journal
+        """
+        grouped: typing.Dict[
+            str, typing.List[typing.Optional[typing.Dict[str, typing.Any]]]
+        ] = {}
+        for userid, fields in self.deltas():
+            grouped.setdefault(userid, []).append(fields)
+        return grouped
+
+    def replay(
+        self, json_content: typing.Dict[str, typing.Dict[str, typing.Any]]
+    ) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+        """ Applies the journal's deltas to the (decoded) json database
+
+        Parameters
+        ----------
+        json_content: dict
+            The decoded json database, as returned by json.load
+            (updated in place).
+
+        Returns
+        -------
+        json_content: dict
+            The updated json database.
+        """
+        for userid, fields in self.deltas():
+            if fields is None:
+                json_content.pop(userid, None)
+            else:
+                json_content.setdefault(userid, {}).update(fields)
+        return json_content
+
+    def clear(
+        self,
+        tombstones: typing.Optional[typing.Mapping[str, int]] = None,
+        fsync: str = "file",
+    ) -> None:
+        """ Deletes the journal file (to be called once its
+        content has been compacted into the json database).
+
+        Parameters
+        ----------
+        tombstones: dict (optional)
+            versions of the deleted users (see tombstones), kept
+            as the only deltas of the journal
+        fsync: str
+            fsync policy (see isensus.data.files)
+        """
+        if tombstones:
+            lines = _tombstones(tombstones)
+            atomic_write(self._path, ("\n".join(lines) + "\n").encode("utf-8"), fsync)
+            return
+        try:
+            self._path.unlink()
+        except FileNotFoundError:
+            pass
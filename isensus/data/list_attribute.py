@@ -9,13 +9,31 @@ class ListAttribute:
     ListAttribute is the mother class for such attributes. 
     An instance of ListAttribute stores all indexed values as a
     single string separated by a <br> separator. 
+    The 'modified' attribute is set to True when an entry
+    is removed, and the 'on_change' attribute (if not None)
+    is then called with the instance (see UserRow).
     """
 
     separator: str = "<br>"
 
     def __init__(self, content: str):
         self._items: typing.List[str] = content.split(self.separator)
-        
+        self.modified: bool = False
+        self.on_change: typing.Optional[
+            typing.Callable[["ListAttribute"], None]
+        ] = None
+
+    @classmethod
+    def from_items(cls, items: typing.Iterable[str]) -> "ListAttribute":
+        """ Returns an instance which entries are the items """
+        instance = cls("")
+        instance._items = list(items)
+        return instance
+
+    def items(self) -> typing.List[str]:
+        """ Returns (a copy of) the list of entries """
+        return list(self._items)
+
     def get(self,index: int) -> str:
         """ Returns the item at the specified index,
         or raises an IndexError.
@@ -44,6 +62,9 @@ class ListAttribute:
         IndexError
         """
         del self._items[index]
+        self.modified = True
+        if self.on_change is not None:
+            self.on_change(self)
 
     def __repr__(self) -> str:
         return self.separator.join(self._items)
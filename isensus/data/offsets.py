@@ -0,0 +1,278 @@
+import json, mmap, struct, typing
+from pathlib import Path
+from .files import atomic_write, sidecar_header, sidecar_valid
+from .index import PrefixIndex, name_attributes
+
+# header: magic, modification time (ns), size and inode of the json
+# database file the index has been generated for, number of users,
+# number of keys
+_header = struct.Struct("<8sqqqII")
+_magic = b"isensus2"
+# users, sorted by userid: position of the encoded user in the json
+# database file (offset, length), position of the userid in the
+# strings (offset, length), then of each name (see name_attributes)
+_user = struct.Struct("<QIII" + "II" * len(name_attributes))
+# length of the names which are not set (None)
+_unset = 0xFFFFFFFF
+# position of the offset of each name in the unpacked users
+_name_slots = range(4, 4 + 2 * len(name_attributes), 2)
+# keys, sorted: position of the (lower case) name in the strings
+# (offset, length), row of the user in the users table
+_key = struct.Struct("<III")
+
+
+class _Utf8:
+    # utf-8 decoded slices of bytes, sliced by byte positions
+    def __init__(self, content: bytes):
+        self._content = content
+
+    def __getitem__(self, key: slice) -> str:
+        return self._content[key].decode("utf-8")
+
+
+class MappedOffsets:
+    """ Memory mapped OffsetIndex, as returned by OffsetIndex.open
+
+    Both the index file and the json database file are memory mapped,
+    so that finding a user and decoding its record reads only a few
+    pages of each, whatever the size of the database.
+
+    Parameters
+    ----------
+    index: mmap
+        the memory mapped index file
+    database: mmap
+        the memory mapped json database file
+    """
+
+    def __init__(self, index: mmap.mmap, database: mmap.mmap):
+        self._index = index
+        self._database = database
+        _, _, _, _, self._nb_users, self._nb_keys = _header.unpack_from(index, 0)
+        self._users_start = _header.size
+        self._keys_start = self._users_start + self._nb_users * _user.size
+        self._strings_start = self._keys_start + self._nb_keys * _key.size
+
+    def __enter__(self) -> "MappedOffsets":
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._nb_users
+
+    def _string(self, offset: int, length: int) -> bytes:
+        start = self._strings_start + offset
+        return self._index[start : start + length]
+
+    def _user(self, row: int) -> typing.Tuple[int, ...]:
+        return _user.unpack_from(self._index, self._users_start + row * _user.size)
+
+    def _key(self, position: int) -> typing.Tuple[bytes, int]:
+        offset, length, row = _key.unpack_from(
+            self._index, self._keys_start + position * _key.size
+        )
+        return self._string(offset, length), row
+
+    def userid(self, row: int) -> str:
+        """ Returns the userid of the user of the row """
+        offset, length = self._user(row)[2:4]
+        return self._string(offset, length).decode("utf-8")
+
+    def record(self, row: int) -> typing.Dict[str, typing.Any]:
+        """ Returns the decoded user of the row (see User.to_dict),
+        read from the json database file
+        """
+        offset, length = self._user(row)[:2]
+        return json.loads(self._database[offset : offset + length])
+
+    def load(
+        self,
+    ) -> typing.Tuple[typing.Dict[str, typing.Tuple[int, int]], PrefixIndex]:
+        """ Returns the positions of all users in the json database
+        file (userids as keys, tuples (offset, length) as values, in
+        the order of the file) and their usertip index, read from the
+        tables of the index (i.e. without sorting the names again)
+        """
+        strings = self._index[self._strings_start :]
+        if strings.isascii():
+            # byte and character positions are the same
+            text: typing.Any = strings.decode("ascii")
+        else:
+            text = _Utf8(strings)
+        users = list(
+            _user.iter_unpack(self._index[self._users_start : self._keys_start])
+        )
+        userids = [text[user[2] : user[2] + user[3]] for user in users]
+        # names of all users, then grouped per user
+        values = [
+            text[user[slot] : user[slot] + user[slot + 1]]
+            if user[slot + 1] != _unset
+            else None
+            for user in users
+            for slot in _name_slots
+        ]
+        names = dict(zip(userids, zip(*[iter(values)] * len(_name_slots))))
+        keys = list(
+            _key.iter_unpack(self._index[self._keys_start : self._strings_start])
+        )
+        index = PrefixIndex.from_dict(
+            {
+                "names": names,
+                "keys": [text[offset : offset + length] for offset, length, _ in keys],
+                "userids": [userids[row] for _, _, row in keys],
+            }
+        )
+        rows = sorted(range(len(users)), key=lambda row: users[row][0])
+        positions = {userids[row]: (users[row][0], users[row][1]) for row in rows}
+        return positions, index
+
+    def lookup(self, userid: str) -> typing.Optional[int]:
+        """ Returns the row of the user, None if not indexed """
+        target = userid.encode("utf-8")
+        low, high = 0, self._nb_users
+        while low < high:
+            middle = (low + high) // 2
+            offset, length = self._user(middle)[2:4]
+            if self._string(offset, length) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._nb_users and self.userid(low) == userid:
+            return low
+        return None
+
+    def search(self, usertip: str) -> typing.List[int]:
+        """ Returns the (sorted) rows of the users for which the usertip
+        is the beginning of one of their names (case insensitive,
+        see User.maybe_me)
+        """
+        if not usertip:
+            return list(range(self._nb_users))
+        tip = usertip.lower().encode("utf-8")
+        low, high = 0, self._nb_keys
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle)[0] < tip:
+                low = middle + 1
+            else:
+                high = middle
+        rows = set()
+        while low < self._nb_keys:
+            key, row = self._key(low)
+            if not key.startswith(tip):
+                break
+            rows.add(row)
+            low += 1
+        return sorted(rows)
+
+    def close(self) -> None:
+        self._index.close()
+        self._database.close()
+
+
+class OffsetIndex:
+    """ Binary index of the positions of the users in the json
+    database file, for reading a single user
+
+    Stored next to the json database file (~/.isensus.offsets),
+    the index maps userids and (lower case) names of the users to the
+    position of the encoded users in the database file, and stores
+    the names of the users. It is memory mapped and searched by
+    bisection (see MappedOffsets), so that finding and reading a
+    single user (e.g. by the show command) does not depend on the
+    size of the database; sessions load the positions and the usertip
+    index from it (see IndexSidecar) rather than parsing the database
+    file. The index is written along with the database file (see
+    write_data), and is used only if the modification time, size
+    and inode of the database file are the ones it has been written
+    with.
+
+    Parameters
+    ----------
+    path: Path
+        Absolute path to the json database file (the index file is
+        this path suffixed with '.offsets')
+    """
+
+    suffix: str = ".offsets"
+
+    def __init__(self, path: Path):
+        self._database = path
+        self._path = Path(str(path) + self.suffix)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def valid(self) -> bool:
+        """ Returns True if the index file exists and corresponds
+        to the current database file
+        """
+        return sidecar_valid(self._path, _header, _magic, self._database)
+
+    def open(self) -> typing.Optional[MappedOffsets]:
+        """ Returns the memory mapped index, or None if the index
+        is not valid (see valid)
+        """
+        if not self.valid():
+            return None
+        with open(self._path, "rb") as f:
+            index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            with open(self._database, "rb") as f:
+                database = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            index.close()
+            return None
+        return MappedOffsets(index, database)
+
+    def save(
+        self,
+        positions: typing.Mapping[str, typing.Tuple[int, int]],
+        names: typing.Iterable[
+            typing.Tuple[str, typing.Sequence[typing.Optional[str]]]
+        ],
+    ) -> None:
+        """ Writes the index file
+
+        Parameters
+        ----------
+        positions: dict
+            userids as keys, tuple (offset, length) of the encoded
+            user in the json database file as values
+        names: iterable
+            tuples (userid, names), names being a tuple of the
+            names of the user (see name_attributes, None for
+            names not set)
+        """
+        userids = sorted(positions, key=lambda userid: userid.encode("utf-8"))
+        all_names = {userid: tuple(user_names) for userid, user_names in names}
+        strings = bytearray()
+        users = bytearray()
+        keys = []
+        for row, userid in enumerate(userids):
+            user_names = all_names.get(userid, (None,) * len(name_attributes))
+            values: typing.List[int] = []
+            for value in (userid, *user_names):
+                encoded = value.encode("utf-8") if value is not None else b""
+                values.extend(
+                    (len(strings), len(encoded) if value is not None else _unset)
+                )
+                strings += encoded
+            users += _user.pack(*positions[userid], *values)
+            for key in {name.lower() for name in user_names if name}:
+                keys.append((key.encode("utf-8"), row))
+        keys.sort()
+        key_table = bytearray()
+        for encoded_key, row in keys:
+            key_table += _key.pack(len(strings), len(encoded_key), row)
+            strings += encoded_key
+        header = sidecar_header(
+            _header, _magic, self._database, len(userids), len(keys)
+        )
+        # the index file is re-generated if lost
+        atomic_write(
+            self._path, b"".join((header, users, key_table, strings)), fsync="none"
+        )
@@ -0,0 +1,410 @@
+import bisect, operator, re, typing
+from enum import Enum
+from .user import User
+from .date import Date
+from .list_attribute import ListAttribute
+
+"""attributes of User indexed by QueryIndex"""
+bool_attributes: typing.Tuple[str, ...] = tuple(
+    attr for attr, type_ in User.__annotations__.items() if type_ is bool
+)
+enum_attributes: typing.Tuple[str, ...] = tuple(
+    attr
+    for attr, type_ in User.__annotations__.items()
+    if isinstance(type_, type) and issubclass(type_, Enum)
+)
+date_attributes: typing.Tuple[str, ...] = tuple(
+    attr for attr, type_ in User.__annotations__.items() if type_ is Date
+)
+
+_operators: typing.Dict[str, typing.Callable[[typing.Any, typing.Any], bool]] = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+_clause = re.compile(r"^\s*(\w+)\s*(<=|>=|!=|=|<|>)\s*(.*?)\s*$")
+_or = re.compile(r"\s+or\s+", re.IGNORECASE)
+_and = re.compile(r"\s+and\s+", re.IGNORECASE)
+
+
+def _ordinal(date: typing.Optional[Date]) -> typing.Optional[int]:
+    # day ordinal of the date, None if not set
+    if date is None:
+        return None
+    return date.ordinal
+
+
+def _bitmap(rows: typing.Iterable[int]) -> int:
+    # int which bits corresponding to the rows are set
+    bits = bytearray()
+    for row in rows:
+        byte = row >> 3
+        if byte >= len(bits):
+            bits.extend(bytes(byte - len(bits) + 1))
+        bits[byte] |= 1 << (row & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _rows(bitmap: int) -> typing.Iterator[int]:
+    # rows which bits are set in bitmap
+    bits = bin(bitmap)[:1:-1]
+    row = bits.find("1")
+    while row != -1:
+        yield row
+        row = bits.find("1", row + 1)
+
+
+class QueryIndex:
+    """ Secondary indexes over the attributes of the users, for queries.
+
+    Each user is attributed a row (int). The boolean attributes of
+    User are indexed by bitmaps (int which bit of index row is set if
+    the attribute of the corresponding user is True), the enumeration
+    attributes (Contract, Title) by a dictionary mapping each value to
+    the bitmap of the users having it, and the Date attributes by an
+    array of day ordinals sorted for bisection (and the array of the
+    corresponding rows).
+
+    Parameters
+    ----------
+    entries: iterable
+        tuples (userid, values), values being the values of the indexed
+        attributes of the user (see the attributes class attribute).
+    """
+
+    attributes: typing.Tuple[str, ...] = (
+        bool_attributes + enum_attributes + date_attributes
+    )
+
+    def __init__(
+        self, entries: typing.Iterable[typing.Tuple[str, typing.Sequence]] = ()
+    ):
+        self._rows: typing.Dict[str, int] = {}
+        self._userids: typing.List[typing.Optional[str]] = []
+        self._values: typing.Dict[str, typing.Tuple] = {}
+        self._all = 0
+        self._bools: typing.Dict[str, int] = {attr: 0 for attr in bool_attributes}
+        self._enums: typing.Dict[str, typing.Dict[typing.Any, int]] = {
+            attr: {} for attr in enum_attributes
+        }
+        # for each date attribute: sorted ordinals, and the
+        # corresponding rows
+        self._dates: typing.Dict[
+            str, typing.Tuple[typing.List[int], typing.List[int]]
+        ] = {attr: ([], []) for attr in date_attributes}
+        self._build(entries)
+
+    def _build(self, entries: typing.Iterable[typing.Tuple[str, typing.Sequence]]):
+        # bulk version of add (setting bits of large ints
+        # one by one would be quadratic)
+        bools: typing.Dict[str, typing.List[int]] = {
+            attr: [] for attr in bool_attributes
+        }
+        enums: typing.Dict[str, typing.Dict[typing.Any, typing.List[int]]] = {
+            attr: {} for attr in enum_attributes
+        }
+        dates: typing.Dict[str, typing.List[typing.Tuple[int, int]]] = {
+            attr: [] for attr in date_attributes
+        }
+        for row, (userid, values) in enumerate(entries):
+            values = tuple(values)
+            self._userids.append(userid)
+            self._rows[userid] = row
+            self._values[userid] = values
+            for attr, value in zip(self.attributes, values):
+                if attr in bools:
+                    if value:
+                        bools[attr].append(row)
+                elif attr in enums:
+                    enums[attr].setdefault(value, []).append(row)
+                else:
+                    ordinal = _ordinal(value)
+                    if ordinal is not None:
+                        dates[attr].append((ordinal, row))
+        self._all = _bitmap(range(len(self._userids)))
+        for attr, rows in bools.items():
+            self._bools[attr] = _bitmap(rows)
+        for attr, values_rows in enums.items():
+            self._enums[attr] = {
+                value: _bitmap(rows) for value, rows in values_rows.items()
+            }
+        for attr, pairs in dates.items():
+            pairs.sort()
+            self._dates[attr] = (
+                [ordinal for ordinal, _ in pairs],
+                [row for _, row in pairs],
+            )
+
+    def __contains__(self, userid: object) -> bool:
+        return userid in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def values(self, userid: str) -> typing.Tuple:
+        """ Returns the values the user has been indexed with
+
+        Raises
+        ------
+        KeyError
+            if the user is not indexed
+        """
+        return self._values[userid]
+
+    def add(self, userid: str, values: typing.Sequence) -> None:
+        """ Adds a user to the index (replacing its values
+        if already indexed)
+
+        Parameters
+        ----------
+        userid: str
+            userid of the user
+        values: tuple
+            values of the indexed attributes of the user
+        """
+        row = self._rows.get(userid)
+        if row is not None:
+            # the user keeps its row
+            self.remove(userid)
+            self._userids[row] = userid
+        else:
+            row = len(self._userids)
+            self._userids.append(userid)
+        bit = 1 << row
+        self._rows[userid] = row
+        self._values[userid] = tuple(values)
+        self._all |= bit
+        for attr, value in zip(self.attributes, values):
+            if attr in self._bools:
+                if value:
+                    self._bools[attr] |= bit
+            elif attr in self._enums:
+                enums = self._enums[attr]
+                enums[value] = enums.get(value, 0) | bit
+            else:
+                ordinal = _ordinal(value)
+                if ordinal is not None:
+                    ordinals, rows = self._dates[attr]
+                    position = bisect.bisect_right(ordinals, ordinal)
+                    ordinals.insert(position, ordinal)
+                    rows.insert(position, row)
+
+    def remove(self, userid: str) -> None:
+        """ Removes a user from the index
+
+        Raises
+        ------
+        KeyError
+            if the user is not indexed
+        """
+        row = self._rows.pop(userid)
+        values = self._values.pop(userid)
+        self._userids[row] = None
+        mask = ~(1 << row)
+        self._all &= mask
+        for attr in self._bools:
+            self._bools[attr] &= mask
+        for enums in self._enums.values():
+            for value in enums:
+                enums[value] &= mask
+        for attr, value in zip(self.attributes, values):
+            ordinal = _ordinal(value) if attr in self._dates else None
+            if ordinal is not None:
+                ordinals, rows = self._dates[attr]
+                position = bisect.bisect_left(ordinals, ordinal)
+                while rows[position] != row:
+                    position += 1
+                del ordinals[position]
+                del rows[position]
+
+    @property
+    def all(self) -> int:
+        """ Bitmap of all the indexed users """
+        return self._all
+
+    def userids(self, bitmap: int) -> typing.List[str]:
+        """ Returns the userids of the users of the bitmap """
+        return [self._userids[row] for row in _rows(bitmap)]  # type: ignore
+
+    def match(
+        self, attribute: str, op: str, value: typing.Any
+    ) -> typing.Optional[int]:
+        """ Returns the bitmap of the users for which the
+        attribute compares to the value, or None if the attribute
+        is not indexed.
+
+        Parameters
+        ----------
+        attribute: str
+            name of the attribute
+        op: str
+            one of '=', '!=', '<', '<=', '>', '>='
+        value:
+            value to compare with (None for 'not set')
+        """
+        if attribute in self._bools:
+            bitmap = self._bools[attribute]
+            if op not in ("=", "!="):
+                raise ValueError("{} only supports = and !=".format(attribute))
+            if not value:
+                bitmap = self._all & ~bitmap
+            return bitmap if op == "=" else self._all & ~bitmap
+        if attribute in self._enums:
+            if op not in ("=", "!="):
+                raise ValueError("{} only supports = and !=".format(attribute))
+            bitmap = self._enums[attribute].get(value, 0)
+            return bitmap if op == "=" else self._all & ~bitmap
+        if attribute in self._dates:
+            ordinals, rows = self._dates[attribute]
+            ordinal = _ordinal(value)
+            if ordinal is None:
+                if op not in ("=", "!="):
+                    return 0
+                set_ = _bitmap(rows)
+                return self._all & ~set_ if op == "=" else set_
+            left = bisect.bisect_left(ordinals, ordinal)
+            right = bisect.bisect_right(ordinals, ordinal)
+            if op == "=":
+                return _bitmap(rows[left:right])
+            if op == "!=":
+                return _bitmap(rows[:left]) | _bitmap(rows[right:])
+            if op == "<":
+                return _bitmap(rows[:left])
+            if op == "<=":
+                return _bitmap(rows[:right])
+            if op == ">":
+                return _bitmap(rows[right:])
+            return _bitmap(rows[left:])
+        return None
+
+
+class Query:
+    """ Query over the attributes of the users
+
+    A query is a list of comparisons of attributes of User with
+    values, combined with 'and' and 'or' ('and' having precedence),
+    e.g. "vaulted=False and contract_end<2026-11-01 and contract=guest".
+    Supported comparison operators are =, !=, <, <=, >, >=. Values
+    are converted to the type of the attribute: True or False for
+    booleans, YEAR-MONTH-DAY for dates, item names (e.g. guest) for
+    Contract and Title. None stands for 'not set'.
+
+    Comparisons on attributes indexed by QueryIndex are computed
+    first, on the index, and the other comparisons only for the
+    users selected by the indexes.
+
+    Parameters
+    ----------
+    expression: str
+        the query
+
+    Raises
+    ------
+    ValueError
+        if the query can not be parsed
+    UnknownAttributeError
+        if the query refers to an attribute User does not have
+    """
+
+    def __init__(self, expression: str):
+        # list of 'and' groups
+        self._groups: typing.List[typing.List[typing.Tuple[str, str, typing.Any]]]
+        self._groups = [
+            [self._parse(clause) for clause in _and.split(group)]
+            for group in _or.split(expression.strip())
+        ]
+
+    @staticmethod
+    def _parse(clause: str) -> typing.Tuple[str, str, typing.Any]:
+        match = _clause.match(clause)
+        if match is None:
+            raise ValueError("failed to parse query: {}".format(clause))
+        attribute, op, value = match.groups()
+        attr_type = User.get_type(attribute)
+        if issubclass(attr_type, ListAttribute):
+            raise ValueError("queries on {} are not supported".format(attribute))
+        if len(value) > 1 and value[0] == value[-1] and value[0] in "'\"":
+            value = value[1:-1]
+        elif value in ("None", ""):
+            return attribute, op, None
+        if attr_type is bool and value.lower() in ("true", "false"):
+            value = value.capitalize()
+        elif attr_type is bool:
+            raise ValueError("{} should be True or False".format(attribute))
+        return attribute, op, User.decode_attribute(attribute, value)
+
+    def run(
+        self,
+        index: QueryIndex,
+        field: typing.Callable[[str, str], typing.Any],
+    ) -> typing.List[str]:
+        """ Returns the userids of the users matching the query
+
+        Parameters
+        ----------
+        index: QueryIndex
+            index of all the users
+        field: function
+            function returning the value of an attribute of a user
+            (arguments: userid, attribute), see Users.field
+        """
+        result = 0
+        for group in self._groups:
+            bitmap = index.all
+            scanned = []
+            for attribute, op, value in group:
+                matched = index.match(attribute, op, value)
+                if matched is None:
+                    scanned.append((attribute, _operators[op], value))
+                else:
+                    bitmap &= matched
+            if scanned and bitmap:
+                bitmap = _bitmap(
+                    row
+                    for row, userid in zip(_rows(bitmap), index.userids(bitmap))
+                    if all(
+                        _compare(field(userid, attribute), compare, value)
+                        for attribute, compare, value in scanned
+                    )
+                )
+            result |= bitmap
+        return sorted(index.userids(result))
+
+
+def _compare(
+    user_value: typing.Any,
+    compare: typing.Callable[[typing.Any, typing.Any], bool],
+    value: typing.Any,
+) -> bool:
+    if user_value is None or value is None:
+        if compare in (operator.eq, operator.ne):
+            return compare(user_value, value)
+        return False
+    return compare(user_value, value)
+
+
+def query(users: typing.Mapping[str, User], expression: str) -> typing.List[str]:
+    """ Returns the (sorted) userids of the users matching the query
+
+    Parameters
+    ----------
+    users: dict
+        userids as keys, instances of User as values. If an instance
+        of Users, its query index is used (see Users.query)
+    expression: str
+        the query (see Query)
+    """
+    search = getattr(users, "query", None)
+    if search is not None:
+        return search(expression)
+    index = QueryIndex(
+        (userid, tuple(getattr(user, attr) for attr in QueryIndex.attributes))
+        for userid, user in users.items()
+    )
+    return Query(expression).run(
+        index, lambda userid, attr: getattr(users[userid], attr)
+    )
@@ -0,0 +1,252 @@
+import codecs, json, re, typing
+from pathlib import Path
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+# beginning of the files of version 2 (and later) of the database
+# format: {"version": 2, "users": {userid: encoded user, ...}}
+_header = re.compile(r'\s*\{\s*"version"\s*:\s*(\d+)\s*,\s*"users"\s*:')
+
+
+def _skip(text: str, index: int) -> int:
+    # index of the first non whitespace character
+    return _whitespace.match(text, index).end()  # type: ignore
+
+
+def _expect(text: str, index: int, characters: str) -> str:
+    if index >= len(text) or text[index] not in characters:
+        raise ValueError(
+            "expected one of '{}' at position {}".format(characters, index)
+        )
+    return text[index]
+
+
+def schema_version(content: bytes) -> int:
+    """ Returns the version of the database format (see
+    isensus.data.schema) of the content of the json database file
+    """
+    match = _header.match(content[:256].decode("utf-8", "ignore"))
+    if match is None:
+        return 1
+    return int(match.group(1))
+
+
+def scan(
+    content: bytes,
+) -> typing.Iterator[typing.Tuple[str, int, int, typing.Dict[str, typing.Any]]]:
+    """ Decodes a json encoded dictionary of users, one user at a time
+
+    Parameters
+    ----------
+    content: bytes
+        content of the json database file, i.e. a json encoded
+        dictionary with userids as keys and encoded users as values
+        (version 1 of the database format), or such a dictionary
+        wrapped as {"version": 2, "users": dictionary} (version 2
+        and later)
+
+    Yields
+    ------
+    userid: str
+        userid of the user
+    offset: int
+        position (in bytes) of the encoded user in content
+    length: int
+        length (in bytes) of the encoded user in content
+    record: dict
+        the decoded user (see User.to_dict; values are
+        strings for version 1 of the database format)
+
+    Raises
+    ------
+    ValueError
+        if content is not a json encoded dictionary
+    """
+    text = content.decode("utf-8")
+    # for ascii content (which json.dumps generates by
+    # default), positions in text and content are the same
+    ascii = text.isascii()
+    byte_position, char_position = 0, 0
+    header = _header.match(text)
+    index = _skip(text, header.end() if header is not None else 0)
+    _expect(text, index, "{")
+    index = _skip(text, index + 1)
+    if index < len(text) and text[index] == "}":
+        index = _skip(text, index + 1)
+        if header is not None:
+            _expect(text, index, "}")
+        return
+    while True:
+        _expect(text, index, '"')
+        userid, index = _decoder.raw_decode(text, index)
+        index = _skip(text, index)
+        _expect(text, index, ":")
+        start = _skip(text, index + 1)
+        record, end = _decoder.raw_decode(text, start)
+        if ascii:
+            offset, length = start, end - start
+        else:
+            byte_position += len(text[char_position:start].encode("utf-8"))
+            length = len(text[start:end].encode("utf-8"))
+            offset = byte_position
+            byte_position += length
+            char_position = end
+        yield userid, offset, length, record
+        index = _skip(text, end)
+        if _expect(text, index, ",}") == "}":
+            if header is not None:
+                _expect(text, _skip(text, index + 1), "}")
+            return
+        index = _skip(text, index + 1)
+
+
+class _Buffer:
+    # text decoded from a file, read by chunks when needed
+
+    def __init__(self, f: typing.BinaryIO, buffer_size: int):
+        self._file = f
+        self._buffer_size = buffer_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.index = 0
+
+    def fill(self) -> bool:
+        # reads the next chunk, dropping the text before index.
+        # Returns False if the end of the file has been reached.
+        chunk = self._file.read(self._buffer_size)
+        self.text = self.text[self.index :] + self._decoder.decode(
+            chunk, final=not chunk
+        )
+        self.index = 0
+        return bool(chunk)
+
+    def skip(self) -> None:
+        # moves index to the next non whitespace character
+        while True:
+            self.index = _skip(self.text, self.index)
+            if self.index < len(self.text) or not self.fill():
+                return
+
+    def expect(self, characters: str) -> str:
+        # reads the next non whitespace character
+        self.skip()
+        character = _expect(self.text, self.index, characters)
+        self.index += 1
+        return character
+
+    def decode(self) -> typing.Any:
+        # decodes the next json value
+        self.skip()
+        while True:
+            try:
+                value, self.index = _decoder.raw_decode(self.text, self.index)
+                return value
+            except ValueError:
+                # the value may continue in the next chunk
+                if not self.fill():
+                    raise
+
+
+def stream(
+    f: typing.BinaryIO, buffer_size: int = 1 << 16
+) -> typing.Iterator[typing.Tuple[str, typing.Dict[str, typing.Any]]]:
+    """ Decodes a json encoded dictionary of users, one user at a time,
+    reading the file by chunks
+
+    Contrary to scan, the content of the file is not loaded in memory:
+    only the current chunk and the current user are.
+
+    Parameters
+    ----------
+    f: file
+        the json database file, opened in binary mode. See scan
+        for the expected content.
+    buffer_size: int
+        number of bytes read at once
+
+    Yields
+    ------
+    userid: str
+        userid of the user
+    record: dict
+        the decoded user (see User.to_dict; values are
+        strings for version 1 of the database format)
+
+    Raises
+    ------
+    ValueError
+        if the file does not contain a json encoded dictionary
+    """
+    buffer = _Buffer(f, buffer_size)
+    while len(buffer.text) < 256 and buffer.fill():
+        pass
+    header = _header.match(buffer.text)
+    if header is not None:
+        buffer.index = header.end()
+    buffer.expect("{")
+    buffer.skip()
+    if buffer.index < len(buffer.text) and buffer.text[buffer.index] == "}":
+        buffer.index += 1
+    else:
+        while True:
+            buffer.skip()
+            _expect(buffer.text, buffer.index, '"')
+            userid = buffer.decode()
+            buffer.expect(":")
+            yield userid, buffer.decode()
+            if buffer.expect(",}") == "}":
+                break
+    if header is not None:
+        buffer.expect("}")
+
+
+class RecordReader:
+    """ Reads single encoded users from the json database file
+
+    Parameters
+    ----------
+    path: Path
+        Absolute path to the json database file
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._file: typing.Optional[typing.BinaryIO] = None
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def read(self, position: typing.Tuple[int, int]) -> typing.Dict[str, typing.Any]:
+        """ Returns the decoded user stored at the position
+
+        Parameters
+        ----------
+        position: tuple
+            offset and length (in bytes) of the encoded
+            user in the file (see scan)
+        """
+        f = self.open()
+        offset, length = position
+        f.seek(offset)
+        return json.loads(f.read(length))
+
+    def content(self) -> bytes:
+        """ Returns the whole content of the file """
+        f = self.open()
+        f.seek(0)
+        return f.read()
+
+    def open(self) -> typing.BinaryIO:
+        """ Opens the file (if not opened yet) and returns it. The
+        users are then read from this file, even if replaced
+        meanwhile (see atomic_write).
+        """
+        if self._file is None:
+            self._file = open(self._path, "rb")
+        return self._file
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
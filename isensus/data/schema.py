@@ -0,0 +1,243 @@
+""" Encoding of the users in the json database file
+
+Version 1 of the database format stored the value of each attribute
+as a string (its repr, e.g. "True", "None" or "<Contract.guest: 0>").
+Version 2 uses native json types: booleans, integers, null for
+values not set, ISO formatted dates ("2021-06-30"), names of the
+items of enumerations ("guest") and arrays of strings for the
+list attributes (notes and warnings). The file is a dictionary
+{"version": 2, "users": {userid: encoded user}}.
+"""
+
+import contextlib, gc, typing
+from dataclasses import MISSING
+from enum import Enum
+from .date import Date
+from .list_attribute import ListAttribute
+
+"""current version of the database format"""
+version: int = 2
+
+"""key of the encoded users storing their version, i.e. the number
+of times changes to the user have been written (not an attribute
+of User)"""
+version_key: str = "_version"
+
+Encoder = typing.Callable[[typing.Any], typing.Any]
+Decoder = typing.Callable[[typing.Any], typing.Any]
+
+
+def _encode_date(value: Date) -> typing.Optional[str]:
+    if value.ordinal is None:
+        return None
+    return str(value)
+
+
+def _encode_enum(value: Enum) -> str:
+    return value.name
+
+
+def _encode_list(value: ListAttribute) -> typing.List[str]:
+    items = value.items()
+    # the list attribute created from an empty string
+    # has a single empty item
+    if items == [""]:
+        return []
+    return items
+
+
+def _identity(value: typing.Any) -> typing.Any:
+    return value
+
+
+def _enum_decoder(enum: typing.Type[Enum]) -> Decoder:
+    members = enum.__members__
+
+    def _decode(value: str) -> Enum:
+        try:
+            return members[value]
+        except KeyError:
+            raise ValueError(
+                "{} should be one of: {}".format(enum.__name__, ", ".join(members))
+            )
+
+    return _decode
+
+
+def _list_decoder(list_type: typing.Type[ListAttribute]) -> Decoder:
+    def _decode(value: typing.List[str]) -> ListAttribute:
+        return list_type.from_items(value or [""])
+
+    return _decode
+
+
+def _skip_none(function: Encoder) -> Encoder:
+    def _encode(value: typing.Any) -> typing.Any:
+        if value is None:
+            return None
+        return function(value)
+
+    return _encode
+
+
+def _encoder(attr_type: typing.Any) -> Encoder:
+    # as encoder, but the returned function is not called on None
+    if attr_type is Date:
+        return _encode_date
+    if isinstance(attr_type, type) and issubclass(attr_type, Enum):
+        return _encode_enum
+    if isinstance(attr_type, type) and issubclass(attr_type, ListAttribute):
+        return _encode_list
+    # str, bool and int are native json types
+    return _identity
+
+
+def encoder(attr_type: typing.Any) -> Encoder:
+    """ Returns the function encoding values of this type into
+    native json values (None being encoded as null)
+    """
+    function = _encoder(attr_type)
+    if function is _identity:
+        return function
+    return _skip_none(function)
+
+
+def decoder(attr_type: typing.Any) -> Decoder:
+    """ Returns the function decoding native json values into values
+    of this type. The functions are not called on null, which is
+    decoded as None by the caller.
+    """
+    if attr_type is Date:
+        return Date
+    if isinstance(attr_type, type) and issubclass(attr_type, Enum):
+        return _enum_decoder(attr_type)
+    if isinstance(attr_type, type) and issubclass(attr_type, ListAttribute):
+        return _list_decoder(attr_type)
+    # str, bool and int are native json types
+    return _identity
+
+
+def encoders(
+    annotations: typing.Mapping[str, typing.Any]
+) -> typing.Dict[str, Encoder]:
+    """ Returns the encoder (see encoder) of each attribute """
+    return {attr: encoder(attr_type) for attr, attr_type in annotations.items()}
+
+
+def decoders(
+    annotations: typing.Mapping[str, typing.Any]
+) -> typing.Dict[str, Decoder]:
+    """ Returns the decoder (see decoder) of each attribute """
+    return {attr: decoder(attr_type) for attr, attr_type in annotations.items()}
+
+
+@contextlib.contextmanager
+def bulk() -> typing.Iterator[None]:
+    """ Context manager to wrap the encoding or decoding of many
+    users: the cyclic garbage collector is disabled meanwhile, as
+    the many dictionaries and instances created would trigger
+    (useless) collections.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _is_native(attr_type: typing.Any) -> bool:
+    # values of this type are stored as they are
+    return _encoder(attr_type) is _identity
+
+
+"""encoding and decoding functions of a dataclass (see codec)"""
+Codec = typing.Tuple[
+    typing.Callable[[typing.Any], typing.Dict[str, typing.Any]],
+    typing.Callable[[typing.Dict[str, typing.Any]], typing.Any],
+]
+
+# dataclasses as keys, their codec as values
+_codecs: typing.Dict[typing.Any, Codec] = {}
+
+
+def codec(cls: typing.Any) -> Codec:
+    """ Generates the functions encoding and decoding instances
+    of the dataclass (e.g. User)
+
+    The source code of both functions is generated (and compiled)
+    once per process from the annotations and the default values of the dataclass,
+    so that each attribute is read, encoded or decoded by a dedicated
+    line, without per attribute lookups of types, encoders and
+    decoders. Decoded instances are created without calling
+    the __init__ and __setattr__ methods of the class; their '_dirty'
+    attribute is set to an empty set (see User.dirty_attributes).
+
+    Parameters
+    ----------
+    cls: type
+        the dataclass
+
+    Returns
+    -------
+    encode: function
+        encodes an instance into a dictionary {attribute: native
+        json value}
+    decode: function
+        creates an instance from such a dictionary (attributes which
+        are missing or null taking their default value)
+    """
+    try:
+        return _codecs[cls]
+    except KeyError:
+        pass
+    fields = cls.__dataclass_fields__
+    namespace: typing.Dict[str, typing.Any] = {"cls": cls, "new": object.__new__}
+    encode_lines = ["def encode(user):", "    values = user.__dict__"]
+    encoded = []
+    decode_lines = ["def decode(record):", "    get = record.get"]
+    decoded = []
+    for index, (attr, attr_type) in enumerate(cls.__annotations__.items()):
+        value = "v{}".format(index)
+        if _is_native(attr_type):
+            encoded.append("{!r}: values[{!r}]".format(attr, attr))
+        else:
+            namespace["e{}".format(index)] = _encoder(attr_type)
+            encode_lines.append("    {} = values[{!r}]".format(value, attr))
+            encoded.append(
+                "{!r}: None if {} is None else e{}({})".format(
+                    attr, value, index, value
+                )
+            )
+        decode_lines.append("    {} = get({!r})".format(value, attr))
+        f = fields[attr]
+        if f.default_factory is not MISSING:
+            namespace["f{}".format(index)] = f.default_factory
+            default = "f{}()".format(index)
+        else:
+            namespace["d{}".format(index)] = f.default
+            default = "d{}".format(index)
+        if _is_native(attr_type):
+            decoded.append(
+                "{!r}: {} if {} is None else {}".format(attr, default, value, value)
+            )
+        else:
+            namespace["c{}".format(index)] = decoder(attr_type)
+            decoded.append(
+                "{!r}: {} if {} is None else c{}({})".format(
+                    attr, default, value, index, value
+                )
+            )
+    encode_lines.append("    return {{{}}}".format(", ".join(encoded)))
+    decoded.append("'_dirty': set()")
+    decode_lines.extend(
+        [
+            "    user = new(cls)",
+            "    user.__dict__.update({{{}}})".format(", ".join(decoded)),
+            "    return user",
+        ]
+    )
+    exec("\n".join(encode_lines + [""] + decode_lines), namespace)
+    _codecs[cls] = namespace["encode"], namespace["decode"]
+    return _codecs[cls]
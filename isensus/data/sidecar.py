@@ -0,0 +1,71 @@
+import typing
+from pathlib import Path
+from .index import PrefixIndex
+from .offsets import OffsetIndex
+
+
+class IndexSidecar:
+    """ Index of the json database persisted in a file next to it
+
+    The usertip index (see PrefixIndex) of the json database file
+    (~/.isensus) and the positions of the users in the file are
+    read from its offset index (~/.isensus.offsets, see OffsetIndex),
+    so that they do not have to be re-computed by each isensus
+    command, and that a single user can be read from the database
+    file without parsing the others. As the offset index, the
+    sidecar is used only if the modification time, size and inode
+    of the database file are the ones it has been saved with, so
+    that the database file is not read to check it.
+
+    Parameters
+    ----------
+    path: Path
+        Absolute path to the json database file
+    """
+
+    def __init__(self, path: Path):
+        self._offsets = OffsetIndex(path)
+
+    @property
+    def path(self) -> Path:
+        return self._offsets.path
+
+    def load(
+        self,
+    ) -> typing.Optional[
+        typing.Tuple[typing.Dict[str, typing.Tuple[int, int]], PrefixIndex]
+    ]:
+        """ Returns the positions of the users and the usertip index,
+        or None if the offset index does not exist or is not
+        valid for the current database file.
+
+        Returns
+        -------
+        positions: dict
+            userids as keys, tuple (offset, length) of the
+            encoded user in the database file as values
+        index: PrefixIndex
+            index of the names of the users
+        """
+        mapped = self._offsets.open()
+        if mapped is None:
+            return None
+        with mapped:
+            return mapped.load()
+
+    def save(
+        self, positions: typing.Dict[str, typing.Tuple[int, int]], index: PrefixIndex
+    ) -> None:
+        """ Writes the offset index
+
+        Parameters
+        ----------
+        positions: dict
+            userids as keys, tuple (offset, length) of the
+            encoded user in the database file as values
+        index: PrefixIndex
+            index of the names of the users
+        """
+        self._offsets.save(
+            positions, ((userid, index.values(userid)) for userid in positions)
+        )
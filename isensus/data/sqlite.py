@@ -0,0 +1,375 @@
+import json, os, sqlite3, typing
+from pathlib import Path
+from . import schema
+from .user import User
+from .users import Users
+from .index import name_attributes
+from .files import FileLock
+from .journal import Journal
+from isensus import errors
+
+"""first bytes of any sqlite3 database file"""
+sqlite_header: bytes = b"SQLite format 3\x00"
+
+"""attributes of User stored in columns of their own (and indexed),
+in addition to the json encoded record of the user"""
+bool_attributes: typing.Tuple[str, ...] = tuple(
+    attr for attr, type_ in User.__annotations__.items() if type_ is bool
+)
+indexed_columns: typing.Tuple[str, ...] = (
+    ("firstname", "lastname", "contract_end")
+    + tuple(attr + "_tip" for attr in name_attributes)
+    + bool_attributes
+)
+
+# the '_tip' columns store the lower case values of the
+# name attributes, for prefix search of usertips
+_columns: typing.Tuple[str, ...] = (
+    name_attributes
+    + tuple(attr + "_tip" for attr in name_attributes)
+    + ("contract_end",)
+    + bool_attributes
+    + ("record",)
+)
+
+
+def is_sqlite(path: Path) -> bool:
+    """ Returns True if the file is a sqlite3 database
+
+    Parameters
+    ----------
+    path: Path
+        Absolute path to the database file
+
+    Returns
+    -------
+        True if the file exists and is a sqlite3 database
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(sqlite_header)) == sqlite_header
+    except FileNotFoundError:
+        return False
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    connection = sqlite3.connect(str(path))
+    columns = ", ".join(
+        [
+            "userid TEXT PRIMARY KEY",
+            *["{} TEXT".format(column) for column in _columns[1:7]],
+            *["{} INTEGER".format(attr) for attr in bool_attributes],
+            "record TEXT NOT NULL",
+        ]
+    )
+    with connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS users ({})".format(columns))
+        for column in indexed_columns:
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS users_{0} ON users ({0})".format(column)
+            )
+    _upgrade(connection)
+    return connection
+
+
+def _upgrade(connection: sqlite3.Connection) -> None:
+    # re-encodes the records written with former versions of the
+    # database format (see isensus.data.schema). The version is
+    # stored as the user_version of the database (0 for version 1).
+    (current,) = connection.execute("PRAGMA user_version").fetchone()
+    if current >= schema.version:
+        return
+    with connection:
+        upgraded = []
+        for userid, record in connection.execute("SELECT userid, record FROM users"):
+            user = User._user_from_strings(json.loads(record))
+            upgraded.append((json.dumps(user.to_dict()), userid))
+        connection.executemany("UPDATE users SET record=? WHERE userid=?", upgraded)
+        connection.execute("PRAGMA user_version = {}".format(schema.version))
+
+
+def _row(user: User, version: int) -> typing.Tuple[typing.Any, ...]:
+    # values of the columns of the table for this user
+    names = tuple(getattr(user, attr) for attr in name_attributes)
+    tips = tuple(name.lower() if name else "" for name in names)
+    contract_end = repr(user.contract_end) or None
+    flags = tuple(bool(getattr(user, attr)) for attr in bool_attributes)
+    record = user.to_dict()
+    record[schema.version_key] = version
+    return names + tips + (contract_end,) + flags + (json.dumps(record),)
+
+
+def _user(record: str) -> User:
+    return User._user_from_json(json.loads(record))
+
+
+def _version(record: typing.Optional[str]) -> typing.Optional[int]:
+    # version of the (json encoded) user, None if not in the database
+    if record is None:
+        return None
+    return json.loads(record).get(schema.version_key, 0)
+
+
+class SqliteUsers(Users):
+    """ Dictionary of users backed by a sqlite3 database.
+
+    Alternative to the json database: users are stored one per row
+    in the 'users' table of a sqlite3 database, which has indexed
+    columns for userid, the first and last names, the contract end
+    and the boolean attributes of User. Users are read from the
+    database only when accessed, and only the users that have been
+    added, deleted or modified are written back (see commit). As for
+    the json database, the version of each user is stored in its
+    record and incremented each time changes to the user are written.
+
+    Parameters
+    ----------
+    path: Path
+        Absolute path to the sqlite3 database file
+        (created if it does not exist).
+    """
+
+    def __init__(self, path: Path):
+        super().__init__({})
+        self._connection = _connect(path)
+
+    def __getitem__(self, userid: str) -> User:
+        try:
+            return self._users[userid]
+        except KeyError:
+            pass
+        if userid in self._deleted:
+            raise KeyError(userid)
+        row = self._connection.execute(
+            "SELECT record FROM users WHERE userid=?", (userid,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(userid)
+        record = json.loads(row[0])
+        user = User._user_from_json(record)
+        self._users[userid] = user
+        self._versions.setdefault(userid, record.get(schema.version_key, 0))
+        return user
+
+    def _stored(self, userid: str) -> typing.Optional[str]:
+        # the json encoded user, as currently in the database
+        row = self._connection.execute(
+            "SELECT record FROM users WHERE userid=?", (userid,)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def version(self, userid: str) -> typing.Optional[int]:
+        """ See Users.version """
+        try:
+            return self._versions[userid]
+        except KeyError:
+            pass
+        return _version(self._stored(userid))
+
+    def __setitem__(self, userid: str, user: User) -> None:
+        self._keep_version(userid)
+        self._users[userid] = user
+        self._assigned.add(userid)
+        self._deleted.discard(userid)
+        self._index_user(userid, user)
+
+    def __delitem__(self, userid: str) -> None:
+        # raises a KeyError if the user does not exist
+        self[userid]
+        del self._users[userid]
+        self._assigned.discard(userid)
+        self._deleted.add(userid)
+        self._unindex_user(userid)
+
+    def __contains__(self, userid: object) -> bool:
+        try:
+            self[userid]  # type: ignore
+        except KeyError:
+            return False
+        return True
+
+    def _userids(self) -> typing.Iterator[str]:
+        # userids of the users in the database, taking into
+        # account the users added and deleted but not commited yet
+        new = set(self._assigned)
+        for (userid,) in self._connection.execute(
+            "SELECT userid FROM users ORDER BY userid"
+        ):
+            new.discard(userid)
+            if userid not in self._deleted:
+                yield userid
+        yield from sorted(new)
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return self._userids()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._userids())
+
+    def items(self) -> typing.Iterator[typing.Tuple[str, User]]:  # type: ignore
+        """ Iterates over the users, ordered by userid (read from
+        the database using a single query).
+        """
+        new = set(self._assigned)
+        for userid, record in self._connection.execute(
+            "SELECT userid, record FROM users ORDER BY userid"
+        ):
+            new.discard(userid)
+            if userid in self._deleted:
+                continue
+            user = self._users.get(userid)
+            yield userid, user if user is not None else _user(record)
+        for userid in sorted(new):
+            yield userid, self._users[userid]
+
+    def field(self, userid: str, attribute: str) -> typing.Any:
+        """ See Users.field (name attributes are read from their
+        columns, without decoding the user)
+        """
+        read = userid in self._users or userid in self._deleted
+        if not read and attribute in name_attributes:
+            row = self._connection.execute(
+                "SELECT {} FROM users WHERE userid=?".format(attribute), (userid,)
+            ).fetchone()
+            if row is not None:
+                return row[0]
+        return getattr(self[userid], attribute)
+
+    def fields(
+        self, attributes: typing.Sequence[str]
+    ) -> typing.Iterator[typing.Tuple[str, typing.Tuple[typing.Any, ...]]]:
+        """ Iterates over the users, yielding for each the userid
+        and the values of the requested attributes. Name attributes
+        (userid, firstname, lastname) are read directly from their
+        columns, without decoding the users.
+        """
+        if not all(attr in name_attributes for attr in attributes):
+            for userid, user in self.items():
+                yield userid, tuple(getattr(user, attr) for attr in attributes)
+            return
+        new = set(self._assigned)
+        for row in self._connection.execute(
+            "SELECT userid, {} FROM users ORDER BY userid".format(", ".join(attributes))
+        ):
+            userid = row[0]
+            new.discard(userid)
+            if userid in self._deleted:
+                continue
+            read = self._users.get(userid)
+            if read is None:
+                yield userid, tuple(row[1:])
+            else:
+                yield userid, tuple(getattr(read, attr) for attr in attributes)
+        for userid in sorted(new):
+            user = self._users[userid]
+            yield userid, tuple(getattr(user, attr) for attr in attributes)
+
+    def candidates(self, usertip: str) -> typing.List[str]:
+        """ Returns the userids of the users for which the usertip
+        is the beginning of the userid, the first name or the last name
+        (case insensitive, see User.maybe_me)
+        """
+        tip = usertip.lower()
+        where = " OR ".join(
+            "({0}_tip >= ? AND {0}_tip < ?)".format(attr) for attr in name_attributes
+        )
+        found = {
+            userid
+            for (userid,) in self._connection.execute(
+                "SELECT userid FROM users WHERE {}".format(where),
+                (tip, tip + "\U0010ffff") * len(name_attributes),
+            )
+        }
+        found.difference_update(self._deleted)
+        # users already read may have been modified or added
+        for userid, user in self._users.items():
+            if user.maybe_me(usertip):
+                found.add(userid)
+            else:
+                found.discard(userid)
+        return sorted(found)
+
+    def commit(self) -> None:
+        """ Writes the added, modified and deleted users to the database.
+
+        Raises
+        ------
+        ConflictError
+            if users modified by this instance have been modified in
+            the database meanwhile (nothing is then written)
+        """
+        updated, deleted = self.changes()
+        expected = {userid: self.version(userid) for userid in (*updated, *deleted)}
+        with self._connection:
+            # locking the database until the changes are written
+            self._connection.execute("BEGIN IMMEDIATE")
+            conflicts = sorted(
+                userid
+                for userid, version in expected.items()
+                if _version(self._stored(userid)) != version
+            )
+            if conflicts:
+                raise errors.ConflictError(conflicts)
+            self._connection.executemany(
+                "DELETE FROM users WHERE userid=?", [(userid,) for userid in deleted]
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO users VALUES ({})".format(
+                    ", ".join("?" * len(_columns))
+                ),
+                [
+                    _row(self._users[userid], fields[schema.version_key])
+                    for userid, fields in updated.items()
+                ],
+            )
+        self.mark_clean()
+
+    def close(self) -> None:
+        """ Closes the connection to the database (changes not commited
+        are lost)
+        """
+        self._connection.close()
+
+
+def migrate(path: Path) -> Path:
+    """ Converts a json database into a sqlite3 database
+
+    One-shot migration of the json database file (and its journal)
+    into a sqlite3 database at the same path. The json database is
+    kept as a backup, at the same path suffixed with '.json.bak'. The
+    files describing the json database (offset index, timeline and
+    warnings view) are deleted.
+
+    Parameters
+    ----------
+    path: Path
+        Absolute path to the json database
+
+    Returns
+    -------
+    backup: Path
+        Absolute path to the backup of the json database
+    """
+    # imported here to avoid a circular import with data.py
+    from .data import get_data
+    from .offsets import OffsetIndex
+    from .timeline import Timeline
+    from ..warnings.view import WarningsView
+
+    with FileLock(path):
+        users = get_data(path)
+        tmp = Path(str(path) + ".sqlite.tmp")
+        if tmp.is_file():
+            tmp.unlink()
+        sqlite_users = SqliteUsers(tmp)
+        for userid, user in users.items():
+            sqlite_users[userid] = user
+        sqlite_users.commit()
+        sqlite_users.close()
+        backup = Path(str(path) + ".json.bak")
+        os.replace(path, backup)
+        os.replace(tmp, path)
+        Journal(path).clear()
+        for sidecar in (OffsetIndex, Timeline, WarningsView):
+            sidecar(path).path.unlink(missing_ok=True)
+    return backup
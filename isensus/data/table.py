@@ -0,0 +1,336 @@
+import functools, sys, typing
+from array import array
+from collections.abc import MutableMapping
+from enum import Enum
+from .user import User
+from .date import Date
+from .list_attribute import ListAttribute
+
+# value of the rows of the int columns for which
+# the attribute is not set (None)
+_null: int = -(2 ** 63)
+
+
+def _kind(attr_type: typing.Any) -> str:
+    # how attributes of this type are stored
+    if attr_type is bool:
+        return "bool"
+    if attr_type is Date:
+        return "date"
+    if attr_type is int:
+        return "int"
+    if isinstance(attr_type, type) and issubclass(attr_type, Enum):
+        return "enum"
+    if isinstance(attr_type, type) and issubclass(attr_type, ListAttribute):
+        return "list"
+    return "str"
+
+
+"""for each attribute of User, how it is stored by UserTable"""
+kinds: typing.Dict[str, str] = {
+    attr: _kind(attr_type) for attr, attr_type in User.__annotations__.items()
+}
+
+
+class BitArray:
+    """ Compact array of booleans (one bit per value)
+
+    Parameters
+    ----------
+    size: int
+        initial number of values (all False)
+    """
+
+    def __init__(self, size: int = 0):
+        self._bits = bytearray((size + 7) // 8)
+        self._size = size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> bool:
+        return bool(self._bits[index >> 3] & (1 << (index & 7)))
+
+    def __setitem__(self, index: int, value: bool) -> None:
+        if value:
+            self._bits[index >> 3] |= 1 << (index & 7)
+        else:
+            self._bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def append(self, value: bool) -> None:
+        if self._size % 8 == 0:
+            self._bits.append(0)
+        self._size += 1
+        self[self._size - 1] = value
+
+    def pop(self) -> bool:
+        value = self[self._size - 1]
+        self[self._size - 1] = False
+        self._size -= 1
+        if self._size % 8 == 0:
+            self._bits.pop()
+        return value
+
+    def to_int(self) -> int:
+        """ Returns the int which bit i is value i """
+        return int.from_bytes(self._bits, "little")
+
+    def slice(self, start: int, stop: int) -> "BitArray":
+        """ Returns the values from start to stop (excluded) """
+        stop = min(stop, self._size)
+        size = max(0, stop - start)
+        bits = int.from_bytes(self._bits[start >> 3 : (stop + 7) >> 3], "little")
+        bits = (bits >> (start & 7)) & ((1 << size) - 1)
+        sliced = BitArray()
+        sliced._bits = bytearray(bits.to_bytes((size + 7) // 8, "little"))
+        sliced._size = size
+        return sliced
+
+
+class UserRow:
+    """ View on a row of a UserTable
+
+    Behaves as an instance of User (attributes can be read and
+    set, see also to_user), but the values are stored in
+    (and read from) the columns of the table. List attributes
+    (e.g. notes) write their changes (see ListAttribute.rm)
+    to the table.
+
+    Parameters
+    ----------
+    table: UserTable
+        the table
+    userid: str
+        the userid of the user of the row
+    """
+
+    __slots__ = ("_table", "_userid")
+
+    def __init__(self, table: "UserTable", userid: str):
+        object.__setattr__(self, "_table", table)
+        object.__setattr__(self, "_userid", userid)
+
+    def __getattr__(self, attribute: str) -> typing.Any:
+        if attribute not in kinds:
+            raise AttributeError(attribute)
+        value = self._table.field(self._userid, attribute)
+        if kinds[attribute] == "list":
+            value.on_change = functools.partial(
+                self._table.set_field, self._userid, attribute
+            )
+        return value
+
+    def __setattr__(self, attribute: str, value: typing.Any) -> None:
+        if attribute not in kinds:
+            raise AttributeError(attribute)
+        self._table.set_field(self._userid, attribute, value)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (User, UserRow)):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def to_user(self) -> User:
+        """ Returns an instance of User with the values of the row """
+        user = User()
+        for attr in kinds:
+            setattr(user, attr, self._table.field(self._userid, attr))
+        user.mark_clean()
+        return user
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        """ See User.to_dict """
+        return self.to_user().to_dict()
+
+    def to_string(self, nb_tabs: int = 1) -> str:
+        """ See User.to_string """
+        return self.to_user().to_string(nb_tabs)
+
+    def maybe_me(self, usertip: str) -> bool:
+        """ See User.maybe_me """
+        return User.names_match(usertip, (self.userid, self.firstname, self.lastname))
+
+
+class UserTable(MutableMapping):
+    """ Compact, column oriented, in-memory storage of users
+
+    Alternative to dictionaries of instances of User for large
+    databases: the values of each attribute are stored in a column
+    (booleans in bit arrays, dates as day ordinals in int arrays,
+    Contract and Title as small ints, strings interned), one row per
+    user. Mapping userids to views on rows (UserRow), which can be
+    used as instances of User.
+
+    Parameters
+    ----------
+    users: dict (optional)
+        userids as keys, instances of User as values
+    """
+
+    def __init__(self, users: typing.Optional[typing.Mapping[str, User]] = None):
+        self._rows: typing.Dict[str, int] = {}
+        self._userids: typing.List[str] = []
+        self._columns: typing.Dict[str, typing.Any] = {}
+        for attr, kind in kinds.items():
+            if kind == "bool":
+                self._columns[attr] = BitArray()
+            elif kind in ("date", "enum"):
+                self._columns[attr] = array("i" if kind == "date" else "b")
+            elif kind == "int":
+                self._columns[attr] = array("q")
+            else:
+                self._columns[attr] = []
+        for userid, user in (users or {}).items():
+            self[userid] = user
+
+    @classmethod
+    def from_users(cls, users: typing.Mapping[str, User]) -> "UserTable":
+        """ Returns a table containing the users
+
+        Parameters
+        ----------
+        users: dict
+            userids as keys, instances of User as values. If an
+            instance of Users, attributes are decoded one by one
+            (see Users.fields), without creating instances of User.
+        """
+        table = cls()
+        fields = getattr(users, "fields", None)
+        attributes = tuple(kinds.keys())
+        if fields is not None:
+            entries = fields(attributes)
+        else:
+            entries = (
+                (userid, tuple(getattr(user, attr) for attr in attributes))
+                for userid, user in users.items()
+            )
+        for userid, values in entries:
+            table._append(userid, values)
+        return table
+
+    def to_users(self) -> typing.Dict[str, User]:
+        """ Returns a dictionary {userid: instance of User} """
+        return {userid: UserRow(self, userid).to_user() for userid in self._userids}
+
+    def partition(self, nb_chunks: int) -> typing.List["UserTable"]:
+        """ Splits the table into (at most) nb_chunks tables of
+        consecutive rows, e.g. to be processed in parallel (tables
+        are pickled as their columns, see __getstate__)
+        """
+        size = max(1, -(-len(self) // max(1, nb_chunks)))
+        chunks = []
+        for start in range(0, len(self), size):
+            chunk = UserTable()
+            chunk._userids = self._userids[start : start + size]
+            chunk._rows = {userid: row for row, userid in enumerate(chunk._userids)}
+            for attr, column in self._columns.items():
+                if isinstance(column, BitArray):
+                    chunk._columns[attr] = column.slice(start, start + size)
+                else:
+                    chunk._columns[attr] = column[start : start + size]
+            chunks.append(chunk)
+        return chunks
+
+    def __getstate__(self) -> typing.Tuple[typing.Any, ...]:
+        # the rows of the userids are computed again when unpickled
+        return self._userids, self._columns
+
+    def __setstate__(self, state: typing.Tuple[typing.Any, ...]) -> None:
+        self._userids, self._columns = state
+        self._rows = {userid: row for row, userid in enumerate(self._userids)}
+
+    @staticmethod
+    def _encode(attribute: str, value: typing.Any) -> typing.Any:
+        # value as stored in the column of the attribute
+        kind = kinds[attribute]
+        if kind == "bool":
+            return bool(value)
+        if kind == "date":
+            return (value.ordinal or 0) if value is not None else 0
+        if kind == "enum":
+            return value.value if value is not None else -1
+        if kind == "int":
+            return int(value) if value is not None else _null
+        if kind == "list":
+            return sys.intern(repr(value)) if value is not None else None
+        return sys.intern(value) if value is not None else None
+
+    @staticmethod
+    def _decode(attribute: str, value: typing.Any) -> typing.Any:
+        # value of the attribute, as stored in its column
+        kind = kinds[attribute]
+        if kind == "bool":
+            return value
+        if kind == "date":
+            return Date.from_ordinal(value)
+        if kind == "enum":
+            return User.get_type(attribute)(value) if value >= 0 else None
+        if kind == "int":
+            return value if value != _null else None
+        if kind == "list":
+            return User.get_type(attribute)(value if value is not None else "")
+        return value
+
+    def _append(self, userid: str, values: typing.Sequence) -> None:
+        self._rows[userid] = len(self._userids)
+        self._userids.append(sys.intern(userid))
+        for attr, value in zip(kinds, values):
+            self._columns[attr].append(self._encode(attr, value))
+
+    def field(self, userid: str, attribute: str) -> typing.Any:
+        """ Returns the value of the attribute of the user """
+        row = self._rows[userid]
+        return self._decode(attribute, self._columns[attribute][row])
+
+    def set_field(self, userid: str, attribute: str, value: typing.Any) -> None:
+        """ Sets the value of the attribute of the user """
+        row = self._rows[userid]
+        self._columns[attribute][row] = self._encode(attribute, value)
+
+    def column(self, attribute: str) -> typing.Any:
+        """ Returns the column of the attribute: a BitArray for
+        booleans, an array of day ordinals (0 for not set) for
+        dates, an array of the values of the items (-1 for not
+        set) for enumerations, a list otherwise. Rows are in the
+        order of userids().
+        """
+        return self._columns[attribute]
+
+    def userids(self) -> typing.List[str]:
+        """ Returns the userids, in the order of the rows """
+        return self._userids
+
+    def __getitem__(self, userid: str) -> UserRow:
+        if userid not in self._rows:
+            raise KeyError(userid)
+        return UserRow(self, userid)
+
+    def __setitem__(self, userid: str, user: User) -> None:
+        values = tuple(getattr(user, attr) for attr in kinds)
+        if userid not in self._rows:
+            self._append(userid, values)
+            return
+        for attr, value in zip(kinds, values):
+            self.set_field(userid, attr, value)
+
+    def __delitem__(self, userid: str) -> None:
+        # the last row is moved to the row of the deleted user
+        row = self._rows.pop(userid)
+        last = len(self._userids) - 1
+        for column in self._columns.values():
+            value = column.pop()
+            if row != last:
+                column[row] = value
+        moved = self._userids.pop()
+        if row != last:
+            self._userids[row] = moved
+            self._rows[moved] = row
+
+    def __contains__(self, userid: object) -> bool:
+        return userid in self._rows
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self._userids)
+
+    def __len__(self) -> int:
+        return len(self._userids)
@@ -0,0 +1,146 @@
+import bisect, mmap, struct, typing
+from pathlib import Path
+from .files import atomic_write, sidecar_header, sidecar_valid
+
+# header: magic, modification time (ns), size and inode of the json
+# database file the timeline has been generated for, number of events
+_header = struct.Struct("<8sqqqI")
+_magic = b"isensus1"
+# events, sorted by day: day ordinal, attribute (index in attributes),
+# position of the userid in the strings (offset, length)
+_event = struct.Struct("<iBII")
+
+"""the date attributes of User indexed by the timeline"""
+attributes: typing.Tuple[str, ...] = ("contract_end", "shadow_extension")
+
+"""an event: day ordinal, name of the date attribute, userid"""
+Event = typing.Tuple[int, str, str]
+
+
+class _Days(typing.Sequence[int]):
+    # the days of the events, for bisection
+    def __init__(self, timeline: "MappedTimeline"):
+        self._timeline = timeline
+
+    def __getitem__(self, index):  # type: ignore
+        return self._timeline._event(index)[0]
+
+    def __len__(self) -> int:
+        return len(self._timeline)
+
+
+class MappedTimeline:
+    """ Memory mapped Timeline, as returned by Timeline.open
+
+    Parameters
+    ----------
+    index: mmap
+        the memory mapped timeline file
+    """
+
+    def __init__(self, index: mmap.mmap):
+        self._index = index
+        self._nb_events = _header.unpack_from(index, 0)[-1]
+        self._strings_start = _header.size + self._nb_events * _event.size
+
+    def __enter__(self) -> "MappedTimeline":
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._nb_events
+
+    def _event(self, position: int) -> typing.Tuple[int, int, int, int]:
+        return _event.unpack_from(self._index, _header.size + position * _event.size)
+
+    def between(self, first: int, last: int) -> typing.List[Event]:
+        """ Returns the (sorted) events which day is between the
+        first and the last days (day ordinals, included)
+        """
+        days = _Days(self)
+        start = bisect.bisect_left(days, first)
+        end = bisect.bisect_right(days, last)
+        events = []
+        for position in range(start, end):
+            day, attribute, offset, length = self._event(position)
+            offset += self._strings_start
+            userid = self._index[offset : offset + length].decode("utf-8")
+            events.append((day, attributes[attribute], userid))
+        return events
+
+    def close(self) -> None:
+        self._index.close()
+
+
+class Timeline:
+    """ Binary index of the dates of the users, for finding the users
+    which contract or shadow extension ends within some days
+
+    Stored next to the json database file (~/.isensus.timeline), the
+    timeline is the array of the events (day ordinal, attribute,
+    userid) of the date attributes (see attributes) of all users,
+    sorted by day. It is memory mapped and searched by bisection (see
+    MappedTimeline), so that finding the events of a period does not
+    depend on the number of users. Like the offset index (see
+    OffsetIndex), it is used only if the modification time, size and
+    inode of the database file are the ones it has been written with;
+    the changes recorded in the journal are applied when searched
+    (see isensus.data.data.expiring).
+
+    Parameters
+    ----------
+    path: Path
+        Absolute path to the json database file (the timeline file
+        is this path suffixed with '.timeline')
+    """
+
+    suffix: str = ".timeline"
+
+    def __init__(self, path: Path):
+        self._database = path
+        self._path = Path(str(path) + self.suffix)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def valid(self) -> bool:
+        """ Returns True if the timeline file exists and corresponds
+        to the current database file
+        """
+        return sidecar_valid(self._path, _header, _magic, self._database)
+
+    def open(self) -> typing.Optional[MappedTimeline]:
+        """ Returns the memory mapped timeline, or None if the
+        timeline is not valid (see valid)
+        """
+        if not self.valid():
+            return None
+        with open(self._path, "rb") as f:
+            return MappedTimeline(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def save(self, events: typing.Iterable[Event]) -> None:
+        """ Writes the timeline file
+
+        Parameters
+        ----------
+        events: iterable
+            the events (day ordinal, attribute, userid) of the
+            users in the json database file
+        """
+        table = bytearray()
+        strings = bytearray()
+        offsets: typing.Dict[str, typing.Tuple[int, int]] = {}
+        nb_events = 0
+        for day, attribute, userid in sorted(events):
+            if userid not in offsets:
+                encoded = userid.encode("utf-8")
+                offsets[userid] = (len(strings), len(encoded))
+                strings += encoded
+            table += _event.pack(day, attributes.index(attribute), *offsets[userid])
+            nb_events += 1
+        header = sidecar_header(_header, _magic, self._database, nb_events)
+        # the timeline is re-generated if lost
+        atomic_write(self._path, b"".join((header, table, strings)), fsync="none")
@@ -1,14 +1,33 @@
 import typing
 import json
-from dataclasses import dataclass
+from enum import Enum
+from dataclasses import dataclass, field, MISSING
 from .title import Title
 from .contract import Contract
 from .date import Date
 from .warnings import Warnings
 from .notes import Notes
+from .list_attribute import ListAttribute
+from .fuzzy import TrigramIndex
+from . import schema
 from isensus import errors
 
 
+def _decode_enum(enum: typing.Type[Enum], value: str) -> Enum:
+    # value is either the name of the item (e.g. "guest")
+    # or its repr (e.g. "<Contract.guest: 0>")
+    if value.startswith("<"):
+        value = value[1:].split(":")[0].split(".")[-1]
+    try:
+        return enum[value]
+    except KeyError:
+        raise ValueError(
+            "{} should be one of: {}".format(
+                enum.__name__, ", ".join(item.name for item in enum)
+            )
+        )
+
+
 @dataclass
 class User:
 
@@ -87,8 +106,46 @@ class User:
     contract_end: Date = Date("")
     title: Title = None
     employee_id: int = None
-    warnings: Warnings = Warnings("")
-    notes: Notes = Notes("")
+    warnings: Warnings = field(default_factory=lambda: Warnings(""))
+    notes: Notes = field(default_factory=lambda: Notes(""))
+
+    def __post_init__(self):
+        # names of the attributes set since the instance
+        # has been created or last marked as clean
+        object.__setattr__(self, "_dirty", set())
+
+    def __setattr__(self, attribute: str, value: typing.Any):
+        super().__setattr__(attribute, value)
+        # _dirty does not exist yet when called by __init__
+        dirty = self.__dict__.get("_dirty")
+        if dirty is not None:
+            dirty.add(attribute)
+
+    def dirty_attributes(self) -> typing.Set[str]:
+        """ Returns the attributes modified since the instance
+        has been created or last marked as clean.
+
+        Returns
+        -------
+        attributes: set
+            names of the modified attributes
+        """
+        dirty = set(self.__dict__["_dirty"])
+        for attr in self.__class__.__annotations__.keys():
+            value = getattr(self, attr)
+            if isinstance(value, ListAttribute) and value.modified:
+                dirty.add(attr)
+        return dirty
+
+    def mark_clean(self) -> None:
+        """ Resets the set of modified attributes
+        (see dirty_attributes)
+        """
+        self.__dict__["_dirty"].clear()
+        for attr in self.__class__.__annotations__.keys():
+            value = getattr(self, attr)
+            if isinstance(value, ListAttribute):
+                value.modified = False
 
     @classmethod
     def get_type(cls, attribute: str) -> typing.Any:
@@ -138,40 +195,134 @@ class User:
         return instance
 
     @classmethod
-    def _user_from_json(cls, from_json: typing.Dict[str, str]):
+    def default(cls, attribute: str) -> typing.Any:
+        """ Returns the default value of the attribute
+
+        Parameters
+        ----------
+        attribute: str
+            attribute's name
+
+        Returns
+        -------
+            The value the attribute has for newly created users.
+        """
+        f = cls.__dataclass_fields__[attribute]  # type: ignore
+        if f.default_factory is not MISSING:
+            return f.default_factory()
+        return f.default
+
+    @classmethod
+    def encode_field(cls, attribute: str, value: typing.Any) -> typing.Any:
+        """ Encodes the value of an attribute into a native json
+        value (see isensus.data.schema)
+
+        Parameters
+        ----------
+        attribute: str
+            attribute's name
+        value:
+            value of the attribute
+
+        Returns
+        -------
+            The encoded value, as stored in the json database
+        """
+        return _encoders[attribute](value)
+
+    @classmethod
+    def decode_field(cls, attribute: str, value: typing.Any) -> typing.Any:
+        """ Decodes the value of an attribute, as encoded by
+        encode_field
+
+        Parameters
+        ----------
+        attribute: str
+            attribute's name
+        value:
+            encoded value of the attribute
+
+        Returns
+        -------
+            The attribute's value, or None if the value is not set.
+        """
+        if value is None:
+            return None
+        return _decoders[attribute](value)
+
+    @classmethod
+    def decode_attribute(
+        cls, attribute: str, value: typing.Optional[str]
+    ) -> typing.Any:
+        """ Decodes the string value of an attribute
+
+        Parameters
+        ----------
+        attribute: str
+            attribute's name
+        value: str
+            value of the attribute, either as typed by the end-user
+            or as encoded by version 1 of the database format (see
+            isensus.data.schema)
+
+        Returns
+        -------
+            The attribute's value, casted to the correct type, or
+            None if the value is not set.
         """
-        Returns an instance of User from a (decoded) json dictionary.
+        if value is None or value == "None":
+            return None
+        if value and value[0] == "'":
+            value = value[1:]
+        if value and value[-1] == "'":
+            value = value[:-1]
+        attr_type = cls.__annotations__[attribute]
+        if attr_type is bool:
+            # bool("False") would be True
+            return value == "True"
+        if issubclass(attr_type, Enum):
+            return _decode_enum(attr_type, value)
+        return attr_type(value)
+
+    @classmethod
+    def _user_from_json(cls, from_json: typing.Dict[str, typing.Any]):
+        """
+        Returns an instance of User from a (decoded) json dictionary
+        (see to_dict).
+        """
+        # the instance reflects the database, i.e. has not been modified
+        return schema.codec(cls)[1](from_json)
+
+    @classmethod
+    def _user_from_strings(cls, from_json: typing.Dict[str, str]):
+        """
+        Returns an instance of User from a (decoded) json dictionary
+        which values are strings, as encoded by version 1 of the
+        database format (see isensus.data.schema).
         """
-        # getting the type of each attributes (using the typing hints)
-        types = cls.__annotations__
-        # instantiating User
         user = cls()
-        # adding attributes, casted to the correct type
         for attr, value in from_json.items():
-            if value == "None":
-                value = None
+            value = cls.decode_attribute(attr, value)
             if value is not None:
-                if value and value[0] == "'":
-                    value = value[1:]
-                if value and value[-1] == "'":
-                    value = value[:-1]
-                setattr(user, attr, types[attr](value))
-        # returning the instance
+                setattr(user, attr, value)
+        user.mark_clean()
         return user
 
     @classmethod
-    def from_json(cls, json_dump: typing.Dict[str, str]) -> typing.Dict[str, object]:
+    def from_json(
+        cls, json_dump: typing.Dict[str, typing.Any]
+    ) -> typing.Dict[str, object]:
         """ Returns a dictionary of instances of User
 
         Returns a dictionary of instances of users (keys are the
         userids) generated from a json dump (that should have been
-        generated using the to_json method of this class).
+        generated using the to_json method of this class, or
+        by version 1 of the database format).
 
         Parameters
         ----------
-        json_dump: str
-            The string encoding the dictionary in json encoder
-            format.
+        json_dump: dict
+            The decoded json database.
 
         Returns
         -------
@@ -179,12 +330,17 @@ class User:
             Dictionary with keys userid (str) and values
             related instance of User.
         """
+        if isinstance(json_dump.get("version"), int):
+            decode = schema.codec(cls)[1]
+            json_dump = json_dump["users"]
+        else:
+            decode = cls._user_from_strings
         # "casting" to a dictionary which values are
         # instances of User.
-        return {
-            userid: cls._user_from_json(userdict)
-            for userid, userdict in json_dump.items()
-        }
+        with schema.bulk():
+            return {
+                userid: decode(userdict) for userid, userdict in json_dump.items()
+            }
 
     @classmethod
     def to_json(cls, users: typing.Dict[str, object]) -> object:
@@ -200,25 +356,31 @@ class User:
             Dictionary with userid as keys (str) and instances of User
             as values.
         """
-        d = {userid: instance.to_dict() for userid, instance in users.items()}
-        return json.dumps(d)
-
-    def to_dict(self) -> typing.Dict[str, str]:
+        encode = schema.codec(cls)[0]
+        with schema.bulk():
+            d = {
+                userid: encode(instance)
+                if type(instance) is cls
+                else instance.to_dict()
+                for userid, instance in users.items()
+            }
+            return json.dumps({"version": schema.version, "users": d})
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
         """ Returns dictionary representation of the user
 
         Returns a dictionary corresponding to this
         instance of user with keys corresponding to
-        attributes (as strings) and values to attribute's values casted
-        to string (repr).
+        attributes (as strings) and values to attribute's values
+        encoded as native json values (see encode_field).
 
         Returns
         -------
         users: dict
-            keys: attributes (as str), values: values of the attributes (as
-            str)
+            keys: attributes (as str), values: encoded values of
+            the attributes
         """
-        attr_types = self.__class__.__annotations__
-        return {attr: repr(getattr(self, attr)) for attr in attr_types.keys()}
+        return schema.codec(self.__class__)[0](self)
 
     def to_string(self, nb_tabs: int = 1) -> str:
         """ String representation of the user
@@ -239,8 +401,8 @@ class User:
         tabs = "\t" * nb_tabs
         return "\n".join(
             [
-                "".join([tabs, attr, "\t", value])
-                for attr, value in self.__dict__.items()
+                "".join([tabs, attr, "\t", str(getattr(self, attr))])
+                for attr in self.__class__.__annotations__.keys()
             ]
         )
 
@@ -260,16 +422,20 @@ class User:
         -------
             True if the usertip match this user.
         """
-        return any(
-            (
-                self.userid.lower().startswith(usertip.lower()),
-                self.firstname.lower().startswith(usertip.lower()),
-                self.lastname.lower().startswith(usertip.lower()),
-            )
-        )
+        return self.names_match(usertip, (self.userid, self.firstname, self.lastname))
+
+    @staticmethod
+    def names_match(usertip: str, names: typing.Iterable[typing.Optional[str]]) -> bool:
+        """ Returns True if any of the names starts with the
+        usertip (case insensitive). See maybe_me.
+        """
+        tip = usertip.lower()
+        return any((name or "").lower().startswith(tip) for name in names)
 
     @staticmethod
-    def find_user(users: typing.Dict[str,object], usertip: str) -> object:
+    def find_user(
+        users: typing.Mapping[str, "User"], usertip: str, fuzzy: bool = False
+    ) -> "User":
         """ Search for the user corresponding to the usertip
 
         Returns the user corresponding to the usertip (see 
@@ -282,6 +448,10 @@ class User:
             instances of User as values
         usertip: str
             End-user search string for users
+        fuzzy: bool
+            If True and no user corresponds to the usertip,
+            the users which names are the most similar to
+            the usertip are searched instead (see Users.fuzzy)
 
         Returns
         -------
@@ -297,9 +467,20 @@ class User:
             If more than one user is found.
         """
 
-        candidates = [
-            userid for userid, instance in users.items() if instance.maybe_me(usertip)
-        ]
+        # instances of Users (or subclasses) may provide
+        # a faster search than scanning all users
+        search = getattr(users, "candidates", None)
+        if search is not None:
+            candidates = search(usertip)
+        else:
+            candidates = [
+                userid
+                for userid, instance in users.items()
+                if instance.maybe_me(usertip)
+            ]
+
+        if not candidates and fuzzy:
+            candidates = User._fuzzy_candidates(users, usertip)
 
         if not candidates:
             raise errors.UserNotFoundError(usertip)
@@ -308,3 +489,30 @@ class User:
             raise errors.AmbiguousUserError(usertip, candidates)
 
         return users[candidates[0]]
+
+    @staticmethod
+    def _fuzzy_candidates(
+        users: typing.Mapping[str, "User"], usertip: str
+    ) -> typing.List[str]:
+        # userids of the users of best fuzzy search score
+        search = getattr(users, "fuzzy", None)
+        if search is not None:
+            ranked = search(usertip)
+        else:
+            ranked = TrigramIndex(
+                (
+                    userid,
+                    (instance.userid, instance.firstname, instance.lastname),
+                )
+                for userid, instance in users.items()
+            ).search(usertip)
+        if not ranked:
+            return []
+        best = ranked[0][1]
+        return [userid for userid, score in ranked if score == best]
+
+
+# per attribute functions encoding / decoding the values
+# to / from native json values (see isensus.data.schema)
+_encoders = schema.encoders(User.__annotations__)
+_decoders = schema.decoders(User.__annotations__)
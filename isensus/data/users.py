@@ -0,0 +1,449 @@
+import json, typing
+from collections.abc import MutableMapping
+from pathlib import Path
+from . import schema
+from .user import User
+from .index import PrefixIndex, name_attributes
+from .fuzzy import TrigramIndex
+from .query import Query, QueryIndex
+from .reader import RecordReader
+
+
+class Users(MutableMapping):
+    """ Dictionary of users keeping track of the changes applied to it.
+
+    Mapping userids (str) to instances of User, as returned by the Data
+    context manager. Users may be provided as (json decoded) records
+    (see User.to_dict), in which case the related instance of User is
+    created only when accessed. Attributes can also be decoded
+    individually, without creating the instance of User (see field
+    and fields). Usertip searches (see candidates) use a PrefixIndex,
+    fuzzy searches (see fuzzy) a TrigramIndex and queries (see query)
+    a QueryIndex, all created on the first search and then updated
+    incrementally.
+
+    Instances of Users record the users that have been added,
+    replaced or deleted, and (via User.dirty_attributes) the attributes
+    of the users that have been modified, so that only the changes
+    need to be encoded and written back to the database. The version
+    of the users (see version) is kept as well, so that changes
+    conflicting with the ones of another session can be detected.
+    When the
+    whole database is written (see fragments), the users which have
+    not been modified are copied from the json database file rather
+    than re-encoded.
+
+    Parameters
+    ----------
+    users: dict (optional)
+        userids (str) as keys, instances of User as values.
+    records: dict (optional)
+        userids (str) as keys, encoded users (see User.to_dict)
+        as values. Values may also be the position of the encoded
+        user in the json database file (tuple offset, length),
+        in which case the user is read by the reader when accessed.
+    index: PrefixIndex (optional)
+        index of the names of the users of records. Created on
+        the first usertip search if not provided.
+    reader: RecordReader (optional)
+        reader of the json database file the users are read from.
+    positions: dict (optional)
+        userids (str) as keys, position of the encoded user in the
+        json database file (tuple offset, length) as values, for the
+        users which have not been modified since written to the file.
+    tombstones: dict (optional)
+        userids (str) of deleted users as keys, the version they had
+        when deleted as values (see Journal.tombstones). Users created
+        again with these userids get a greater version.
+    """
+
+    def __init__(
+        self,
+        users: typing.Optional[typing.Dict[str, User]] = None,
+        records: typing.Optional[typing.Dict[str, typing.Any]] = None,
+        index: typing.Optional[PrefixIndex] = None,
+        reader: typing.Optional[RecordReader] = None,
+        positions: typing.Optional[typing.Dict[str, typing.Tuple[int, int]]] = None,
+        tombstones: typing.Optional[typing.Dict[str, int]] = None,
+    ):
+        # all userids, mapped to the encoded user, its position
+        # in the json database file, or None if the record does
+        # not reflect the instance of User anymore
+        self._records: typing.Dict[str, typing.Any] = (
+            records if records is not None else {}
+        )
+        self._reader = reader
+        # users as encoded in the json database file (read by
+        # the reader), forgotten once the user is modified
+        self._positions: typing.Dict[str, typing.Tuple[int, int]] = (
+            positions if positions is not None else {}
+        )
+        # users for which an instance of User has been created
+        self._users: typing.Dict[str, User] = {}
+        # versions of the users read or modified (None for
+        # users not in the database)
+        self._versions: typing.Dict[str, typing.Optional[int]] = {}
+        # versions of the deleted users
+        self._tombstones: typing.Dict[str, int] = (
+            tombstones if tombstones is not None else {}
+        )
+        for userid, user in (users or {}).items():
+            self._records[userid] = None
+            self._users[userid] = user
+        # userids of users added (or replaced) since
+        # the last call to mark_clean
+        self._assigned: typing.Set[str] = set()
+        # userids of users deleted since the last call
+        # to mark_clean
+        self._deleted: typing.Set[str] = set()
+        # created on first call to candidates if None
+        self._index = index
+        if index is not None:
+            for userid, user in self._users.items():
+                self._index_user(userid, user)
+        # created on first call to fuzzy
+        self._fuzzy_index: typing.Optional[TrigramIndex] = None
+        # created on first call to query
+        self._query_index: typing.Optional[QueryIndex] = None
+
+    def __getitem__(self, userid: str) -> User:
+        try:
+            return self._users[userid]
+        except KeyError:
+            pass
+        record = self._record(userid)
+        if record is None:
+            raise KeyError(userid)
+        user = User._user_from_json(record)
+        self._users[userid] = user
+        self._versions.setdefault(userid, record.get(schema.version_key, 0))
+        return user
+
+    def version(self, userid: str) -> typing.Optional[int]:
+        """ Returns the version of the user in the database, i.e. the
+        number of times changes to the user have been written, as of
+        when the user has been read (or its changes written by this
+        instance, see mark_clean). None if the user is not in the
+        database.
+        """
+        try:
+            return self._versions[userid]
+        except KeyError:
+            pass
+        if userid not in self._records:
+            return None
+        record = self._record(userid)
+        if record is None:
+            return 0
+        return record.get(schema.version_key, 0)
+
+    def _keep_version(self, userid: str) -> None:
+        # to be called before the record of the user is discarded
+        if userid not in self._versions:
+            self._versions[userid] = self.version(userid)
+
+    def _record(self, userid: str) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        # the encoded user, read from the file if needed
+        record = self._records[userid]
+        if isinstance(record, tuple):
+            record = self._reader.read(record)  # type: ignore
+            self._records[userid] = record
+        return record
+
+    def __setitem__(self, userid: str, user: User) -> None:
+        self._keep_version(userid)
+        self._records[userid] = None
+        self._positions.pop(userid, None)
+        self._users[userid] = user
+        self._assigned.add(userid)
+        self._deleted.discard(userid)
+        self._index_user(userid, user)
+
+    def __delitem__(self, userid: str) -> None:
+        self._keep_version(userid)
+        del self._records[userid]
+        self._positions.pop(userid, None)
+        self._users.pop(userid, None)
+        self._assigned.discard(userid)
+        self._deleted.add(userid)
+        self._unindex_user(userid)
+
+    def __contains__(self, userid: object) -> bool:
+        return userid in self._records
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def field(self, userid: str, attribute: str) -> typing.Any:
+        """ Returns the value of the attribute of a user
+
+        Contrary to users[userid].attribute, only the requested
+        attribute is decoded if the instance of User has not been
+        created yet.
+
+        Parameters
+        ----------
+        userid: str
+            userid of the user
+        attribute: str
+            name of the attribute
+
+        Raises
+        ------
+        KeyError
+            if the user does not exist
+        """
+        user = self._users.get(userid)
+        if user is not None:
+            return getattr(user, attribute)
+        record = self._record(userid)
+        if record is None:
+            return getattr(self[userid], attribute)
+        value = User.decode_field(attribute, record.get(attribute))
+        if value is None:
+            return User.default(attribute)
+        return value
+
+    def fields(
+        self, attributes: typing.Sequence[str]
+    ) -> typing.Iterator[typing.Tuple[str, typing.Tuple[typing.Any, ...]]]:
+        """ Iterates over the users, yielding for each the userid
+        and the values of the requested attributes (see field)
+        """
+        for userid in self:
+            yield userid, tuple(self.field(userid, attr) for attr in attributes)
+
+    def candidates(self, usertip: str) -> typing.List[str]:
+        """ Returns the userids of the users for which the usertip
+        is the beginning of the userid, the first name or the last name
+        (case insensitive, see User.maybe_me)
+        """
+        if self._index is None:
+            self._index = PrefixIndex(self.fields(name_attributes))
+        else:
+            self._refresh_indexes()
+        return self._index.search(usertip)
+
+    def fuzzy(
+        self, text: str, limit: int = 10, threshold: float = 0.3
+    ) -> typing.List[typing.Tuple[str, float]]:
+        """ Returns the users which userid, first name or last name
+        are the most similar to the text (see TrigramIndex)
+
+        Parameters
+        ----------
+        text: str
+            search string
+        limit: int
+            maximal number of users returned
+        threshold: float
+            minimal score (between 0 and 1) of the returned users
+
+        Returns
+        -------
+        users: list
+            tuples (userid, score), sorted by decreasing score
+        """
+        if self._fuzzy_index is None:
+            self._fuzzy_index = TrigramIndex(self.fields(name_attributes))
+        else:
+            self._refresh_indexes()
+        return self._fuzzy_index.search(text, limit=limit, threshold=threshold)
+
+    def query(self, expression: str) -> typing.List[str]:
+        """ Returns the (sorted) userids of the users matching the query
+        (see Query), e.g. "vaulted=False and contract=guest"
+        """
+        query = Query(expression)
+        if self._query_index is None:
+            self._query_index = QueryIndex(self.fields(QueryIndex.attributes))
+        else:
+            self._refresh_indexes()
+        return query.run(self._query_index, self.field)
+
+    def _search_indexes(self) -> typing.List[typing.Any]:
+        return [
+            index
+            for index in (self._index, self._fuzzy_index, self._query_index)
+            if index is not None
+        ]
+
+    def _index_user(self, userid: str, user: User) -> None:
+        for index in self._search_indexes():
+            index.add(userid, tuple(getattr(user, attr) for attr in index.attributes))
+
+    def _unindex_user(self, userid: str) -> None:
+        for index in self._search_indexes():
+            index.remove(userid)
+
+    def _refresh_indexes(self) -> None:
+        # the attributes of the users may have been
+        # modified since indexed
+        indexes = self._search_indexes()
+        for userid, user in self._users.items():
+            for index in indexes:
+                values = tuple(getattr(user, attr) for attr in index.attributes)
+                if index.values(userid) != values:
+                    index.add(userid, values)
+
+    def names(
+        self,
+    ) -> typing.Iterator[typing.Tuple[str, typing.Tuple[typing.Any, ...]]]:
+        """ Iterates over the users, yielding for each the userid
+        and the values of the name attributes (see name_attributes)
+        """
+        if self._index is None:
+            yield from self.fields(name_attributes)
+            return
+        self._refresh_indexes()
+        for userid in self:
+            yield userid, self._index.values(userid)
+
+    def fragments(self) -> typing.Iterator[typing.Tuple[str, typing.Any]]:
+        """ Iterates over the json encoded users (see User.to_dict)
+
+        Users which have not been modified since read from the json
+        database file are not re-encoded: their json fragment is
+        copied from the file.
+
+        Yields
+        ------
+        userid: str
+            userid of the user
+        fragment: bytes-like
+            the json encoded user
+        """
+        content = None
+        if self._positions and self._reader is not None:
+            content = memoryview(self._reader.content())
+        for userid in self._records:
+            user = self._users.get(userid)
+            position = self._positions.get(userid)
+            if (
+                content is not None
+                and position is not None
+                and (user is None or not user.dirty_attributes())
+            ):
+                offset, length = position
+                yield userid, content[offset : offset + length]
+            elif user is not None:
+                record = user.to_dict()
+                record[schema.version_key] = self._next_version(userid)
+                yield userid, json.dumps(record).encode("utf-8")
+            else:
+                yield userid, json.dumps(self._record(userid)).encode("utf-8")
+
+    def written(
+        self, path: Path, positions: typing.Dict[str, typing.Tuple[int, int]]
+    ) -> None:
+        """ To be called once the users have been written to a json
+        database file (see fragments).
+
+        If the file is the one the users are read from, the users
+        not read yet are read from their new positions, and the
+        positions are used by further calls to fragments.
+
+        Parameters
+        ----------
+        path: Path
+            Absolute path to the json database file
+        positions: dict
+            userids as keys, position of the encoded user in
+            the file (tuple offset, length) as values
+        """
+        if self._reader is None or self._reader.path != path:
+            return
+        # the file may have been replaced
+        self._reader.close()
+        self._positions = dict(positions)
+        for userid, position in positions.items():
+            if isinstance(self._records.get(userid), tuple):
+                self._records[userid] = position
+
+    def changes(
+        self,
+    ) -> typing.Tuple[typing.Dict[str, typing.Dict[str, typing.Any]], typing.List[str]]:
+        """ Returns the changes applied since the creation of the instance
+        (or the last call to mark_clean).
+
+        Returns
+        -------
+        updated: dict
+            keys: userids of the added or modified users, values: their
+            encoded (see User.to_dict) attributes. All attributes are
+            returned for added users, only the modified ones otherwise.
+        deleted: list
+            userids of the deleted users
+        """
+        updated = {}
+        for userid, user in self._users.items():
+            if userid in self._assigned:
+                updated[userid] = user.to_dict()
+            else:
+                dirty = user.dirty_attributes()
+                if not dirty:
+                    continue
+                updated[userid] = {
+                    attr: User.encode_field(attr, getattr(user, attr)) for attr in dirty
+                }
+            updated[userid][schema.version_key] = self._next_version(userid)
+        return updated, sorted(self._deleted)
+
+    def _next_version(self, userid: str) -> int:
+        # version of the user once its changes are written,
+        # users created again continuing from their tombstone
+        version = self.version(userid)
+        if version is None:
+            version = self._tombstones.get(userid, 0)
+        if userid in self._assigned or self._users[userid].dirty_attributes():
+            return version + 1
+        return version
+
+    def tombstones(self) -> typing.Dict[str, int]:
+        """ Returns the versions of the deleted users which have not
+        been created again: userids as keys, the version they had when
+        deleted as values
+        """
+        return {
+            userid: version
+            for userid, version in self._tombstones.items()
+            if userid not in self._records
+        }
+
+    def modified(self) -> bool:
+        """ Returns True if any user has been added, deleted
+        or modified.
+        """
+        if self._assigned or self._deleted:
+            return True
+        return any(user.dirty_attributes() for user in self._users.values())
+
+    def mark_clean(self) -> None:
+        """ Forgets about all the changes applied so far (to be called
+        once these changes have been written to the database)
+        """
+        for userid, user in self._users.items():
+            if userid in self._assigned or user.dirty_attributes():
+                self._versions[userid] = self._next_version(userid)
+            if user.dirty_attributes():
+                # the record read from the database is outdated
+                self._records[userid] = None
+                self._positions.pop(userid, None)
+            user.mark_clean()
+        for userid in self._deleted:
+            version = self._versions.get(userid)
+            if version is not None:
+                self._tombstones[userid] = version
+            self._versions[userid] = None
+        self._assigned.clear()
+        self._deleted.clear()
+
+    def close(self) -> None:
+        """ Releases the resources used for reading the database
+        (to be called once the instance is not used anymore)
+        """
+        if self._reader is not None:
+            self._reader.close()
@@ -1,4 +1,10 @@
+import os
 from pathlib import Path
 
 """absolute path used as default for the json file database"""
 default_path: Path = Path.home() / ".isensus"
+
+"""fsync policy used by default when writing the database (see
+isensus.data.files), may be set via the ISENSUS_FSYNC environment
+variable"""
+default_fsync: str = os.environ.get("ISENSUS_FSYNC", "file")
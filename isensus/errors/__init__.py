@@ -1,4 +1,5 @@
 from .ambiguous_user import AmbiguousUserError
+from .conflict import ConflictError
 from .existing_user import ExistingUserError
 from .unknown_attribute import UnknownAttributeError
 from .user_not_found import UserNotFoundError
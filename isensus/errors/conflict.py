@@ -0,0 +1,22 @@
+import typing
+
+
+class ConflictError(Exception):
+    """ Raised when changes can not be written to the database
+    because the same users have been modified (or created, or
+    deleted) by another session in the meantime.
+
+    Parameters
+    ----------
+    userids: list of str
+        The userids of the users modified by both sessions.
+    """
+
+    def __init__(self, userids: typing.Sequence[str]):
+        self.userids = list(userids)
+
+    def __str__(self):
+        return str(
+            "conflict: user(s) {} modified by another session, "
+            "changes not saved (please try again)".format(", ".join(self.userids))
+        )
@@ -0,0 +1,200 @@
+""" isensus server, keeping the database in memory between commands
+
+The server (see the serve command) opens a session on the database
+(see Data) and runs the commands sent by the isensus executable
+through a Unix socket (~/.isensus.sock), so that the database is not
+read and decoded again for each command. Changes are written after
+each command, as they would be by the command itself (see Data.commit).
+"""
+
+import contextlib, io, json, os, socket, typing
+from pathlib import Path
+from .commands.commands import commands
+from .commands.arguments import parse
+from .data.data import Data, joined
+from .data.files import file_stat
+from .data.journal import Journal
+from .defaults import default_path
+
+"""commands run by the isensus executable itself, even if
+a server is running"""
+local: typing.Tuple[str, ...] = ("serve", "batch", "migrate", "shell")
+
+Reply = typing.Tuple[str, typing.Optional[str]]
+
+
+def socket_path(path: Path) -> Path:
+    """ Returns the path to the socket of the server of the database """
+    return Path(str(path) + ".sock")
+
+
+def _receive(connection: socket.socket) -> typing.Any:
+    # reads the json encoded message until the end of the stream
+    chunks = []
+    while True:
+        chunk = connection.recv(1 << 16)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return json.loads(b"".join(chunks))
+
+
+def _connect(path: Path) -> typing.Optional[socket.socket]:
+    # connection to the server, None if no server is running
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(str(socket_path(path)))
+    except (FileNotFoundError, ConnectionRefusedError):
+        connection.close()
+        return None
+    return connection
+
+
+def forward(
+    args: typing.Sequence[str], path: Path = default_path
+) -> typing.Optional[Reply]:
+    """ Sends the command to the server of the database
+
+    Parameters
+    ----------
+    args: list of str
+        the command and its arguments, as passed to
+        the isensus executable
+    path: Path (optional)
+        absolute path to datafile (default to ~/.isensus)
+
+    Returns
+    -------
+    reply: tuple
+        what the command printed, and the error message (None if
+        the command succeeded); None if no server is running
+    """
+    connection = _connect(path)
+    if connection is None:
+        return None
+    with connection:
+        connection.sendall(json.dumps({"args": list(args)}).encode("utf-8"))
+        connection.shutdown(socket.SHUT_WR)
+        reply = _receive(connection)
+    return reply["output"], reply["error"]
+
+
+class Server:
+    """ Runs the commands sent through the socket of the database
+    (see socket_path) in a single session
+
+    The users read (and their indexes) stay in memory between
+    commands: the database is read again only if modified by
+    another process (e.g. the batch command), or to discard the
+    changes of a failing command. The changes of each command are
+    written at once when it succeeds (see Data.commit). Commands
+    are run one at a time.
+
+    Parameters
+    ----------
+    path: Path (optional)
+        absolute path to datafile (default to ~/.isensus)
+    """
+
+    def __init__(self, path: Path = default_path):
+        self._path = path
+        self._socket_path = socket_path(path)
+        self._stopped = False
+
+    def __enter__(self) -> "Server":
+        connection = _connect(self._path)
+        if connection is not None:
+            connection.close()
+            raise RuntimeError(
+                "a server is already running for {}".format(self._path)
+            )
+        # left over by a server which did not exit properly
+        with contextlib.suppress(FileNotFoundError):
+            self._socket_path.unlink()
+        self._data = Data(path=self._path)
+        self._users = self._data.__enter__()
+        self._files = self._stat()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            # only the owner may connect, from the creation of the socket
+            umask = os.umask(0o177)
+            try:
+                self._socket.bind(str(self._socket_path))
+            finally:
+                os.umask(umask)
+            self._socket.listen()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        # so that stop is noticed
+        self._socket.settimeout(0.2)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self._socket.close()
+        with contextlib.suppress(FileNotFoundError):
+            self._socket_path.unlink()
+        self._data.__exit__(type, value, traceback)
+
+    def _stat(self) -> typing.Tuple[typing.Any, ...]:
+        # changes when the database is written
+        return file_stat(self._path), file_stat(Journal(self._path).path)
+
+    def run(self, args: typing.Sequence[str]) -> Reply:
+        """ Runs the command
+
+        Parameters
+        ----------
+        args: list of str
+            the command and its arguments, as passed to
+            the isensus executable
+
+        Returns
+        -------
+        reply: tuple
+            what the command printed, and the error message
+            (None if the command succeeded)
+        """
+        output = io.StringIO()
+        error = None
+        try:
+            command, input_args, input_options = parse(commands, args)
+            if args[0] in local:
+                raise ValueError("can not be run by the server")
+            if self._stat() != self._files:
+                # written by another process
+                self._users = self._data.rollback()
+            with contextlib.redirect_stdout(output):
+                with joined(self._path, self._users):
+                    user = command(*input_args, **input_options, path=self._path)
+                    # as the isensus executable does
+                    if user and command is not commands["show"]:
+                        print(user.to_string())
+            self._data.commit()
+        except Exception as e:
+            error = str(e)
+            self._users = self._data.rollback()
+        self._files = self._stat()
+        return output.getvalue(), error
+
+    def serve(self) -> None:
+        """ Runs the commands received until stop is called """
+        while not self._stopped:
+            try:
+                connection, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+            with connection:
+                connection.settimeout(10)
+                try:
+                    request = _receive(connection)
+                    output, error = self.run(request["args"])
+                    reply = {"output": output, "error": error}
+                    connection.sendall(json.dumps(reply).encode("utf-8"))
+                except (OSError, ValueError, KeyError):
+                    # client gone, or invalid request
+                    continue
+
+    def stop(self) -> None:
+        """ Stops serving (see serve) """
+        self._stopped = True
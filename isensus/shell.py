@@ -0,0 +1,158 @@
+""" Interactive isensus shell, keeping the database open between commands
+
+The commands of the isensus executable are typed at the prompt of
+the shell (see the shell command), and run in a single session (see
+Data): the database is read once, and the changes are written when
+committed.
+"""
+
+import cmd, shlex, typing
+from enum import Enum
+from pathlib import Path
+from .commands.commands import commands
+from .commands.arguments import arguments, parse, usage
+from .data.data import Data, joined
+from .data.users import Users
+from .data.user import User
+from .errors import ConflictError
+
+"""commands which can not be run from the shell"""
+excluded: typing.Tuple[str, ...] = ("batch", "migrate", "serve", "shell")
+
+
+def _values(attribute: str) -> typing.List[str]:
+    # values suggested for the attribute
+    try:
+        attr_type = User.get_type(attribute)
+    except Exception:
+        return []
+    if attr_type is bool:
+        return ["True", "False"]
+    if isinstance(attr_type, type) and issubclass(attr_type, Enum):
+        return list(attr_type.__members__)
+    return []
+
+
+class Shell(cmd.Cmd):
+    """ Command interpreter running the isensus commands in a session
+
+    Besides the isensus commands, supports 'commit' (writes the
+    changes), 'rollback' (discards them, and reads the database
+    again), 'help' and 'exit'. Userids, attributes and the values of
+    boolean and enumeration attributes are completed with tab.
+
+    Parameters
+    ----------
+    data: Data
+        the session, already entered
+    users: Users
+        the users returned when entering the session
+    path: Path
+        absolute path to the datafile of the session
+    """
+
+    intro = "isensus shell: 'help' for the list of commands, 'exit' to quit"
+    prompt = "isensus> "
+
+    def __init__(self, data: Data, users: Users, path: Path):
+        super().__init__()
+        self._data = data
+        self._users = users
+        self._path = path
+        # exit requested, while the changes were not committed
+        self._exiting = False
+
+    def _run(self, args: typing.List[str]) -> None:
+        if args[0] in excluded:
+            raise ValueError("can not be run from the shell")
+        command, input_args, input_options = parse(commands, args)
+        with joined(self._path, self._users):
+            user = command(*input_args, **input_options, path=self._path)
+        # as the isensus executable does
+        if user and command is not commands["show"]:
+            print(user.to_string())
+
+    def default(self, line: str) -> None:
+        try:
+            self._run(shlex.split(line))
+        except Exception as e:
+            print("error: {}".format(e))
+
+    def emptyline(self) -> bool:
+        return False
+
+    def _modified(self) -> bool:
+        return self._users.modified()  # type: ignore
+
+    def postcmd(self, stop: bool, line: str) -> bool:
+        # '*': changes not committed
+        self.prompt = "isensus*> " if self._modified() else "isensus> "
+        return stop
+
+    def do_commit(self, arg: str) -> None:
+        """ commit: writes the changes """
+        try:
+            self._data.commit()
+        except ConflictError as e:
+            print("error: {}\n(rollback to read the database again)".format(e))
+
+    def do_rollback(self, arg: str) -> None:
+        """ rollback: discards the changes, and reads the database again """
+        self._users = self._data.rollback()
+
+    def do_exit(self, arg: str) -> bool:
+        """ exit: quits the shell (changes not committed are lost) """
+        if self._modified() and not self._exiting:
+            print("changes not committed: commit, or exit again to discard them")
+            self._exiting = True
+            return False
+        if self._modified():
+            self._users = self._data.rollback()
+        return True
+
+    do_EOF = do_exit
+
+    def do_help(self, arg: str) -> None:
+        """ help: prints the list of commands """
+        if arg in commands:
+            print(commands[arg].__doc__)
+            return
+        for name, command in commands.items():
+            if name not in excluded:
+                print(name, ":", usage(command))
+        for name in ("commit", "rollback", "exit"):
+            print(getattr(self, "do_" + name).__doc__.strip())
+
+    def precmd(self, line: str) -> str:
+        if line.strip().split(" ", 1)[0] not in ("exit", "EOF"):
+            self._exiting = False
+        return line
+
+    def completenames(self, text: str, *ignored) -> typing.List[str]:
+        names = [name for name in commands if name not in excluded]
+        names.extend(("commit", "rollback", "exit", "help"))
+        return [name for name in names if name.startswith(text)]
+
+    def completedefault(
+        self, text: str, line: str, begidx: int, endidx: int
+    ) -> typing.List[str]:
+        # completing the argument of the command being typed
+        words = line[:begidx].split()
+        command = commands.get(words[0]) if words else None
+        if command is None:
+            return []
+        index = len(words) - 1
+        names = arguments(command)
+        if index >= len(names):
+            return []
+        if names[index] in ("usertip", "userid"):
+            candidates: typing.Iterable[str] = self._users.keys()
+        elif names[index] == "attribute":
+            candidates = User.__annotations__.keys()
+        elif names[index] == "value" and index >= 1:
+            candidates = _values(words[index])
+        else:
+            return []
+        return sorted(
+            candidate for candidate in candidates if candidate.startswith(text)
+        )
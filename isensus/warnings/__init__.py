@@ -0,0 +1,10 @@
+from .registry import categories, rule, resolve, vectorize, vectorized
+from .engine import (
+    user_warnings,
+    all_warnings,
+    rule_userids,
+    transition_days,
+    map_chunks,
+)
+from .view import WarningsView, outstanding
+from .report import Report, build_report
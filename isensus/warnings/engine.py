@@ -0,0 +1,209 @@
+import datetime, itertools, typing
+from concurrent.futures import ProcessPoolExecutor
+from ..data.contract import Contract
+from ..data.table import UserRow, UserTable
+from ..data.user import User
+from . import rules  # registers the rules
+from .masks import Masks, mask, rows
+from .registry import Rule, resolve, vectorized
+
+"""active users which contract ends within this number of days
+(or has ended) are in transition (see isensus.warnings.registry)"""
+transition_days: int = 10
+
+# the rules are resolved once, when this module is imported:
+# the rules evaluated for alumni, active users and active
+# users in transition
+_rules = resolve()
+_alumni = _rules["core"] + _rules["alumni"]
+_active = _rules["core"] + _rules["active"]
+_transition = _active + _rules["transition"]
+# and their vectorized versions
+_vectors = vectorized()
+
+
+def today() -> int:
+    """ Returns the current date, as a day ordinal """
+    return datetime.date.today().toordinal()
+
+
+def user_warnings(user: User, day: typing.Optional[int] = None) -> typing.List[str]:
+    """ Returns the warnings of the user, i.e. the warnings found
+    by the rules of the categories the user belongs to (see
+    isensus.warnings.registry)
+
+    Parameters
+    ----------
+    user: User
+        the user
+    day: int (optional)
+        the current date, as a day ordinal (default: today)
+
+    Returns
+    -------
+    warnings: list of str
+        the warnings, empty if none
+    """
+    if day is None:
+        day = today()
+    if user.contract is Contract.alumni:
+        user_rules = _alumni
+    else:
+        end = user.contract_end.ordinal if user.contract_end is not None else None
+        if end is not None and end - day <= transition_days:
+            user_rules = _transition
+        else:
+            user_rules = _active
+    found = []
+    for user_rule in user_rules:
+        warning = user_rule(user, day)
+        if warning is not None:
+            found.append(warning)
+    return found
+
+
+def all_warnings(
+    users: typing.Iterable[typing.Tuple[str, User]], day: typing.Optional[int] = None
+) -> typing.Dict[str, typing.List[str]]:
+    """ Returns the warnings of the users (see user_warnings)
+
+    Parameters
+    ----------
+    users: iterable
+        tuples (userid, instance of User), e.g. the items of
+        the users of a session, or isensus.data.data.stream_data
+    day: int (optional)
+        the current date, as a day ordinal (default: today)
+
+    Returns
+    -------
+    warnings: dict
+        userids as keys, list of warnings as values (only
+        for the users having warnings)
+    """
+    if day is None:
+        day = today()
+    found = {}
+    for userid, user in users:
+        warnings = user_warnings(user, day)
+        if warnings:
+            found[userid] = warnings
+    return found
+
+
+def _categories(masks: Masks) -> typing.Dict[str, int]:
+    # masks of the users of each category
+    alumni = masks.equals("contract", Contract.alumni)
+    active = masks.all & ~alumni
+    ending = masks.date("contract_end", "<=", masks.day + transition_days)
+    return {
+        "core": masks.all,
+        "active": active,
+        "transition": active & ending,
+        "alumni": alumni,
+    }
+
+
+def _evaluate(
+    user_rule: Rule, masks: Masks, selected: int, table: UserTable
+) -> int:
+    # mask of the selected users having the warning of the rule
+    vector = _vectors.get(user_rule)
+    if vector is not None:
+        return vector(masks) & selected
+    # no vectorized version: evaluating the rule user by user
+    found = bytearray(len(table))
+    userids = table.userids()
+    for row in rows(selected):
+        user = UserRow(table, userids[row])
+        if user_rule(user, masks.day) is not None:  # type: ignore
+            found[row] = 1
+    return mask(found)
+
+
+def map_chunks(
+    function: typing.Callable[[UserTable, int], typing.Any],
+    table: UserTable,
+    day: int,
+    jobs: int,
+) -> typing.List[typing.Any]:
+    """ Applies the function to chunks of the table (see
+    UserTable.partition), in jobs processes
+
+    Parameters
+    ----------
+    function: callable
+        called with a chunk of the table and the day, must be
+        a function of a module (so that it can be pickled)
+    table: UserTable
+        the users
+    day: int
+        the current date, as a day ordinal
+    jobs: int
+        the number of processes (the function is applied to the
+        whole table in the current process if 1)
+
+    Returns
+    -------
+    results: list
+        the results of the function, in the order of the chunks
+        (i.e. of the rows of the table)
+
+    Raises
+    ------
+    ValueError
+        if jobs is lower than 1
+    """
+    if jobs < 1:
+        raise ValueError("the number of jobs should be at least 1")
+    if jobs < 2 or len(table) < 2:
+        return [function(table, day)]
+    chunks = table.partition(jobs)
+    with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+        return list(executor.map(function, chunks, itertools.repeat(day)))
+
+
+def rule_userids(
+    table: UserTable, day: typing.Optional[int] = None, jobs: int = 1
+) -> typing.Dict[str, typing.List[str]]:
+    """ Evaluates each rule over all the users at once
+
+    The rules are evaluated as operations over the columns of the
+    table (see isensus.warnings.masks.Masks), using their vectorized
+    versions (see isensus.warnings.registry.vectorize), or user by
+    user for rules which have none.
+
+    Parameters
+    ----------
+    table: UserTable
+        the users
+    day: int (optional)
+        the current date, as a day ordinal (default: today)
+    jobs: int (optional)
+        number of processes the rules are evaluated in, each over
+        a chunk of the table (see map_chunks)
+
+    Returns
+    -------
+    userids: dict
+        names of the rules as keys, userids of the users having
+        the warning of the rule as values (in the order of the
+        rows of the table)
+    """
+    if day is None:
+        day = today()
+    if jobs != 1:
+        # jobs lower than 1 are rejected by map_chunks
+        parts = map_chunks(rule_userids, table, day, jobs)
+        return {
+            name: [userid for part in parts for userid in part[name]]
+            for name in parts[0]
+        }
+    masks = Masks(table, day)
+    selected = _categories(masks)
+    found = {}
+    for category, category_rules in _rules.items():
+        for user_rule in category_rules:
+            bits = _evaluate(user_rule, masks, selected[category], table)
+            found[user_rule.__name__] = masks.userids(bits)
+    return found
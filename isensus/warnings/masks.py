@@ -0,0 +1,117 @@
+import operator, typing
+from enum import Enum
+from ..data.table import UserTable, kinds, _null
+
+# translation of bytes 0 and 1 into the ascii digits '0' and '1'
+_digits = bytes.maketrans(b"\x00\x01", b"01")
+
+_operators: typing.Dict[str, typing.Callable[[int, int], bool]] = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def mask(values: typing.Iterable[int]) -> int:
+    """ Returns the mask (int which bit i is set if value i is True)
+    of the values
+    """
+    return int(bytes(values).translate(_digits)[::-1] or b"0", 2)
+
+
+def rows(bits: int) -> typing.Iterator[int]:
+    """ Iterates over the rows (bits) set in the mask """
+    digits = bin(bits)[:1:-1]
+    row = digits.find("1")
+    while row != -1:
+        yield row
+        row = digits.find("1", row + 1)
+
+
+class Masks:
+    """ Boolean masks over the columns of a UserTable
+
+    A mask is an int which bit i is set if the condition holds for
+    the user of row i of the table, so that conditions over all the
+    users combine with bitwise operations, e.g.
+    masks.all & ~masks.flag("vaulted") & masks.equals("contract",
+    Contract.alumni). Masks of boolean attributes are the bits of
+    their columns (see BitArray), others are computed from the
+    columns at once.
+
+    Parameters
+    ----------
+    table: UserTable
+        the users
+    day: int
+        current date, as a day ordinal
+    """
+
+    def __init__(self, table: UserTable, day: int):
+        self._table = table
+        self.day = day
+        self.all = (1 << len(table)) - 1
+        self._cache: typing.Dict[typing.Tuple, int] = {}
+
+    def _cached(self, key: typing.Tuple, compute: typing.Callable[[], int]) -> int:
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = self._cache[key] = compute()
+            return value
+
+    def flag(self, attribute: str) -> int:
+        """ Mask of the users for which the boolean attribute is True """
+        column = self._table.column(attribute)
+        return self._cached(("flag", attribute), column.to_int)
+
+    def equals(self, attribute: str, value: Enum) -> int:
+        """ Mask of the users for which the enumeration
+        attribute has the value
+        """
+
+        def _compute() -> int:
+            # one byte per row: the value of the item (-1 for None)
+            column = self._table.column(attribute).tobytes()
+            table = bytearray(b"0" * 256)
+            table[value.value & 0xFF] = ord("1")
+            return int(column.translate(table)[::-1] or b"0", 2)
+
+        return self._cached(("equals", attribute, value), _compute)
+
+    def date(self, attribute: str, op: str, ordinal: int) -> int:
+        """ Mask of the users for which the date attribute is set and
+        compares to the day ordinal (op: one of '<', '<=', '>', '>=')
+        """
+        compare = _operators[op]
+        column = self._table.column(attribute)
+        return self._cached(
+            ("date", attribute, op, ordinal),
+            lambda: mask(value != 0 and compare(value, ordinal) for value in column),
+        )
+
+    def not_set(self, attribute: str) -> int:
+        """ Mask of the users for which the attribute is None, False,
+        empty or a date which is not set
+        """
+
+        def _compute() -> int:
+            kind = kinds[attribute]
+            column = self._table.column(attribute)
+            if kind == "bool":
+                return self.all & ~column.to_int()
+            if kind == "date":
+                return mask(value == 0 for value in column)
+            if kind == "enum":
+                return mask(value == -1 for value in column)
+            if kind == "int":
+                return mask(value == _null for value in column)
+            return mask(not value for value in column)
+
+        return self._cached(("not_set", attribute), _compute)
+
+    def userids(self, bits: int) -> typing.List[str]:
+        """ Returns the userids of the users of the mask """
+        userids = self._table.userids()
+        return [userids[row] for row in rows(bits)]
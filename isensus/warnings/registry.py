@@ -0,0 +1,84 @@
+import typing
+from ..data.user import User
+from .masks import Masks
+
+"""a rule returns the warning (str) it finds for the user, or None.
+Its second argument is the current date, as a day ordinal (see
+isensus.data.date.Date.ordinal)."""
+Rule = typing.Callable[[User, int], typing.Optional[str]]
+
+"""vectorized version of a rule: returns the mask of the users
+having the warning (see isensus.warnings.masks.Masks)"""
+MaskRule = typing.Callable[[Masks], int]
+
+"""categories of rules: core rules apply to all users, active rules
+to the users which are not alumni, transition rules to the active
+users which contract ends soon, and alumni rules to alumni"""
+categories: typing.Tuple[str, ...] = ("core", "active", "transition", "alumni")
+
+# registered rules, per category
+_registered: typing.Dict[str, typing.List[Rule]] = {
+    category: [] for category in categories
+}
+# vectorized versions of the rules
+_vectorized: typing.Dict[Rule, MaskRule] = {}
+
+
+def rule(category: str) -> typing.Callable[[Rule], Rule]:
+    """ Decorator registering a function as a warning rule
+
+    Parameters
+    ----------
+    category: str
+        the category of the rule (see categories)
+
+    Raises
+    ------
+    ValueError
+        if the category is unknown
+    """
+    if category not in categories:
+        raise ValueError(
+            "unknown category of warnings: {} (should be one of: {})".format(
+                category, ", ".join(categories)
+            )
+        )
+
+    def _register(function: Rule) -> Rule:
+        _registered[category].append(function)
+        return function
+
+    return _register
+
+
+def vectorize(rule: Rule) -> typing.Callable[[MaskRule], MaskRule]:
+    """ Decorator registering a function as the vectorized version
+    of a rule, used when evaluating the rules over a whole table of
+    users (see isensus.warnings.engine.rule_userids). The function
+    returns the mask of the users having the warning (whatever
+    their category). Rules without vectorized version are evaluated
+    user by user.
+
+    Parameters
+    ----------
+    rule: function
+        the rule (see rule)
+    """
+
+    def _register(function: MaskRule) -> MaskRule:
+        _vectorized[rule] = function
+        return function
+
+    return _register
+
+
+def vectorized() -> typing.Dict[Rule, MaskRule]:
+    """ Returns the vectorized versions of the rules (see vectorize) """
+    return dict(_vectorized)
+
+
+def resolve() -> typing.Dict[str, typing.Tuple[Rule, ...]]:
+    """ Returns the registered rules, as a tuple per category
+    (rules in the order they have been registered)
+    """
+    return {category: tuple(rules) for category, rules in _registered.items()}
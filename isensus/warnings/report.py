@@ -0,0 +1,119 @@
+import typing
+from collections import Counter
+from dataclasses import dataclass, field
+from ..data.contract import Contract
+from ..data.table import UserTable
+from ..data.title import Title
+from .engine import map_chunks, rule_userids, today, user_warnings
+
+
+@dataclass
+class Report:
+    """ Audit of the users: warnings of the users having some,
+    and number of users (and of users having warnings) per
+    contract and per title
+
+    Attributes
+    ----------
+    warnings: dict
+        userids as keys, lists of warnings as values (only for the
+        users having warnings, in the order of the rows of the table)
+    descriptions: dict
+        userids as keys, attributes of the users (see User.to_string)
+        as values, for the users having warnings
+    contracts: dict
+        names of the contracts (or 'not set') as keys, number of users
+        and number of users having warnings as values
+    titles: dict
+        same as contracts, for the titles
+    """
+
+    warnings: typing.Dict[str, typing.List[str]] = field(default_factory=dict)
+    descriptions: typing.Dict[str, str] = field(default_factory=dict)
+    contracts: typing.Dict[str, typing.Tuple[int, int]] = field(default_factory=dict)
+    titles: typing.Dict[str, typing.Tuple[int, int]] = field(default_factory=dict)
+
+
+# per enumeration attribute, number of users and of users having
+# warnings per value of its column (-1 for not set)
+_Counted = typing.Dict[str, typing.Tuple[typing.Counter, typing.Counter]]
+
+_counted_attributes = ("contract", "title")
+
+
+def _counts(
+    enum: typing.Any, counted: typing.Tuple[typing.Counter, typing.Counter]
+) -> typing.Dict[str, typing.Tuple[int, int]]:
+    # number of users (having warnings) per value, in the
+    # order of the enumeration
+    users, flagged = counted
+    names = [(item.value, item.name) for item in enum] + [(-1, "not set")]
+    return {name: (users[value], flagged[value]) for value, name in names}
+
+
+def _chunk_report(
+    table: UserTable, day: int
+) -> typing.Tuple[typing.Dict[str, typing.List[str]], typing.Dict[str, str], _Counted]:
+    # the report of the users of the table (see build_report), the users
+    # having warnings being found by evaluating the rules over all
+    # users at once (see rule_userids)
+    flagged = set()
+    for userids in rule_userids(table, day).values():
+        flagged.update(userids)
+    warnings: typing.Dict[str, typing.List[str]] = {}
+    descriptions: typing.Dict[str, str] = {}
+    flagged_rows = bytearray(len(table))
+    for row, userid in enumerate(table.userids()):
+        if userid not in flagged:
+            continue
+        user = table[userid].to_user()
+        warnings[userid] = user_warnings(user, day)
+        descriptions[userid] = user.to_string()
+        flagged_rows[row] = 1
+    counted = {}
+    for attr in _counted_attributes:
+        column = table.column(attr)
+        counted[attr] = (
+            Counter(column),
+            Counter(value for value, set_ in zip(column, flagged_rows) if set_),
+        )
+    return warnings, descriptions, counted
+
+
+def build_report(
+    table: UserTable, day: typing.Optional[int] = None, jobs: int = 1
+) -> Report:
+    """ Returns the audit of the users (see Report)
+
+    Parameters
+    ----------
+    table: UserTable
+        the users
+    day: int (optional)
+        the current date, as a day ordinal (default: today)
+    jobs: int (optional)
+        number of processes the report is computed in, each for
+        a chunk of the table (see map_chunks). The result does
+        not depend on it.
+
+    Returns
+    -------
+    report: Report
+        the audit of the users
+    """
+    if day is None:
+        day = today()
+    result = Report()
+    counted: _Counted = {attr: (Counter(), Counter()) for attr in _counted_attributes}
+    # chunks are merged in the order of the rows
+    for warnings, descriptions, part_counted in map_chunks(
+        _chunk_report, table, day, jobs
+    ):
+        result.warnings.update(warnings)
+        result.descriptions.update(descriptions)
+        for attr, (users, flagged) in part_counted.items():
+            counted[attr][0].update(users)
+            counted[attr][1].update(flagged)
+    result.contracts = _counts(Contract, counted["contract"])
+    result.titles = _counts(Title, counted["title"])
+    return result
@@ -0,0 +1,121 @@
+""" The warning rules (see isensus.warnings.registry.rule), and
+their vectorized versions (see isensus.warnings.registry.vectorize)
+"""
+
+import typing
+from ..data.contract import Contract
+from ..data.date import Date
+from ..data.user import User
+from .masks import Masks
+from .registry import MaskRule, Rule, rule, vectorize
+
+
+def _not_set(attribute: str) -> Rule:
+    # rule warning if the attribute is None, False, empty
+    # or a date which is not set
+    def _rule(user: User, today: int) -> typing.Optional[str]:
+        value = getattr(user, attribute)
+        if isinstance(value, Date):
+            value = value.ordinal
+        if not value:
+            return "{} is not set".format(attribute)
+        return None
+
+    _rule.__name__ = "{}_not_set".format(attribute)
+    return _rule
+
+
+def _not_set_mask(attribute: str) -> MaskRule:
+    # vectorized version of _not_set
+    def _mask(masks: Masks) -> int:
+        return masks.not_set(attribute)
+
+    return _mask
+
+
+@rule("core")
+def expired_not_alumni(user: User, today: int) -> typing.Optional[str]:
+    end = user.contract_end.ordinal if user.contract_end is not None else None
+    if end is not None and end < today and user.contract is not Contract.alumni:
+        return "contract expired but not set alumni"
+    return None
+
+
+@vectorize(expired_not_alumni)
+def _expired_not_alumni(masks: Masks) -> int:
+    expired = masks.date("contract_end", "<", masks.day)
+    return expired & ~masks.equals("contract", Contract.alumni)
+
+
+for _attribute in (
+    "firstname",
+    "lastname",
+    "ldap",
+    "forms_sent",
+    "forms_received",
+    "website_privacy",
+    "contract_end",
+    "contract",
+    "title",
+):
+    vectorize(rule("active")(_not_set(_attribute)))(_not_set_mask(_attribute))
+
+
+@rule("transition")
+def no_closure_mail(user: User, today: int) -> typing.Optional[str]:
+    if not user.closure_mail_sent:
+        return "contract expires soon, but no closure mail has been sent"
+    return None
+
+
+@vectorize(no_closure_mail)
+def _no_closure_mail(masks: Masks) -> int:
+    return ~masks.flag("closure_mail_sent")
+
+
+@rule("alumni")
+def not_vaulted(user: User, today: int) -> typing.Optional[str]:
+    if not user.vaulted:
+        return "user is not (ldap) vaulted"
+    return None
+
+
+@vectorize(not_vaulted)
+def _not_vaulted(masks: Masks) -> int:
+    return ~masks.flag("vaulted")
+
+
+@rule("alumni")
+def no_forwarder(user: User, today: int) -> typing.Optional[str]:
+    if not user.forwarder:
+        return "user email has not been replaced by a forwarder"
+    return None
+
+
+@vectorize(no_forwarder)
+def _no_forwarder(masks: Masks) -> int:
+    return ~masks.flag("forwarder")
+
+
+@rule("alumni")
+def not_website_alumni(user: User, today: int) -> typing.Optional[str]:
+    if not user.website_alumni:
+        return "user not set as alumni in the website"
+    return None
+
+
+@vectorize(not_website_alumni)
+def _not_website_alumni(masks: Masks) -> int:
+    return ~masks.flag("website_alumni")
+
+
+@rule("alumni")
+def assets_in_is_snipe(user: User, today: int) -> typing.Optional[str]:
+    if not user.is_snipe_cleared:
+        return "user may still have some assets deployed to in is-snipe"
+    return None
+
+
+@vectorize(assets_in_is_snipe)
+def _assets_in_is_snipe(masks: Masks) -> int:
+    return ~masks.flag("is_snipe_cleared")
@@ -0,0 +1,255 @@
+import json, typing
+from pathlib import Path
+from ..data.files import FileLock, atomic_write, file_stat
+from ..data.journal import Journal
+from ..data.sqlite import is_sqlite
+from ..data.user import User
+from .engine import all_warnings, today, transition_days, user_warnings
+
+
+def _signature(path: Path) -> typing.List[typing.Any]:
+    # changes each time the database is written
+    stat = file_stat(path)
+    if stat is None:
+        return []
+    return [*stat, Journal(path).size()]
+
+
+def _entry(userid: str, warnings: typing.List[str]) -> bytes:
+    return json.dumps(["user", userid, warnings]).encode("utf-8") + b"\n"
+
+
+def _state(day: int, signature: typing.List[typing.Any], size: int) -> bytes:
+    return json.dumps(["state", day, signature, size]).encode("utf-8") + b"\n"
+
+
+class WarningsView:
+    """ The warnings of the users (see user_warnings), saved next to
+    the database file (~/.isensus.warnings)
+
+    Each line of the file is either the (json encoded) warnings of a
+    user, ["user", userid, [warnings]] (an empty list if the user has
+    none, or has been deleted), or the state of the view,
+    ["state", day, signature, size]: day being the date (day ordinal)
+    the warnings have been computed for, signature the state of the
+    database files (modification time, size, inode, size of the
+    journal) and size the size of the users' lines when the view was
+    last saved. The last line of the file wins.
+
+    When a Data session writes its changes, the warnings of the users
+    it modified are appended (see update), so that the warnings of all
+    the users are read without evaluating any rule (see outstanding).
+    The view is used only if its last state corresponds to the current
+    database files; otherwise (e.g. the database has been written by
+    a former version of isensus), it is computed again for all users.
+    As the journal of the database, the view is compacted (i.e. saved
+    again, one line per user) once the lines appended since it was
+    last saved exceed compaction_threshold bytes.
+
+    Parameters
+    ----------
+    path: Path
+        Absolute path to the database file (the view file is
+        this path suffixed with '.warnings')
+    """
+
+    suffix: str = ".warnings"
+    compaction_threshold: int = 1 << 20
+
+    def __init__(self, path: Path):
+        self._database = path
+        self._path = Path(str(path) + self.suffix)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def _last_state(self) -> typing.Optional[typing.List[typing.Any]]:
+        # the last line of the file, if a state
+        try:
+            with open(self._path, "rb") as f:
+                f.seek(0, 2)
+                size = f.tell()
+                f.seek(max(0, size - 4096))
+                last = f.read().rstrip(b"\n").rsplit(b"\n", 1)[-1]
+            line = json.loads(last)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(line, list) or not line or line[0] != "state":
+            return None
+        return line
+
+    def valid(self) -> bool:
+        """ Returns True if the view corresponds to the current
+        database files
+        """
+        state = self._last_state()
+        return state is not None and state[2] == _signature(self._database)
+
+    def load(
+        self,
+    ) -> typing.Optional[typing.Tuple[int, typing.Dict[str, typing.List[str]]]]:
+        """ Returns the date the warnings have been computed for (day
+        ordinal) and the warnings (userids as keys, lists of warnings
+        as values), or None if the view is not valid (see valid)
+        """
+        if not self.valid():
+            return None
+        warnings: typing.Dict[str, typing.List[str]] = {}
+        day = 0
+        with open(self._path, "rb") as f:
+            for line in f:
+                kind, key, value = json.loads(line)[:3]
+                if kind == "state":
+                    day = key
+                elif value:
+                    warnings[key] = value
+                else:
+                    warnings.pop(key, None)
+        return day, warnings
+
+    def save(self, day: int, warnings: typing.Mapping[str, typing.List[str]]) -> None:
+        """ Writes the view
+
+        Parameters
+        ----------
+        day: int
+            the date the warnings have been computed for (day ordinal)
+        warnings: dict
+            userids as keys, lists of warnings as values
+        """
+        content = b"".join(
+            _entry(userid, user_warnings)
+            for userid, user_warnings in warnings.items()
+            if user_warnings
+        )
+        # the view is computed again if lost
+        atomic_write(
+            self._path,
+            content + _state(day, _signature(self._database), len(content)),
+            fsync="none",
+        )
+
+    def update(
+        self,
+        users: typing.Mapping[str, User],
+        updated: typing.Iterable[str],
+        deleted: typing.Iterable[str],
+        valid: bool,
+    ) -> None:
+        """ Appends the warnings of the users modified by a session,
+        once its changes have been written (the database being locked
+        exclusively)
+
+        Parameters
+        ----------
+        users: dict
+            the users of the session
+        updated: iterable
+            userids of the users added or modified by the session
+        deleted: iterable
+            userids of the users deleted by the session
+        valid: bool
+            if the view was valid before the changes have been written
+            (see valid). If not, nothing is done.
+        """
+        if not valid:
+            return
+        state = self._last_state()
+        # the view keeps the date of the last sweep (see outstanding)
+        day = state[1] if state is not None else today()
+        saved = state[3] if state is not None and len(state) > 3 else 0
+        lines = [_entry(userid, user_warnings(users[userid])) for userid in updated]
+        lines.extend(_entry(userid, []) for userid in deleted)
+        lines.append(_state(day, _signature(self._database), saved))
+        with open(self._path, "ab") as f:
+            f.write(b"".join(lines))
+            size = f.tell()
+        if size - saved > self.compaction_threshold:
+            loaded = self.load()
+            if loaded is not None:
+                self.save(*loaded)
+
+
+def _window(last: int, day: int) -> typing.Tuple[int, int]:
+    # the rules depend on the date only via the end of the contract:
+    # whether it expired (core) and whether it is close (transition).
+    # Returns the range of contract ends for which the warnings may
+    # differ between both dates (last < day).
+    return last, day + transition_days
+
+
+def _swept(
+    users: typing.Iterable[typing.Tuple[str, User]], last: int, day: int
+) -> typing.Iterator[typing.Tuple[str, User]]:
+    # the users which warnings may differ between both dates
+    if last > day:
+        yield from users
+        return
+    low, high = _window(last, day)
+    for userid, user in users:
+        end = user.contract_end.ordinal if user.contract_end is not None else None
+        if end is not None and low <= end <= high:
+            yield userid, user
+
+
+def outstanding(
+    path: Path, day: typing.Optional[int] = None
+) -> typing.Dict[str, typing.List[str]]:
+    """ Returns the warnings of all users, read from the view
+    (see WarningsView)
+
+    If the view is not valid, the warnings of all users are computed
+    and saved. If the view has been computed for another date, the
+    warnings of the users which contract ends close to these dates
+    are computed again (daily sweep), these users being found in the
+    timeline of the database (see isensus.data.timeline.Timeline)
+    rather than by iterating over all users. Within a joined session (see
+    isensus.data.data.joined), the users may have changes not written
+    yet: their warnings are computed, and the view is left as is.
+
+    Parameters
+    ----------
+    path: Path
+        Absolute path to the database file
+    day: int (optional)
+        the current date, as a day ordinal (default: today)
+
+    Returns
+    -------
+    warnings: dict
+        userids as keys, list of warnings as values (only
+        for the users having warnings)
+    """
+    # imported here, as isensus.data.data updates the view
+    from ..data.data import _contract_ends, _joined, stream_data
+
+    if day is None:
+        day = today()
+    if path in _joined:
+        return all_warnings(stream_data(path), day)
+    view = WarningsView(path)
+    # sessions wait for the view to be saved
+    with FileLock(path, shared=True):
+        loaded = view.load()
+        if loaded is None:
+            warnings = all_warnings(stream_data(path), day)
+            view.save(day, warnings)
+            return warnings
+        last, warnings = loaded
+        if last == day:
+            return warnings
+        swept: typing.Optional[typing.Iterable[typing.Tuple[str, User]]] = None
+        if last < day and not is_sqlite(path):
+            swept = _contract_ends(path, *_window(last, day))
+        if swept is None:
+            # all users, e.g. sqlite3 database or date going backwards
+            swept = _swept(stream_data(path), last, day)
+        for userid, user in swept:
+            found = user_warnings(user, day)
+            if found:
+                warnings[userid] = found
+            else:
+                warnings.pop(userid, None)
+        view.save(day, warnings)
+    return warnings
@@ -1,6 +1,10 @@
+import dataclasses
+import datetime
+import io
 import json
 import pytest
 import tempfile
+import time
 import pathlib
 import isensus
 from isensus import commands
@@ -26,6 +30,10 @@ def test_data_file(request, scope="function"):
     yield p
 
     f.close()
+    # removing the files isensus may have created
+    # next to the database (e.g. journal)
+    for sidecar in p.parent.glob(p.name + ".*"):
+        sidecar.unlink()
 
 
 def test_create_command(test_data_file):
@@ -196,3 +204,1394 @@ def test_date(test_data_file):
         user = isensus.User.find_user(users,"bmarley")
         assert str(user.contract_end) == right_format
 
+
+
+def test_journal(test_data_file):
+    """
+    Testing changes are appended to the journal
+    rather than written to the json file, and that
+    the journal gets compacted once too large.
+    """
+
+    data_path = test_data_file
+    journal = isensus.data.journal.Journal(data_path)
+
+    # upgrading the test file to the current database format
+    isensus.get_data(data_path).close()
+    with open(data_path) as f:
+        content = f.read()
+
+    commands["set"]("bmarley", "ldap", "True", path=data_path)
+
+    with open(data_path) as f:
+        assert f.read() == content
+    assert journal.size() > 0
+
+    with isensus.Data(path=data_path) as users:
+        assert users["bmarley"].ldap
+
+    journal_size = journal.size()
+    commands["remove"]("bmarley", path=data_path)
+    assert journal.size() > journal_size
+
+    with isensus.Data(path=data_path) as users:
+        assert "bmarley" not in users.keys()
+    assert journal.deltas_per_user() == {
+        "bmarley": [{"ldap": True, "_version": 1}, None]
+    }
+
+    # incomplete last line, written by an interrupted process
+    with open(journal.path, "a") as f:
+        f.write('{"userid": "bmarley", "fie')
+    commands["create"]("jdoe", "John", "Doe", path=data_path)
+    commands["set"]("jdoe", "ldap", "True", path=data_path)
+    assert commands["show"]("jdoe", path=data_path).ldap
+    # complete last line, but for its newline
+    with open(journal.path, "a") as f:
+        f.write('{"userid": "jdoe", "fields": {"vaulted": true}}')
+    commands["set"]("jdoe", "forwarder", "True", path=data_path)
+    jdoe = commands["show"]("jdoe", path=data_path)
+    assert jdoe.vaulted and jdoe.forwarder
+
+    threshold = isensus.data.journal.Journal.compaction_threshold
+    isensus.data.journal.Journal.compaction_threshold = 0
+    try:
+        commands["create"]("eboolo", "Esther", "Boolo", path=data_path)
+    finally:
+        isensus.data.journal.Journal.compaction_threshold = threshold
+
+    # only the deletion of bmarley (and its version) is kept
+    assert journal.deltas_per_user() == {"bmarley": [None]}
+    assert journal.tombstones() == {"bmarley": 1}
+    with open(data_path) as f:
+        assert "eboolo" in json.load(f)["users"]
+
+
+def test_dirty_tracking(test_data_file):
+    """
+    Testing only the modified attributes are written
+    to the journal, and that nothing is written by
+    read-only sessions or sessions raising an exception.
+    """
+
+    data_path = test_data_file
+    journal = isensus.data.journal.Journal(data_path)
+
+    commands["show"]("bmarley", path=data_path)
+    assert journal.size() == 0
+
+    with pytest.raises(isensus.UserNotFoundError):
+        commands["set"]("unknown", "ldap", "True", path=data_path)
+    assert journal.size() == 0
+
+    with pytest.raises(RuntimeError):
+        with isensus.Data(path=data_path) as users:
+            users["bmarley"].vaulted = True
+            raise RuntimeError()
+    assert journal.size() == 0
+
+    with isensus.Data(path=data_path) as users:
+        users["bmarley"].vaulted = True
+        users["bmarley"].notes.rm(0)
+        assert users.modified()
+        updated, deleted = users.changes()
+        assert set(updated["bmarley"].keys()) == {"vaulted", "notes", "_version"}
+        assert updated["bmarley"]["_version"] == 1
+        assert not deleted
+    assert journal.size() > 0
+
+    with isensus.Data(path=data_path) as users:
+        assert not users.modified()
+        assert users["bmarley"].vaulted
+
+
+def test_sqlite(test_data_file):
+    """
+    Testing the migration of the json database to sqlite3,
+    and the commands applied on the sqlite3 database.
+    """
+
+    data_path = test_data_file
+
+    commands["set"]("bmarley", "ldap", "True", path=data_path)
+    commands["create"]("eboolo", "Esther", "Boolo", path=data_path)
+    # files describing the json database
+    isensus.warnings.outstanding(data_path)
+    isensus.data.data.expiring(data_path, 0, 1)
+    suffixes = (".offsets", ".timeline", ".warnings")
+    assert all(pathlib.Path(str(data_path) + suffix).is_file() for suffix in suffixes)
+    commands["migrate"](path=data_path)
+
+    assert isensus.data.sqlite.is_sqlite(data_path)
+    assert not any(pathlib.Path(str(data_path) + suffix).exists() for suffix in suffixes)
+
+    with isensus.Data(path=data_path) as users:
+        assert isinstance(users, isensus.data.sqlite.SqliteUsers)
+        assert sorted(users.keys()) == ["bmarley", "eboolo"]
+        assert users["bmarley"].ldap
+        assert isensus.User.find_user(users, "esth").userid == "eboolo"
+        with pytest.raises(isensus.AmbiguousUserError):
+            isensus.User.find_user(users, "")
+
+    commands["set"]("boolo", "vaulted", "True", path=data_path)
+    commands["remove"]("bob", path=data_path)
+    commands["create"]("emarlon", "Etienne", "Marlon", path=data_path)
+
+    with isensus.Data(path=data_path) as users:
+        assert [userid for userid, _ in users.items()] == ["eboolo", "emarlon"]
+        assert users["eboolo"].vaulted
+        assert not users["emarlon"].vaulted
+        with pytest.raises(isensus.UserNotFoundError):
+            isensus.User.find_user(users, "bmar")
+        assert users.version("eboolo") == 2
+
+    # concurrent writes (e.g. by another tool) are detected
+    first = isensus.data.sqlite.SqliteUsers(data_path)
+    second = isensus.data.sqlite.SqliteUsers(data_path)
+    try:
+        first["eboolo"].ldap = True
+        second["eboolo"].forwarder = True
+        first["emarlon"].ldap = True
+        first.commit()
+        assert first.version("eboolo") == 3
+        with pytest.raises(isensus.ConflictError) as conflict:
+            second.commit()
+        assert conflict.value.userids == ["eboolo"]
+    finally:
+        first.close()
+        second.close()
+    with isensus.Data(path=data_path, shared=True) as users:
+        assert users["eboolo"].ldap and not users["eboolo"].forwarder
+        assert users.version("emarlon") == 2
+
+
+def test_lazy_decoding(test_data_file, monkeypatch):
+    """
+    Testing instances of User are created only for
+    the users that are accessed.
+    """
+
+    data_path = test_data_file
+
+    users = {
+        "user{}".format(index): isensus.User.create_new(
+            "user{}".format(index), "first{}".format(index), "last{}".format(index)
+        )
+        for index in range(100)
+    }
+    isensus.write_data(users, data_path)
+
+    decoded = []
+    user_from_json = isensus.User._user_from_json.__func__
+
+    def _user_from_json(cls, from_json):
+        decoded.append(from_json["userid"])
+        return user_from_json(cls, from_json)
+
+    monkeypatch.setattr(isensus.User, "_user_from_json", classmethod(_user_from_json))
+
+    with isensus.Data(path=data_path) as users:
+        names = dict(users.fields(("firstname", "lastname")))
+    assert names["user3"] == ("first3", "last3")
+    assert not decoded
+
+    commands["set"]("user42", "ldap", "True", path=data_path)
+    assert decoded == ["user42"]
+
+    with isensus.Data(path=data_path) as users:
+        assert users.field("user42", "ldap")
+        assert not users.field("user41", "ldap")
+        assert users.field("user41", "firstname") == "first41"
+    assert len(decoded) == 1
+
+
+def test_schema_upgrade(test_data_file):
+    """
+    Testing files of version 1 of the database format
+    are upgraded to native json values.
+    """
+
+    data_path = test_data_file
+    v1 = {
+        "bmarley": {
+            "userid": "'bmarley'",
+            "firstname": "'Bob'",
+            "lastname": "'Marley'",
+            "ldap": "True",
+            "vaulted": "False",
+            "contract": "<Contract.stipend: 2>",
+            "contract_end": "2021-06-30",
+            "shadow_extension": "",
+            "title": "None",
+            "notes": "first note<br>second note",
+            "warnings": "",
+        }
+    }
+    with open(data_path, "w") as f:
+        json.dump(v1, f)
+    journal = isensus.data.journal.Journal(data_path)
+    journal.append({"bmarley": {"employee_id": "42"}}, {})
+
+    with isensus.Data(path=data_path) as users:
+        user = users["bmarley"]
+        assert user.ldap and not user.vaulted
+        assert user.contract == isensus.data.contract.Contract.stipend
+        assert str(user.contract_end) == "2021-06-30"
+        assert user.employee_id == 42
+        assert user.notes.items() == ["first note", "second note"]
+
+    assert journal.size() == 0
+    assert pathlib.Path(str(data_path) + ".v1.bak").is_file()
+    with open(data_path) as f:
+        content = json.load(f)
+    assert content["version"] == isensus.data.schema.version
+    record = content["users"]["bmarley"]
+    assert record["ldap"] is True
+    assert record["contract"] == "stipend"
+    assert record["contract_end"] == "2021-06-30"
+    assert record["shadow_extension"] is None
+    assert record["title"] is None
+    assert record["employee_id"] == 42
+    assert record["notes"] == ["first note", "second note"]
+    assert record["warnings"] == []
+
+    users = isensus.User.from_json(json.loads(isensus.User.to_json({"bmarley": user})))
+    assert users["bmarley"].to_dict() == user.to_dict()
+
+
+def test_codec_benchmark(tmp_path):
+    """
+    Micro-benchmark of the generated encoding / decoding
+    functions (see isensus.data.schema.codec) against
+    per attribute encoding / decoding, on a synthetic
+    file of 100k users.
+    """
+
+    nb_users = 100000
+    template = isensus.User.create_new(None, "first", None).to_dict()
+    contracts = [contract.name for contract in isensus.data.contract.Contract]
+    records = {}
+    for index in range(nb_users):
+        userid = "user{}".format(index)
+        records[userid] = {
+            **template,
+            "userid": userid,
+            "lastname": "last{}".format(index),
+            "ldap": bool(index % 2),
+            "contract": contracts[index % len(contracts)],
+            "contract_end": "2022-{:02d}-{:02d}".format(index % 12 + 1, index % 28 + 1),
+            "notes": ["note {}".format(index)],
+        }
+    data_path = tmp_path / "isensus"
+    with open(data_path, "w") as f:
+        f.write(json.dumps({"version": isensus.data.schema.version, "users": records}))
+    with open(data_path) as f:
+        json_dump = json.load(f)
+    attributes = list(isensus.User.__annotations__.keys())
+
+    def _decode(record):
+        user = isensus.User()
+        for attr in attributes:
+            value = isensus.User.decode_field(attr, record.get(attr))
+            if value is not None:
+                setattr(user, attr, value)
+        user.mark_clean()
+        return user
+
+    def _encode(user):
+        return {
+            attr: isensus.User.encode_field(attr, getattr(user, attr))
+            for attr in attributes
+        }
+
+    start = time.perf_counter()
+    reference = {
+        userid: _decode(record) for userid, record in json_dump["users"].items()
+    }
+    reflection_decoding = time.perf_counter() - start
+    start = time.perf_counter()
+    users = isensus.User.from_json(json_dump)
+    codec_decoding = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encoded = {userid: _encode(user) for userid, user in reference.items()}
+    reflection_encoding = time.perf_counter() - start
+    start = time.perf_counter()
+    json_content = isensus.User.to_json(users)
+    codec_encoding = time.perf_counter() - start
+
+    print(
+        "\n{} users, decoding: {:.2f}s -> {:.2f}s, "
+        "encoding (with json.dumps): {:.2f}s -> {:.2f}s".format(
+            nb_users,
+            reflection_decoding,
+            codec_decoding,
+            reflection_encoding,
+            codec_encoding,
+        )
+    )
+    assert json.loads(json_content)["users"] == encoded == records
+    assert codec_decoding < reflection_decoding
+
+
+def _unversioned(content):
+    # the json database file, without the versions of the users
+    data = json.loads(content)
+    for record in data["users"].values():
+        record.pop("_version", None)
+    return json.dumps(data)
+
+
+def test_incremental_encoding(test_data_file, monkeypatch):
+    """
+    Testing only the modified users are re-encoded when
+    the json database file is written, and that the
+    written file is the same as if all users were encoded.
+    """
+
+    data_path = test_data_file
+
+    users = {
+        "user{}".format(index): isensus.User.create_new(
+            "user{}".format(index), "first{}".format(index), "last{}".format(index)
+        )
+        for index in range(50)
+    }
+    isensus.write_data(users, data_path)
+
+    encoded = []
+    to_dict = isensus.User.to_dict
+
+    def _to_dict(user):
+        encoded.append(user.userid)
+        return to_dict(user)
+
+    monkeypatch.setattr(isensus.User, "to_dict", _to_dict)
+
+    with isensus.Data(path=data_path) as data:
+        data["user7"].vaulted = True
+        del data["user8"]
+        data["new"] = isensus.User.create_new("new", "New", "User")
+        isensus.write_data(data, data_path)
+        users["user7"].vaulted = True
+        del users["user8"]
+        users["new"] = data["new"]
+        with open(data_path) as f:
+            assert _unversioned(f.read()) == isensus.User.to_json(users)
+        data.mark_clean()
+        assert set(encoded) == {"user7", "new"}
+        encoded.clear()
+        # users are read from their positions in the re-written file
+        assert data["user42"].firstname == "first42"
+        data["user9"].ldap = True
+        isensus.write_data(data, data_path)
+        data.mark_clean()
+    # users modified in the session (but not user42) may be re-encoded
+    assert "user9" in encoded and not set(encoded) - {"user7", "new", "user9"}
+
+    users["user9"].ldap = True
+    with open(data_path) as f:
+        assert _unversioned(f.read()) == isensus.User.to_json(users)
+
+
+def test_stream_data(test_data_file, capsys):
+    """
+    Testing users are streamed one at a time from
+    the database file, with the journal applied.
+    """
+
+    data_path = test_data_file
+
+    users = {
+        "user{}".format(index): isensus.User.create_new(
+            "user{}".format(index), "first{}".format(index), "Müller{}".format(index)
+        )
+        for index in range(20)
+    }
+    isensus.write_data(users, data_path)
+    commands["set"]("user3", "ldap", "True", path=data_path)
+    commands["remove"]("user4", path=data_path)
+    commands["create"]("eboolo", "Esther", "Boolo", path=data_path)
+
+    with isensus.Data(path=data_path) as expected:
+        expected = {userid: user.to_dict() for userid, user in expected.items()}
+    streamed = {
+        userid: user.to_dict() for userid, user in isensus.stream_data(data_path)
+    }
+    assert streamed == expected
+    assert list(streamed.keys())[-1] == "eboolo"
+
+    # small chunks: users spanning several chunks
+    with open(data_path, "rb") as f:
+        records = dict(isensus.data.reader.stream(f, buffer_size=7))
+    with open(data_path) as f:
+        assert records == json.load(f)["users"]
+
+    commands["list"](path=data_path)
+    out = capsys.readouterr().out
+    assert "Müller19" in out and "user4" not in out and "Esther" in out
+
+
+def test_offset_index(test_data_file, monkeypatch):
+    """
+    Testing single users are read via the memory
+    mapped offset index, taking the journal into
+    account.
+    """
+
+    data_path = test_data_file
+    read_user = isensus.data.data.read_user
+
+    users = {
+        "user{}".format(index): isensus.User.create_new(
+            "user{}".format(index), "first{}".format(index), "last{}".format(index)
+        )
+        for index in range(50)
+    }
+    isensus.write_data(users, data_path)
+    offsets = isensus.data.offsets.OffsetIndex(data_path)
+    assert offsets.valid()
+
+    commands["set"]("user42", "ldap", "True", path=data_path)
+    commands["remove"]("user43", path=data_path)
+    commands["create"]("eboolo", "Esther", "Boolo", path=data_path)
+
+    def _get_data(path):
+        raise AssertionError("database fully read")
+
+    with monkeypatch.context() as m:
+        m.setattr(isensus.data.data, "get_data", _get_data)
+        assert read_user(data_path, "first7").userid == "user7"
+        assert read_user(data_path, "LAST42").ldap
+        assert read_user(data_path, "user43") is None
+        assert read_user(data_path, "esth").lastname == "Boolo"
+        with pytest.raises(isensus.AmbiguousUserError):
+            read_user(data_path, "user1")
+        assert commands["show"]("user42", path=data_path).ldap
+
+    # the index is not valid anymore once the database file changed,
+    # and re-generated when the database is read
+    with open(data_path, "a") as f:
+        f.write(" ")
+    assert read_user(data_path, "first7") is None
+    assert commands["show"]("first7", path=data_path).userid == "user7"
+    assert offsets.valid()
+    assert read_user(data_path, "first7").userid == "user7"
+
+
+def _concurrent_writer(data_path, index, nb_iterations):
+    # see test_concurrent_sessions
+    for iteration in range(nb_iterations):
+        while True:
+            try:
+                with isensus.Data(path=data_path) as users:
+                    user = users["bmarley"]
+                    user.employee_id = (user.employee_id or 0) + 1
+                    userid = "writer{}_{}".format(index, iteration)
+                    users[userid] = isensus.User.create_new(
+                        userid, "Writer", str(index)
+                    )
+                break
+            except isensus.ConflictError:
+                # bmarley modified by another writer meanwhile
+                continue
+
+
+def _concurrent_reader(data_path, nb_iterations):
+    # see test_concurrent_sessions
+    for _ in range(nb_iterations):
+        assert isensus.data.data.read_user(data_path, "bmar") is not None
+        with isensus.Data(path=data_path, shared=True) as users:
+            assert users["bmarley"].userid == "bmarley"
+        assert sum(1 for _ in isensus.stream_data(data_path)) >= 1
+
+
+def test_concurrent_sessions(test_data_file, monkeypatch):
+    """
+    Stress test: many processes modifying (and reading)
+    the database at the same time. Conflicting sessions
+    being retried, no update is lost and no reader fails.
+    """
+
+    import multiprocessing
+
+    data_path = test_data_file
+    nb_writers, nb_readers, nb_iterations = 8, 4, 10
+    # small journal, so that the data file gets re-written often
+    monkeypatch.setattr(isensus.data.journal.Journal, "compaction_threshold", 2000)
+    # upgrading the test file to the current database format
+    isensus.get_data(data_path).close()
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(
+            target=_concurrent_writer, args=(data_path, index, nb_iterations)
+        )
+        for index in range(nb_writers)
+    ] + [
+        context.Process(target=_concurrent_reader, args=(data_path, nb_iterations))
+        for _ in range(nb_readers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0] * len(processes)
+
+    with isensus.Data(path=data_path, shared=True) as users:
+        assert users["bmarley"].employee_id == nb_writers * nb_iterations
+        assert len(users) == 1 + nb_writers * nb_iterations
+    assert not list(data_path.parent.glob(data_path.name + ".*.tmp"))
+
+    with pytest.raises(RuntimeError):
+        with isensus.Data(path=data_path, shared=True) as users:
+            users["bmarley"].ldap = True
+
+
+def test_optimistic_sessions(test_data_file, monkeypatch):
+    """
+    Testing sessions running in parallel: changes to
+    different users are merged, changes to the same
+    user raise a ConflictError (and are not written).
+    """
+
+    data_path = test_data_file
+    with isensus.Data(path=data_path) as users:
+        users["jdoe"] = isensus.User.create_new("jdoe", "John", "Doe")
+
+    # the data file is re-written at each commit
+    monkeypatch.setattr(isensus.data.journal.Journal, "compaction_threshold", 0)
+    with isensus.Data(path=data_path) as first:
+        first["bmarley"].ldap = True
+        with isensus.Data(path=data_path) as second:
+            second["jdoe"].vaulted = True
+            second["new"] = isensus.User.create_new("new", "New", "User")
+    with isensus.Data(path=data_path, shared=True) as users:
+        assert users["bmarley"].ldap
+        assert users["jdoe"].vaulted
+        assert "new" in users
+        assert users.version("bmarley") == 1
+        assert users.version("jdoe") == 2
+
+    monkeypatch.setattr(isensus.data.journal.Journal, "compaction_threshold", 1 << 20)
+    with pytest.raises(isensus.ConflictError) as error:
+        with isensus.Data(path=data_path) as first:
+            first["bmarley"].vaulted = True
+            first["jdoe"].ldap = True
+            with isensus.Data(path=data_path) as second:
+                del second["bmarley"]
+    assert error.value.userids == ["bmarley"]
+    with pytest.raises(isensus.ConflictError):
+        with isensus.Data(path=data_path) as first:
+            first["other"] = isensus.User.create_new("other", "Other", "User")
+            with isensus.Data(path=data_path) as second:
+                second["other"] = isensus.User.create_new("other", "Other", "User")
+    with isensus.Data(path=data_path, shared=True) as users:
+        assert "bmarley" not in users
+        assert not users["jdoe"].ldap
+        assert users.version("other") == 1
+
+    # users deleted and created again get a greater version (also once
+    # the journal has been compacted), so that sessions which read the
+    # former user conflict
+    for threshold in (1 << 20, 0):
+        monkeypatch.setattr(
+            isensus.data.journal.Journal, "compaction_threshold", threshold
+        )
+        with pytest.raises(isensus.ConflictError) as error:
+            with isensus.Data(path=data_path) as first:
+                first["jdoe"].ldap = True
+                with isensus.Data(path=data_path) as second:
+                    del second["jdoe"]
+                with isensus.Data(path=data_path) as third:
+                    third["jdoe"] = isensus.User.create_new("jdoe", "John", "Doe")
+        assert error.value.userids == ["jdoe"]
+    with isensus.Data(path=data_path, shared=True) as users:
+        assert not users["jdoe"].ldap
+        assert users.version("jdoe") == 4
+
+
+def test_batch(test_data_file, monkeypatch, capsys):
+    """
+    Testing the batch command: the commands of the
+    file are run in a single session, failing commands
+    are reported, and nothing is written in all or
+    nothing mode if a command fails.
+    """
+
+    data_path = test_data_file
+    batch_path = data_path.parent / (data_path.name + ".batch")
+    with open(batch_path, "w") as f:
+        f.write(
+            "# new cohort\n"
+            "create eboolo Esther Boolo\n"
+            "set eboolo ldap True\n"
+            "\n"
+            "set eboolo notes 'welcome, new'\n"
+            "set unknown ldap True\n"
+            "set bmarley contract_end 2026/12/31\n"
+            "show eboolo\n"
+            "migrate\n"
+        )
+
+    appended = []
+    append = isensus.data.journal.Journal.append
+
+    def _append(journal, *args, **kwargs):
+        appended.append(args)
+        return append(journal, *args, **kwargs)
+
+    monkeypatch.setattr(isensus.data.journal.Journal, "append", _append)
+
+    with pytest.raises(ValueError):
+        commands["batch"](str(batch_path), all_or_nothing=True, path=data_path)
+    assert not appended
+    with isensus.Data(path=data_path, shared=True) as users:
+        assert "eboolo" not in users
+
+    capsys.readouterr()
+    commands["batch"](str(batch_path), path=data_path)
+    output = capsys.readouterr().out
+    assert "line 6: " in output and "line 7: " in output and "line 9: " in output
+    assert "Esther" in output
+    assert "7 command(s), 3 failed" in output
+    # a single commit
+    assert len(appended) == 1
+    with isensus.Data(path=data_path, shared=True) as users:
+        assert users["eboolo"].ldap
+        assert users["eboolo"].notes.items() == ["welcome, new"]
+    batch_path.unlink()
+
+    from isensus.commands.arguments import parse
+
+    command, args, options = parse(commands, ["batch", "-", "--all-or-nothing"])
+    assert args == ["-"] and options == {"all_or_nothing": True}
+    monkeypatch.setattr("sys.stdin", io.StringIO("set bmarley vaulted True\n"))
+    command(*args, **options, path=data_path)
+    with isensus.Data(path=data_path, shared=True) as users:
+        assert users["bmarley"].vaulted
+
+
+def test_server(test_data_file):
+    """
+    Testing the server: commands forwarded through its
+    socket are run on the users it keeps in memory, their
+    changes are written, and changes written by other
+    processes are taken into account.
+    """
+
+    import threading
+    from isensus.server import Server, forward, socket_path
+
+    data_path = test_data_file
+    assert forward(["show", "bmarley"], data_path) is None
+
+    with Server(data_path) as server:
+        # only the owner may connect
+        assert socket_path(data_path).stat().st_mode & 0o777 == 0o600
+        thread = threading.Thread(target=server.serve)
+        thread.start()
+        try:
+            output, error = forward(["set", "bmarley", "ldap", "True"], data_path)
+            assert error is None and "Marley" in output
+            with isensus.Data(path=data_path, shared=True) as users:
+                assert users["bmarley"].ldap
+
+            output, error = forward(["set", "unknown", "ldap", "True"], data_path)
+            assert "unknown" in error
+            output, error = forward(["batch", "-"], data_path)
+            assert error is not None
+
+            # written by another process
+            commands["create"]("eboolo", "Esther", "Boolo", path=data_path)
+            output, error = forward(["show", "eboo"], data_path)
+            assert error is None and "Esther" in output
+        finally:
+            server.stop()
+            thread.join()
+
+    assert forward(["show", "bmarley"], data_path) is None
+
+
+def test_shell(test_data_file, capsys):
+    """
+    Testing the shell: commands run in a single session,
+    written on commit, discarded on rollback, and
+    completion of commands, userids, attributes and values.
+    """
+
+    from isensus.shell import Shell
+
+    data_path = test_data_file
+    data = isensus.Data(path=data_path)
+    with data as users:
+        shell = Shell(data, users, data_path)
+        shell.onecmd("set bmarley ldap True")
+        with isensus.Data(path=data_path, shared=True) as other:
+            assert not other["bmarley"].ldap
+        shell.onecmd("commit")
+        with isensus.Data(path=data_path, shared=True) as other:
+            assert other["bmarley"].ldap
+
+        shell.onecmd("set bmarley vaulted True")
+        shell.onecmd("rollback")
+        shell.onecmd("show bmarley")
+        assert "vaulted\tFalse" in capsys.readouterr().out
+        shell.onecmd("set unknown ldap True")
+        assert "error" in capsys.readouterr().out
+
+        assert shell.completenames("com") == ["commit"]
+        assert shell.completedefault("bm", "set bm", 4, 6) == ["bmarley"]
+        line = "set bmarley va"
+        assert shell.completedefault("va", line, 12, 14) == ["vaulted"]
+        line = "set bmarley ldap T"
+        assert shell.completedefault("T", line, 17, 18) == ["True"]
+
+        shell.onecmd("set bmarley vaulted True")
+        assert not shell.onecmd("exit")
+        assert shell.onecmd("exit")
+    with isensus.Data(path=data_path, shared=True) as users:
+        assert not users["bmarley"].vaulted
+
+
+def _warnings_users():
+    # users in the various categories of warnings (see test_warnings)
+    Date, Contract = isensus.data.date.Date, isensus.data.contract.Contract
+    complete = isensus.User.create_new("complete", "Com", "Plete")
+    for attr in ("ldap", "forms_sent", "forms_received", "website_privacy"):
+        setattr(complete, attr, True)
+    complete.contract = Contract.normal
+    complete.contract_end = Date("2026-12-31")
+    complete.title = isensus.data.title.Title.postdoc
+    leaving = dataclasses.replace(
+        complete, userid="leaving", contract_end=Date("2026-10-25")
+    )
+    expired = dataclasses.replace(
+        complete,
+        userid="expired",
+        contract_end=Date("2026-10-01"),
+        closure_mail_sent=True,
+    )
+    alumni = isensus.User.create_new("alumni", "Al", "Umni")
+    alumni.contract = Contract.alumni
+    alumni.vaulted = alumni.forwarder = alumni.website_alumni = True
+    new = isensus.User.create_new("new", "New", "User")
+    new.ldap = True
+    return {
+        user.userid: user for user in (complete, leaving, expired, alumni, new)
+    }
+
+
+def test_warnings(test_data_file, capsys):
+    """
+    Testing the warnings computed for users of each
+    category (core, active, transition, alumni), and
+    the warnings command.
+    """
+
+    from isensus.warnings import all_warnings, resolve, rule
+
+    day = datetime.date(2026, 10, 18).toordinal()
+    users = _warnings_users()
+    found = all_warnings(users.items(), day)
+    assert "complete" not in found
+    assert found["leaving"] == [
+        "contract expires soon, but no closure mail has been sent"
+    ]
+    assert found["expired"] == ["contract expired but not set alumni"]
+    assert found["alumni"] == [
+        "user may still have some assets deployed to in is-snipe"
+    ]
+    assert "ldap is not set" not in found["new"]
+    assert "contract_end is not set" in found["new"]
+    assert "forms_sent is not set" in found["new"]
+
+    rules = resolve()
+    assert set(rules) == {"core", "active", "transition", "alumni"}
+    assert all(isinstance(category, tuple) for category in rules.values())
+    with pytest.raises(ValueError):
+        rule("unknown")
+
+    data_path = test_data_file
+    isensus.write_data(users, data_path)
+    commands["warnings"](path=data_path)
+    output = capsys.readouterr().out
+    assert "leaving" in output and "new" in output and "complete" not in output
+
+
+def test_vectorized_warnings(test_data_file, monkeypatch, capsys):
+    """
+    Testing the rules evaluated over all users at once
+    (as masks over the columns of a UserTable), with and
+    without their vectorized versions, are consistent
+    with the rules evaluated user by user.
+    """
+
+    from isensus.warnings import all_warnings, rule_userids, engine
+
+    day = datetime.date(2026, 10, 18).toordinal()
+    users = _warnings_users()
+    table = isensus.data.UserTable.from_users(users)
+
+    found = rule_userids(table, day)
+    expected = all_warnings(users.items(), day)
+    assert sum(len(userids) for userids in found.values()) == sum(
+        len(warnings) for warnings in expected.values()
+    )
+    assert found["no_closure_mail"] == ["leaving"]
+    assert found["expired_not_alumni"] == ["expired"]
+    assert found["assets_in_is_snipe"] == ["alumni"]
+    assert found["ldap_not_set"] == []
+    assert found["contract_end_not_set"] == ["new"]
+    monkeypatch.setattr(engine, "_vectors", {})
+    assert rule_userids(table, day) == found
+
+    data_path = test_data_file
+    isensus.write_data(users, data_path)
+    commands["warnings"](by_rule=True, path=data_path)
+    output = capsys.readouterr().out
+    assert "no_closure_mail (1)" in output and "ldap_not_set" not in output
+
+
+def test_report(test_data_file, monkeypatch, capsys):
+    """
+    Testing the audit of the users, computed in a single
+    process or over chunks of the users in several
+    processes, and the report command.
+    """
+
+    import pickle
+    from isensus.commands.arguments import parse
+    from isensus.warnings import all_warnings, build_report, engine, rule_userids
+
+    day = datetime.date(2026, 10, 18).toordinal()
+    users = _warnings_users()
+    table = isensus.data.UserTable.from_users(users)
+
+    chunks = table.partition(2)
+    assert [chunk.userids() for chunk in chunks] == [
+        ["complete", "leaving", "expired"],
+        ["alumni", "new"],
+    ]
+    chunk = pickle.loads(pickle.dumps(chunks[1]))
+    assert chunk["alumni"] == users["alumni"] and chunk["new"] == users["new"]
+    assert len(table.partition(10)) == len(users)
+
+    audit = build_report(table, day)
+    assert audit.warnings == all_warnings(users.items(), day)
+    assert list(audit.warnings) == ["leaving", "expired", "alumni", "new"]
+    assert audit.descriptions["new"] == users["new"].to_string()
+    assert audit.contracts["normal"] == (3, 2)
+    assert audit.contracts["not set"] == (1, 1)
+    assert audit.titles["postdoc"] == (3, 2)
+    assert build_report(table, day, jobs=2) == audit
+    assert rule_userids(table, day, jobs=3) == rule_userids(table, day)
+
+    data_path = test_data_file
+    isensus.write_data(users, data_path)
+    monkeypatch.setattr(engine, "today", lambda: day)
+    command, args, options = parse(commands, ["report", "--jobs", "2"])
+    assert options == {"jobs": 2}
+    command(*args, **options, path=data_path)
+    output = capsys.readouterr().out
+    assert "\t normal \t 3 user(s), 2 with warnings" in output
+    assert "contract expires soon" in output and "\nleaving\n" in output
+    with pytest.raises(ValueError):
+        parse(commands, ["report", "--jobs"])
+    with pytest.raises(ValueError):
+        parse(commands, ["report", "--jobs", "many"])
+    for name in ("report", "warnings --by-rule"):
+        command, args, options = parse(commands, [*name.split(), "--jobs", "0"])
+        with pytest.raises(ValueError):
+            command(*args, **options, path=data_path)
+
+
+def test_report_benchmark():
+    """
+    Micro-benchmark of the audit of 20k users, computed
+    in 1, 2, 4 and 8 processes (up to the number of cores,
+    see isensus.warnings.build_report).
+    """
+
+    import os
+    from isensus.warnings import build_report
+
+    Date = isensus.data.date.Date
+    contracts = list(isensus.data.contract.Contract)
+    day = datetime.date(2026, 10, 18).toordinal()
+    users = {}
+    for index in range(20000):
+        userid = "user{}".format(index)
+        user = isensus.User.create_new(userid, "first", "last{}".format(index))
+        user.ldap = bool(index % 3)
+        user.contract = contracts[index % len(contracts)]
+        user.contract_end = Date.from_ordinal(day + index % 400 - 200)
+        users[userid] = user
+    table = isensus.data.UserTable.from_users(users)
+
+    timings = {}
+    expected = None
+    for jobs in (1, 2, 4, 8):
+        if jobs > max(2, os.cpu_count() or 1):
+            break
+        start = time.perf_counter()
+        audit = build_report(table, day, jobs=jobs)
+        timings[jobs] = time.perf_counter() - start
+        if expected is None:
+            expected = audit
+        assert audit == expected
+    print(
+        "\n{} users, {} core(s), audit: {}".format(
+            len(users),
+            os.cpu_count(),
+            ", ".join(
+                "{} job(s) {:.2f}s (x{:.1f})".format(jobs, timing, timings[1] / timing)
+                for jobs, timing in timings.items()
+            ),
+        )
+    )
+
+
+def test_warnings_view(test_data_file, monkeypatch, capsys):
+    """
+    Testing the warnings saved next to the database: computed
+    once, updated for the users modified by sessions, swept
+    when the date changes, computed again if the database
+    is written by other means.
+    """
+
+    from isensus.warnings import all_warnings, engine, outstanding, view
+
+    day = datetime.date(2026, 10, 18).toordinal()
+    monkeypatch.setattr(engine, "today", lambda: day)
+    data_path = test_data_file
+    isensus.write_data(_warnings_users(), data_path)
+
+    def _expected(day):
+        return all_warnings(isensus.stream_data(data_path), day)
+
+    assert outstanding(data_path, day) == _expected(day)
+    assert view.WarningsView(data_path).path.is_file()
+
+    def _all_warnings(users, day=None):
+        raise AssertionError("all the warnings computed again")
+
+    monkeypatch.setattr(view, "all_warnings", _all_warnings)
+    commands["set"]("new", "contract_end", "2027-01-01", path=data_path)
+    commands["set"]("complete", "ldap", "False", path=data_path)
+    commands["remove"]("alumni", path=data_path)
+    found = outstanding(data_path, day)
+    assert found == _expected(day)
+    assert "alumni" not in found
+    assert "ldap is not set" in found["complete"]
+
+    # compaction of the lines appended by the sessions
+    warnings_view = view.WarningsView(data_path)
+    size = warnings_view.path.stat().st_size
+    commands["set"]("complete", "ldap", "True", path=data_path)
+    commands["set"]("complete", "ldap", "False", path=data_path)
+    assert warnings_view.path.stat().st_size > size
+    monkeypatch.setattr(view.WarningsView, "compaction_threshold", 0)
+    commands["set"]("new", "vaulted", "True", path=data_path)
+    with open(warnings_view.path) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == len(_expected(day)) + 1
+    assert outstanding(data_path, day) == _expected(day)
+
+    # daily sweep: only the users which contract ends about then
+    evaluated = []
+    user_warnings = view.user_warnings
+
+    def _user_warnings(user, day=None):
+        evaluated.append(user.userid)
+        return user_warnings(user, day)
+
+    monkeypatch.setattr(view, "user_warnings", _user_warnings)
+    later = day + 60
+    expected = _expected(later)
+
+    def _stream_data(path):
+        raise AssertionError("all the users read")
+
+    # these users are found in the timeline
+    with monkeypatch.context() as m:
+        m.setattr(isensus.data.data, "stream_data", _stream_data)
+        assert outstanding(data_path, later) == expected
+    assert "leaving" in evaluated and "complete" not in evaluated
+    assert isensus.data.timeline.Timeline(data_path).valid()
+
+    # database written without updating the view
+    monkeypatch.undo()
+    isensus.write_data(_warnings_users(), data_path)
+    assert not view.WarningsView(data_path).valid()
+    assert outstanding(data_path, day) == _expected(day)
+
+    # changes of a joined session, then rolled back
+    from isensus.shell import Shell
+
+    data = isensus.Data(path=data_path)
+    with data as users:
+        shell = Shell(data, users, data_path)
+        shell.onecmd("set leaving ldap False")
+        capsys.readouterr()
+        shell.onecmd("warnings")
+        assert "ldap is not set" in capsys.readouterr().out
+        shell.onecmd("rollback")
+    assert view.WarningsView(data_path).valid()
+    assert outstanding(data_path, day) == _expected(day)
+    assert "ldap is not set" not in outstanding(data_path, day)["leaving"]
+
+
+def test_upcoming(test_data_file, monkeypatch, capsys):
+    """
+    Testing the contract ends and shadow extensions of the
+    users are found in the timeline, taking the journal
+    into account.
+    """
+
+    from isensus.data.data import expiring
+    from isensus.data.timeline import Timeline
+
+    data_path = test_data_file
+    day = datetime.date(2026, 10, 18).toordinal()
+    users = {}
+    for index in range(30):
+        userid = "user{}".format(index)
+        user = isensus.User.create_new(userid, "first", "last")
+        user.contract_end = isensus.data.date.Date.from_ordinal(day + index)
+        users[userid] = user
+    users["user3"].shadow_extension = isensus.data.date.Date.from_ordinal(day + 5)
+    isensus.write_data(users, data_path)
+
+    found = expiring(data_path, day + 2, day + 5)
+    assert found == [
+        (day + 2, "contract_end", "user2"),
+        (day + 3, "contract_end", "user3"),
+        (day + 4, "contract_end", "user4"),
+        (day + 5, "contract_end", "user5"),
+        (day + 5, "shadow_extension", "user3"),
+    ]
+    assert Timeline(data_path).valid()
+
+    commands["set"]("user4", "contract_end", "2027-01-01", path=data_path)
+    commands["set"]("user20", "contract_end", "2026-10-21", path=data_path)
+    commands["set"]("user3", "ldap", "True", path=data_path)
+    commands["remove"]("user5", path=data_path)
+
+    def _stream_data(path):
+        raise AssertionError("database fully read")
+
+    with monkeypatch.context() as m:
+        m.setattr(isensus.data.data, "stream_data", _stream_data)
+        found = expiring(data_path, day + 2, day + 5)
+    assert [event[2] for event in found] == ["user2", "user20", "user3", "user3"]
+
+    # the timeline is written again once the database file changed
+    isensus.write_data(dict(isensus.stream_data(data_path)), data_path)
+    assert not Timeline(data_path).valid()
+    assert expiring(data_path, day + 2, day + 5) == found
+
+    monkeypatch.setattr(isensus.warnings.engine, "today", lambda: day)
+    commands["upcoming"](1, path=data_path)
+    output = capsys.readouterr().out.splitlines()
+    assert len(output) == 2
+    assert "2026-10-19" in output[1] and "user1" in output[1]
+
+
+def test_prefix_index():
+    """
+    Testing usertip search via the prefix index,
+    including after users are added, removed or
+    renamed.
+    """
+
+    users = isensus.data.Users(
+        {
+            "emarlon": isensus.User.create_new("emarlon", "Etienne", "Marlon"),
+            "emarlone": isensus.User.create_new("emarlone", "Elody", "Marlon"),
+            "amarlo": isensus.User.create_new("amarlo", "Antony", "Marlo"),
+            "efarlo": isensus.User.create_new("efarlo", "Etienne", "Farlo"),
+        }
+    )
+
+    assert users.candidates("emarl") == ["emarlon", "emarlone"]
+    assert users.candidates("ETIEN") == ["efarlo", "emarlon"]
+    assert users.candidates("marlo") == ["amarlo", "emarlon", "emarlone"]
+    assert users.candidates("emu") == []
+    assert len(users.candidates("")) == 4
+
+    users["emu"] = isensus.User.create_new("emu", "Emu", "Bird")
+    assert isensus.User.find_user(users, "bir").userid == "emu"
+
+    del users["amarlo"]
+    assert users.candidates("marlo") == ["emarlon", "emarlone"]
+
+    users["efarlo"].lastname = "Marloni"
+    assert users.candidates("marlo") == ["efarlo", "emarlon", "emarlone"]
+    with pytest.raises(isensus.UserNotFoundError):
+        isensus.User.find_user(users, "farl")
+
+
+def test_index_sidecar(test_data_file, monkeypatch):
+    """
+    Testing the database file is neither read nor parsed
+    when the offset index file is valid.
+    """
+
+    data_path = test_data_file
+    sidecar = isensus.data.sidecar.IndexSidecar(data_path)
+
+    commands["create"]("eboolo", "Esther", "Boolo", path=data_path)
+    assert sidecar.path.is_file()
+
+    scanned = []
+    scan = isensus.data.data.scan
+    read_file = isensus.data.data._read_file
+
+    def _scan(content):
+        scanned.append(True)
+        return scan(content)
+
+    def _read_file(path):
+        scanned.append(True)
+        return read_file(path)
+
+    monkeypatch.setattr(isensus.data.data, "scan", _scan)
+    monkeypatch.setattr(isensus.data.data, "_read_file", _read_file)
+
+    with isensus.Data(path=data_path) as users:
+        assert isensus.User.find_user(users, "esth").userid == "eboolo"
+        assert users["bmarley"].firstname == "Bob"
+        users["bmarley"].firstname = "Robert"
+    assert not scanned
+
+    with isensus.Data(path=data_path) as users:
+        assert isensus.User.find_user(users, "rob").userid == "bmarley"
+    assert not scanned
+    positions, index = sidecar.load()
+    # the users of the database file (eboolo is in the journal)
+    assert list(positions) == ["bmarley"]
+    assert index.values("bmarley") == ("bmarley", "Bob", "Marley")
+    assert index.search("mar") == ["bmarley"]
+
+    # written along with the database file
+    with isensus.Data(path=data_path) as users:
+        isensus.write_data(users, data_path)
+    with isensus.Data(path=data_path) as users:
+        assert users["bmarley"].firstname == "Robert"
+        assert isensus.User.find_user(users, "rob").userid == "bmarley"
+    assert not scanned
+
+    # the database file is modified by other means: the
+    # offset index is not valid anymore
+    with open(data_path) as f:
+        content = json.load(f)
+    content["users"]["bmarley"]["firstname"] = "Bobby"
+    with open(data_path, "w") as f:
+        json.dump(content, f)
+    with isensus.Data(path=data_path) as users:
+        assert users["bmarley"].firstname == "Bobby"
+    assert scanned
+    assert sidecar.load() is not None
+
+
+def test_fuzzy_search(test_data_file, capsys):
+    """
+    Testing the fuzzy search of users
+    """
+
+    data_path = test_data_file
+
+    commands["create"]("jmuller", "Jürgen", "Müller", path=data_path)
+    commands["create"]("jmueller", "Julia", "Mueller", path=data_path)
+    commands["create"]("hmuster", "Hans", "Muster", path=data_path)
+
+    with isensus.Data(path=data_path) as users:
+        ranked = users.fuzzy("mueller")
+        assert [userid for userid, _ in ranked[:2]] == ["jmueller", "jmuller"]
+        assert ranked[0][1] == ranked[1][1] == 1.0
+        assert ranked[0][1] > dict(ranked).get("hmuster", 0.0)
+
+        assert users.fuzzy("Marly")[0][0] == "bmarley"
+        assert users.fuzzy("xyz") == []
+
+        with pytest.raises(isensus.UserNotFoundError):
+            isensus.User.find_user(users, "Juergen")
+        user = isensus.User.find_user(users, "Juergen", fuzzy=True)
+        assert user.userid == "jmuller"
+        with pytest.raises(isensus.AmbiguousUserError):
+            isensus.User.find_user(users, "Müler", fuzzy=True)
+
+        users["jmuller"].firstname = "Georg"
+        del users["jmueller"]
+        assert [userid for userid, _ in users.fuzzy("mueller")] == ["jmuller"]
+
+    commands["migrate"](path=data_path)
+    with isensus.Data(path=data_path, shared=True) as users:
+        assert users.fuzzy("Marly")[0][0] == "bmarley"
+    capsys.readouterr()
+    commands["search"]("mueller", path=data_path)
+    output = capsys.readouterr().out
+    assert "jmuller" in output and "Georg" in output
+
+    plain = {
+        "jmuller": isensus.User.create_new("jmuller", "Jürgen", "Müller"),
+        "hmuster": isensus.User.create_new("hmuster", "Hans", "Muster"),
+    }
+    assert isensus.User.find_user(plain, "Mueler", fuzzy=True).userid == "jmuller"
+
+
+def test_query(test_data_file, capsys):
+    """
+    Testing queries over the attributes of the users
+    """
+
+    data_path = test_data_file
+
+    commands["create"]("eboolo", "Esther", "Boolo", path=data_path)
+    commands["create"]("emarlon", "Etienne", "Marlon", path=data_path)
+    commands["set"]("bmarley", "vaulted", "True", path=data_path)
+    commands["set"]("bmarley", "contract", "guest", path=data_path)
+    commands["set"]("bmarley", "contract_end", "2026-10-01", path=data_path)
+    commands["set"]("esther", "contract", "guest", path=data_path)
+    commands["set"]("esther", "contract_end", "2026-12-01", path=data_path)
+    commands["set"]("etienne", "contract", "normal", path=data_path)
+    commands["set"]("etienne", "contract_end", "2026-10-01", path=data_path)
+
+    with isensus.Data(path=data_path) as users:
+        query = users.query
+        assert query("vaulted=False") == ["eboolo", "emarlon"]
+        assert query("vaulted = True or firstname=Esther") == ["bmarley", "eboolo"]
+        assert query("contract=guest") == ["bmarley", "eboolo"]
+        assert query("contract!=guest") == ["emarlon"]
+        assert query("contract_end<2026-11-01") == ["bmarley", "emarlon"]
+        assert query("contract_end>=2026-10-01 and contract_end<=2026-10-01") == [
+            "bmarley",
+            "emarlon",
+        ]
+        assert query(
+            "vaulted=False and contract_end<2026-11-01 and contract=guest"
+        ) == []
+        assert query("vaulted=False and contract=guest and lastname>A") == [
+            "eboolo"
+        ]
+        assert query("shadow_extension=None and title=None") == [
+            "bmarley",
+            "eboolo",
+            "emarlon",
+        ]
+
+        users["eboolo"].contract_end = isensus.data.date.Date("2026-10-15")
+        users["eboolo"].vaulted = True
+        del users["bmarley"]
+        assert query("contract_end<2026-11-01") == ["eboolo", "emarlon"]
+        assert query("vaulted=True") == ["eboolo"]
+
+        with pytest.raises(ValueError):
+            query("contract=unknown")
+        with pytest.raises(ValueError):
+            query("contract_end<2026/11/01")
+        with pytest.raises(isensus.UnknownAttributeError):
+            query("unknown=True")
+
+        plain = {userid: users[userid] for userid in users}
+        assert isensus.data.query.query(plain, "contract=guest") == ["eboolo"]
+
+    commands["migrate"](path=data_path)
+    with isensus.Data(path=data_path) as users:
+        assert users.query("contract=guest and lastname>A") == ["eboolo"]
+        assert users.field("eboolo", "firstname") == "Esther"
+        with pytest.raises(KeyError):
+            users.field("bmarley", "firstname")
+    capsys.readouterr()
+    commands["query"]("contract=guest", path=data_path)
+    assert "Esther" in capsys.readouterr().out
+
+
+def test_user_table(test_data_file):
+    """
+    Testing the column oriented storage of users
+    """
+
+    data_path = test_data_file
+
+    commands["create"]("eboolo", "Esther", "Boolo", path=data_path)
+    commands["create"]("emarlon", "Etienne", "Marlon", path=data_path)
+    commands["set"]("bmarley", "vaulted", "True", path=data_path)
+    commands["set"]("bmarley", "contract", "guest", path=data_path)
+    commands["set"]("bmarley", "contract_end", "2026-10-01", path=data_path)
+    commands["set"]("bmarley", "employee_id", "42", path=data_path)
+    commands["set"]("bmarley", "notes", "note 1", path=data_path)
+
+    with isensus.Data(path=data_path) as users:
+        table = isensus.data.table.UserTable.from_users(users)
+        expected = {userid: users[userid] for userid in users}
+
+    assert sorted(table.keys()) == ["bmarley", "eboolo", "emarlon"]
+    assert {userid: user.to_dict() for userid, user in table.to_users().items()} == {
+        userid: user.to_dict() for userid, user in expected.items()
+    }
+    assert table["bmarley"] == expected["bmarley"]
+    assert table["bmarley"].vaulted
+    assert not table["eboolo"].vaulted
+    assert table["bmarley"].contract == isensus.data.contract.Contract.guest
+    assert table["eboolo"].contract is None
+    assert str(table["bmarley"].contract_end) == "2026-10-01"
+    assert table["bmarley"].employee_id == 42
+    assert table["eboolo"].employee_id is None
+    assert table["bmarley"].notes.get(0) == "note 1"
+
+    assert isensus.User.find_user(table, "esth").userid == "eboolo"
+
+    table["eboolo"].vaulted = True
+    assert table["eboolo"].vaulted
+    assert table.column("vaulted").to_int() == 0b11
+
+    # list attributes of rows write their changes to the table,
+    # the ones of the users returned by to_user do not
+    table["bmarley"].to_user().notes.rm(0)
+    assert table["bmarley"].notes.get(0) == "note 1"
+    table["bmarley"].notes.rm(0)
+    assert repr(table["bmarley"].notes) == ""
+    assert not table["bmarley"].to_user().notes.modified
+
+    del table["bmarley"]
+    assert sorted(table.keys()) == ["eboolo", "emarlon"]
+    assert table["emarlon"].to_dict() == expected["emarlon"].to_dict()
+    table["bmarley"] = expected["bmarley"]
+    assert table["bmarley"] == expected["bmarley"]
+
+
+def test_date_comparisons():
+    """
+    Testing the ordinal representation and
+    comparisons of Date
+    """
+
+    Date = isensus.data.date.Date
+
+    date = Date("2011-07-12")
+    assert date.ordinal == datetime.date(2011, 7, 12).toordinal()
+    assert date.get() == datetime.datetime(2011, 7, 12)
+    assert repr(date) == str(date) == "2011-07-12"
+    assert Date.from_ordinal(date.ordinal) == date
+    assert Date("2011-07-12") == date
+    assert Date("2011-7-12") == date
+    assert str(Date("2021-3-5")) == "2021-03-05"
+    assert Date("2011-07-13") > date
+    assert sorted([Date("2012-01-01"), Date(""), date]) == [
+        Date(None),
+        date,
+        Date("2012-01-01"),
+    ]
+
+    not_set = Date("")
+    assert not_set.ordinal is None
+    assert not_set.get() is None
+    assert repr(not_set) == ""
+    assert str(not_set) == "Not set"
+    assert Date.from_ordinal(0) == not_set
+
+    for wrong_format in ("2011/07/12", "20110712", "2011-13-01"):
+        with pytest.raises(ValueError):
+            Date(wrong_format)